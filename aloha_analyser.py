@@ -1,6 +1,13 @@
+import copy
+
 import pandas as pd
 import streamlit as st
-import plotly.graph_objects as go
+
+from heatmap_figures import covers_heatmap_figure
+from rota_ingest import hour_labels
+from large_parties import THRESHOLD, SPEND_PER_HEAD, normalise_large_parties
+from dayparts import default_daypart_table, pos_daypart_table, config_daypart_table, hour_masks
+from measures import PROJECTABLE, measure_stack, measure_frame
 
 #st.stop()
 def lambda_for_projecting_into_distribution(x, columns, column_to_multiply_for):
@@ -62,16 +69,25 @@ class TransformationAlohaData:
 
     '''
 
-    def __init__(self, data_path, covers_to_project, week_for_distribution=37, plot = False):
-        self.data_distribution = pd.read_csv(data_path)
+    def __init__(self, data_path, covers_to_project, week_for_distribution=37, plot = False, large_party_threshold = THRESHOLD, spend_per_head = SPEND_PER_HEAD, dayparts = None):
+        # the path of the Aloha csv or the dataframe already read (it is not modified)
+        if type(data_path) == str:
+            self.data_distribution = pd.read_csv(data_path)
+        else:
+            self.data_distribution = data_path
         self.week_for_distribution = week_for_distribution
+        self.large_party_threshold = large_party_threshold
+        self.spend_per_head = spend_per_head
+        self.dayparts = dayparts
         self.transform(covers_to_project)
         if plot:
             self.plot()
 
-    def cleaning(self):
+    def cleaning(self, threshold=THRESHOLD, spend_per_head=SPEND_PER_HEAD):
         '''
         Cleaning the data:
+        threshold / spend_per_head: the large party normalisation, for all the stores or {store: value},
+        spend_per_head='median' learns it from the checks of each store
         '''
        
         # filter only the rows with the data that we can use
@@ -86,14 +102,16 @@ class TransformationAlohaData:
         self.data_distribution['Day_Name'] = self.data_distribution['Date'].dt.day_name()
         # add week number
         self.data_distribution['Week_Number'] =self.data_distribution['Date'].dt.isocalendar().week
-        # normalize the guest count if greater than 25 with dividing the sales by the sph set to 50 pp
-        self.data_distribution['Guest_Count'] = self.data_distribution.apply(lambda x: x['Item_Sales'] / 30 if x['Guest_Count'] >= 25 else x['Guest_Count'], axis=1)
+        # normalize the guest count of the large parties dividing the sales by the sph (see large_parties)
+        self.data_distribution['Guest_Count'], adjusted = normalise_large_parties(self.data_distribution, threshold, spend_per_head)
+        self.adjusted_checks = int(adjusted.sum())
     
     def transformation0(self, store_name = 'D8 - Dishoom Birmingham', month = 9):
         '''
         We only considering the Dishoom Birmingham store, and the month of September 2022.
         But we can change the store and the month, to make the analysis for other stores and months.
         '''
+        self.store_name = store_name
         self.data_distribution = self.data_distribution[self.data_distribution['Store_Name'] == store_name]
         self.data_distribution = self.data_distribution[self.data_distribution['Month'] == month]
         self.possible_weeks = self.get_unique_weeks()
@@ -119,7 +137,7 @@ class TransformationAlohaData:
         and preapare the dataframe for the heatmap.
         '''
         # keep columns Guest_Count, Check_Time_Real, Date
-        self.data_distribution = self.data_distribution[['Guest_Count', 'Check_Time_Real', 'Date', 'Item_Sales', 'Day_Part_Name', 'Store_Name', 'Week_Number', 'Day_Name']]
+        self.data_distribution = self.data_distribution[['Guest_Count', 'Check_Time_Real', 'Date', 'Item_Sales', 'Void_Total', 'Day_Part_Name', 'Store_Name', 'Week_Number', 'Day_Name']]
         # create a hour column
         self.data_distribution['Hour'] = self.data_distribution['Check_Time_Real'].apply(lambda x: int(x.split(':')[0]))
         # change if hour == 0
@@ -130,27 +148,18 @@ class TransformationAlohaData:
         We can now group by dayname and hour and sum the guest count.
         Then we can create a new dataframe with the days as columns and the hours as rows.
         '''
-        # fisrt group by dayname and hour and sum the guest count
-        self.data_distribution = self.data_distribution.groupby(['Day_Name', 'Hour']).sum(numeric_only=True).reset_index()
-        # creating a new dataframe with the days as columns and the hours as rows
-        self.data_distribution = self.data_distribution.pivot(index='Hour', columns='Day_Name', values='Guest_Count')
-        # now traspose because we want the days as rows and the hours as columns
-        self.data_distribution = self.data_distribution.T
-        # reindex the days
-        self.data_distribution = self.data_distribution.reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
-
-        # setting up
-                # columns for breakfast, Lunch, Afternoon, Dinner
-        self.hours_columns = self.data_distribution.columns
+        # fisrt group by dayname and hour and sum the guest count, the sales, the voids and the checks
+        # in a single groupby (see measures), the covers are the distribution
+        self.measures, self.measure_hours = measure_stack(self.data_distribution)
+        self.daypart_table = self.find_daypart_table()
+        self.data_distribution = self.measure_distribution('Covers')
 
-        self.breakfast_columns = [col for col in self.hours_columns \
-                    if col < 12]
-        self.lunch_columns = [col for col in self.hours_columns \
-                    if col >= 12 and col < 15]
-        self.evening_columns = [col for col in self.hours_columns \
-                    if col >= 15 and col < 18]
-        self.dinner_columns = [col for col in self.hours_columns \
-                    if col >= 18]
+        # the hours of each daypart from the boolean hour masks of the store (see dayparts)
+        self.hours_columns = self.data_distribution.columns
+        masks = hour_masks(self.daypart_table[None, :], self.hours_columns)[0]
+        self.breakfast_columns, self.lunch_columns, self.evening_columns, self.dinner_columns = [
+            list(self.hours_columns[mask]) for mask in masks
+        ]
 
         self.dictionary_mapping = {
             'breakfast': self.breakfast_columns,
@@ -185,10 +194,37 @@ class TransformationAlohaData:
         data_distribution.drop(columns=['day'], inplace=True)
         self.data_distribution = data_distribution
         # all the columns are need to be :00
-        self.data_distribution.columns = [f'{col}:00' if col < 24 else f'{col-24}:00' for col in self.data_distribution.columns]
+        self.data_distribution.columns = hour_labels(self.data_distribution.columns)
     
+    def find_daypart_table(self):
+        '''
+        The daypart of each hour 1..24 of the store: the fixed cut-offs (dayparts None),
+        the Day_Part_Name of its checks ('pos') or a config table (see dayparts.config_daypart_table).
+        '''
+        if self.dayparts is None:
+            return default_daypart_table()[0]
+        if type(self.dayparts) == str and self.dayparts == 'pos':
+            return pos_daypart_table(self.data_distribution, [self.store_name])[0]
+        return config_daypart_table(self.dayparts, [self.store_name])[0]
+
+    def measure_distribution(self, measure):
+        '''day x hour dataframe of one of the measures (Covers, Item_Sales, Void_Total, Checks, Spend_Per_Head)'''
+        return measure_frame(self.measures, self.measure_hours, measure)
+
+    def measure_view(self, measure, covers_to_project):
+        '''
+        A copy of the transformation with the projection split over the hours by the distribution of
+        another measure (e.g. Item_Sales for a sales weighted distribution), no need to aggregate again.
+        '''
+        if measure not in PROJECTABLE:
+            raise ValueError(f'{measure} does not add up over the hours, use one of {PROJECTABLE}')
+        view = copy.copy(self)
+        view.data_distribution = self.measure_distribution(measure)
+        view.transformation4(covers_to_project)
+        return view
+
     def transform(self, covers_to_project):
-        self.cleaning()
+        self.cleaning(self.large_party_threshold, self.spend_per_head)
         self.transformation0()
         self.transformation1()
         self.transformation2()
@@ -197,22 +233,7 @@ class TransformationAlohaData:
         return self.data_distribution
 
     def plot(self):
-        # create a heatmap
-        fig = go.Figure(data=go.Heatmap(
-                z=self.data_distribution,
-                x=self.data_distribution.columns,
-                y=self.data_distribution.index,
-                hoverongaps = False,
-                text = self.data_distribution,
-                hovertemplate = 'Day: %{y}<br>Hour: %{x}<br>Number of people: %{z}<extra></extra>',
-                textsrc='z', texttemplate='%{z}',
-                colorscale='Blues',
-                showscale=False,
-                ))
-        # plot
-        fig.update_layout(
-            title='Aloha Hours')
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(covers_heatmap_figure(self.data_distribution), use_container_width=True)
 
     def change_week_for_distribution(self, week_for_distribution):
         self.week_for_distribution = week_for_distribution
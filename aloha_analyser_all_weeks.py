@@ -1,6 +1,14 @@
+import copy
+
+import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.graph_objects as go
+
+from heatmap_figures import covers_heatmap_figure
+from rota_ingest import hour_labels
+from large_parties import THRESHOLD, SPEND_PER_HEAD, normalise_large_parties
+from dayparts import DAYS, default_daypart_table, pos_daypart_table, config_daypart_table, hour_masks
+from measures import PROJECTABLE, measure_stack, measure_frame
 
 #st.stop()
 def lambda_for_projecting_into_distribution(x, columns, column_to_multiply_for):
@@ -59,16 +67,34 @@ class TransformationAlohaData:
     and projecting the predicted covers for the week, to examine efficiency of the labour model.
     The final dataframe will have the days as rows and the hours as columns.
 
+    quantiles: e.g. [0.1, 0.5, 0.9], also keep the week axis and find these quantiles of the covers
+    for each day x hour (see find_quantiles and quantile_view), to staff to P80 demand and not to the mean.
+
+    large_party_threshold / spend_per_head: the normalisation of the large party checks (see large_parties),
+    spend_per_head='median' learns each store's spend per head, adjusted_checks is the number of checks changed.
+
+    dayparts: None for the fixed cut-offs (12, 15, 18), 'pos' for the Day_Part_Name of the store's checks,
+    or a config table (Store_Name, Daypart, Start_Hour, End_Hour), see find_daypart_table.
     '''
-    def __init__(self, data_path, covers_to_project, plot = False):
-        self.data_distribution = pd.read_csv(data_path)
+    def __init__(self, data_path, covers_to_project, plot = False, quantiles = None, large_party_threshold = THRESHOLD, spend_per_head = SPEND_PER_HEAD, dayparts = None):
+        # the path of the Aloha csv or the dataframe already read (it is not modified)
+        if type(data_path) == str:
+            self.data_distribution = pd.read_csv(data_path)
+        else:
+            self.data_distribution = data_path
+        self.quantiles = quantiles
+        self.large_party_threshold = large_party_threshold
+        self.spend_per_head = spend_per_head
+        self.dayparts = dayparts
         self.transform(covers_to_project)
         if plot:
             self.plot()
 
-    def cleaning(self):
+    def cleaning(self, threshold=THRESHOLD, spend_per_head=SPEND_PER_HEAD):
         '''
         Cleaning the data:
+        threshold / spend_per_head: the large party normalisation, for all the stores or {store: value},
+        spend_per_head='median' learns it from the checks of each store
         '''
        
         # filter only the rows with the data that we can use
@@ -84,14 +110,16 @@ class TransformationAlohaData:
         # add week number
         self.data_distribution['Week_Number'] =self.data_distribution['Date'].dt.isocalendar().week
         #self.data_distribution = self.data_distribution[self.data_distribution['Week_Number'] == 37]
-        # normalize the guest count if greater than 25 with dividing the sales by the sph set to 50 pp
-        self.data_distribution['Guest_Count'] = self.data_distribution.apply(lambda x: x['Item_Sales'] / 30 if x['Guest_Count'] >= 25 else x['Guest_Count'], axis=1)
+        # normalize the guest count of the large parties dividing the sales by the sph (see large_parties)
+        self.data_distribution['Guest_Count'], adjusted = normalise_large_parties(self.data_distribution, threshold, spend_per_head)
+        self.adjusted_checks = int(adjusted.sum())
     
     def transformation0(self, store_name = 'D8 - Dishoom Birmingham', month = 9):
         '''
         We only considering the Dishoom Birmingham store, and the month of September 2022.
         But we can change the store and the month, to make the analysis for other stores and months.
         '''
+        self.store_name = store_name
         self.data_distribution = self.data_distribution[self.data_distribution['Store_Name'] == store_name]
         self.data_distribution = self.data_distribution[self.data_distribution['Month'] == month]
         self.possible_weeks = self.get_unique_weeks()
@@ -117,7 +145,7 @@ class TransformationAlohaData:
         and preapare the dataframe for the heatmap.
         '''
         # keep columns Guest_Count, Check_Time_Real, Date
-        self.data_distribution = self.data_distribution[['Guest_Count', 'Check_Time_Real', 'Date', 'Item_Sales', 'Day_Part_Name', 'Store_Name', 'Week_Number', 'Day_Name']]
+        self.data_distribution = self.data_distribution[['Guest_Count', 'Check_Time_Real', 'Date', 'Item_Sales', 'Void_Total', 'Day_Part_Name', 'Store_Name', 'Week_Number', 'Day_Name']]
         # create a hour column
         self.data_distribution['Hour'] = self.data_distribution['Check_Time_Real'].apply(lambda x: int(x.split(':')[0]))
         # change if hour == 0
@@ -125,44 +153,29 @@ class TransformationAlohaData:
         # divide by week 
     def transformation3(self):
         '''
-        We can now group by dayname and hour and sum the guest count.
-        Then we can create a new dataframe with the days as columns and the hours as rows.
-        '''
-        data_all_weeks = []
-        for week in self.possible_weeks:
-            data = self.data_distribution[self.data_distribution['Week_Number'] == week]
-            data = data.groupby(['Day_Name', 'Hour']).sum(numeric_only=True).reset_index()
-            # now pivot
-            data = data.pivot(index='Hour', columns='Day_Name', values='Guest_Count')
-            # now traspose because we want the days as rows and the hours as columns
-            data = data.T
-            # reindex the days
-            data = data.reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
-            # add week number
-            data['Week_Number'] = week
-            # add to week dataframe
-            data_all_weeks.append(data)
-        # drop the week number column
-        data_all_weeks = [data.drop(columns=['Week_Number']) for data in data_all_weeks]
-        data_all_weeks = pd.concat(data_all_weeks).groupby(level=0).mean()
-
-        # now traspose because we want the days as rows and the hours as columns
-        self.data_distribution = data_all_weeks
-        # reindex the days
-        self.data_distribution = self.data_distribution.reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
-
-        # setting up
-                # columns for breakfast, Lunch, Afternoon, Dinner
-        self.hours_columns = self.data_distribution.columns
+        We can now group by dayname and hour and sum the guest count (and the other measures).
+        Then we can create a new dataframe with the days as rows and the hours as columns.
+        '''
+        if self.quantiles is not None:
+            self.quantile_distributions = self.find_quantiles(self.quantiles)
 
-        self.breakfast_columns = [col for col in self.hours_columns \
-                    if col < 12]
-        self.lunch_columns = [col for col in self.hours_columns \
-                    if col >= 12 and col < 15]
-        self.evening_columns = [col for col in self.hours_columns \
-                    if col >= 15 and col < 18]
-        self.dinner_columns = [col for col in self.hours_columns \
-                    if col >= 18]
+        # covers, sales, voids, checks and spend per head of each day x hour, averaged over the weeks
+        # in a single groupby (see measures), the covers are the distribution
+        self.measures, self.measure_hours = measure_stack(self.data_distribution)
+        self.daypart_table = self.find_daypart_table()
+        self.data_distribution = self.measure_distribution('Covers')
+        self.set_dayparts()
+
+    def set_dayparts(self):
+        '''
+        The hours of the distribution that belong to each daypart, from the boolean hour masks
+        of the daypart table of the store.
+        '''
+        self.hours_columns = self.data_distribution.columns
+        masks = hour_masks(self.daypart_table[None, :], self.hours_columns)[0]
+        self.breakfast_columns, self.lunch_columns, self.evening_columns, self.dinner_columns = [
+            list(self.hours_columns[mask]) for mask in masks
+        ]
 
         self.dictionary_mapping = {
             'breakfast': self.breakfast_columns,
@@ -171,6 +184,86 @@ class TransformationAlohaData:
             'dinner': self.dinner_columns
         }
         
+    def week_stack(self):
+        '''
+        The covers for each week x day x hour, from a single groupby (no loop over the weeks).
+        The day x hours without checks in a week are nan so they are left out of the quantiles,
+        as they are left out of the mean of measure_stack and of the covers cube.
+
+        returns (array of shape weeks x 7 x hours, hours)
+        '''
+        data = self.data_distribution.groupby(['Week_Number', 'Day_Name', 'Hour'])['Guest_Count'].sum()
+        data = data.unstack('Hour')
+        hours = list(data.columns)
+        weeks = sorted(self.possible_weeks)
+        data = data.reindex(pd.MultiIndex.from_product([weeks, DAYS]))
+        return data.to_numpy(dtype=float).reshape(len(weeks), len(DAYS), len(hours)), hours
+
+    def find_quantiles(self, quantiles):
+        '''
+        {quantile: day x hour dataframe of the covers} for all the quantiles in one nanquantile call
+        '''
+        stack, hours = self.week_stack()
+        values = np.nanquantile(stack, quantiles, axis=0)
+        return {q: pd.DataFrame(value, index=DAYS, columns=hours) for q, value in zip(quantiles, values)}
+
+    def find_daypart_table(self):
+        '''
+        The daypart of each hour 1..24 of the store: the fixed cut-offs (dayparts None),
+        the Day_Part_Name of its checks ('pos') or a config table (see dayparts.config_daypart_table).
+        '''
+        if self.dayparts is None:
+            return default_daypart_table()[0]
+        if type(self.dayparts) == str and self.dayparts == 'pos':
+            return pos_daypart_table(self.data_distribution, [self.store_name])[0]
+        return config_daypart_table(self.dayparts, [self.store_name])[0]
+
+    def measure_distribution(self, measure):
+        '''day x hour dataframe of one of the measures (Covers, Item_Sales, Void_Total, Checks, Spend_Per_Head)'''
+        return measure_frame(self.measures, self.measure_hours, measure)
+
+    def measure_view(self, measure, covers_to_project):
+        '''
+        A copy of the transformation with the projection split over the hours by the distribution of
+        another measure (e.g. Item_Sales for a sales weighted distribution), no need to aggregate again.
+        '''
+        if measure not in PROJECTABLE:
+            raise ValueError(f'{measure} does not add up over the hours, use one of {PROJECTABLE}')
+        view = copy.copy(self)
+        view.data_distribution = self.measure_distribution(measure)
+        view.transformation4(covers_to_project)
+        return view
+
+    def quantile_view(self, quantile, covers_to_project=None):
+        '''
+        A copy of the transformation with the quantile of the covers as data_distribution,
+        it can be plotted and passed to plotting_both_heatmap like the original.
+
+        If covers_to_project is given the quantile distribution goes through transformation4,
+        otherwise it stays as the historical covers at that quantile.
+        '''
+        view = copy.copy(self)
+        view.data_distribution = self.quantile_distributions[quantile].fillna(0)
+        if covers_to_project is not None:
+            view.transformation4(covers_to_project)
+        else:
+            view.data_distribution = view.data_distribution.round(0)
+            view.data_distribution.columns = hour_labels(view.data_distribution.columns)
+        return view
+
+    def view(self, covers_to_project, quantile=None, measure='Covers'):
+        '''
+        The distribution the app shows for a scenario: the projection split over the hours by the
+        quantile of the covers of the weeks, or by another measure, or the transformation itself.
+        '''
+        if quantile is not None:
+            if measure != 'Covers':
+                raise ValueError('the quantiles are of the covers only, distribute by Covers')
+            return self.quantile_view(quantile, covers_to_project)
+        if measure != 'Covers':
+            return self.measure_view(measure, covers_to_project)
+        return self
+
     def transformation4(self, covers_to_project):
         data_breakfast = find_statistical_distribuition(self.data_distribution, columns_to_find_distribution = self.dictionary_mapping['breakfast'])
         data_lunch = find_statistical_distribuition(self.data_distribution, columns_to_find_distribution = self.dictionary_mapping['afternoon'])
@@ -197,10 +290,26 @@ class TransformationAlohaData:
         data_distribution.drop(columns=['day'], inplace=True)
         self.data_distribution = data_distribution
         # all the columns are need to be :00
-        self.data_distribution.columns = [f'{col}:00' if col < 24 else f'{col-24}:00' for col in self.data_distribution.columns]
+        self.data_distribution.columns = hour_labels(self.data_distribution.columns)
     
+    @classmethod
+    def from_distribution(cls, distribution, covers_to_project, daypart_table=None):
+        '''
+        The projection of an already aggregated distribution (days x int hours, e.g. a week of
+        covers_cube), without reading and cleaning the Aloha export again.
+        daypart_table: the daypart of each hour 1..24 of the store (see dayparts), the fixed cut-offs if None
+        '''
+        transformation = cls.__new__(cls)
+        # the cube is float32, the projection is done in float64 as after transformation3
+        transformation.data_distribution = distribution.astype(float)
+        transformation.quantiles = None
+        transformation.daypart_table = default_daypart_table()[0] if daypart_table is None else daypart_table
+        transformation.set_dayparts()
+        transformation.transformation4(covers_to_project)
+        return transformation
+
     def transform(self, covers_to_project):
-        self.cleaning()
+        self.cleaning(self.large_party_threshold, self.spend_per_head)
         self.transformation0()
         self.transformation1()
         self.transformation2()
@@ -209,22 +318,7 @@ class TransformationAlohaData:
         return self.data_distribution
 
     def plot(self):
-        # create a heatmap
-        fig = go.Figure(data=go.Heatmap(
-                z=self.data_distribution,
-                x=self.data_distribution.columns,
-                y=self.data_distribution.index,
-                hoverongaps = False,
-                text = self.data_distribution,
-                hovertemplate = 'Day: %{y}<br>Hour: %{x}<br>Number of people: %{z}<extra></extra>',
-                textsrc='z', texttemplate='%{z}',
-                colorscale='Blues',
-                showscale=False,
-                ))
-        # plot
-        fig.update_layout(
-            title='Aloha Hours')
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(covers_heatmap_figure(self.data_distribution), use_container_width=True)
 
     def change_week_for_distribution(self, week_for_distribution):
         self.week_for_distribution = week_for_distribution
@@ -0,0 +1,361 @@
+'''
+The implementations of the baseline (ac3800b), frozen as the reference of equivalence_harness.
+
+The live aloha_analyser, aloha_analyser_all_weeks and rota_models_analyser have been optimised
+since, comparing them with themselves would pin nothing. The code below is the baseline one,
+only the plotting (streamlit) was left out and the global of the delivery redistribution of
+main.py is an argument. Do not change it: a change in the output of the app must show up as
+a difference in the harness.
+'''
+import pandas as pd
+
+
+def lambda_for_projecting_into_distribution(x, columns, column_to_multiply_for):
+    '''
+    columns: the columns to project into the distribution ('breakfast', 'lunch', 'afternoon', 'dinner')
+
+    Example:
+    x = data_breakfast.iloc[0]
+    columns = breakfast_columns
+    column_to_multiply_for = 'breakfast'
+
+    x[7, 8, 9, 10, 11] = x[7, 8, 9, 10, 11] * x['breakfast'] (x['breakfast'] is the total for the breakfast covers)
+    '''
+    x[columns] = x[columns] * x[column_to_multiply_for]
+    return x[columns]
+
+def find_statistical_distribuition(data, columns_to_find_distribution):
+    '''
+    Example:
+    We need to find the distribution of the breakfast covers in the hours columns.
+
+    columns = |7|8|9|10|11|12|13|14|15|16|17|18|19|20|21|22|23|
+    columns_to_find_distribution = |7|8|9|10|11|
+    daypart = 'breakfast'
+
+
+    1. First find the total for the columns_to_find_distribution
+    2. Divide each column by the total
+
+    returns a dataframe with the distribution of the breakfast covers in the hours columns
+    e.g.:
+
+    '''
+    # get the columns for the distribution
+    data = data[columns_to_find_distribution]
+    data['Total'] = data.sum(axis=1)
+    data = data.div(data['Total'], axis=0)
+    return data
+
+def merge_with_projected_covers(data, daypart, covers_to_project):
+    '''
+    Here we merge the data with the projected covers.
+    '''
+    data.index.names = ['day']
+    features = ['day'] + [daypart]
+    covers = covers_to_project[features] 
+    data = data.merge(covers, on='day')
+    data.fillna(0, inplace=True)
+    data.drop(columns=['Total'], inplace=True)
+    return data
+
+
+class TransformationAlohaData:
+    '''
+    Finding the Dishoom Birmingham distribution of a week in September 2022,
+    and projecting the predicted covers for the week, to examine efficiency of the labour model.
+
+    The final dataframe will have the days as rows and the hours as columns.
+
+    '''
+
+    def __init__(self, data_path, covers_to_project, week_for_distribution=37, plot = False):
+        self.data_distribution = pd.read_csv(data_path)
+        self.week_for_distribution = week_for_distribution
+        self.transform(covers_to_project)
+
+    def cleaning(self):
+        '''
+        Cleaning the data:
+        '''
+       
+        # filter only the rows with the data that we can use
+        # if void total and sales are == then drop the row
+        self.data_distribution = self.data_distribution[self.data_distribution['Void_Total'] != self.data_distribution['Item_Sales']]
+        self.data_distribution = self.data_distribution[(self.data_distribution['Guest_Count'] != 0) & (self.data_distribution['Item_Sales'] != 0)]
+        # transform the date column in datetime
+        self.data_distribution['Date'] = pd.to_datetime(self.data_distribution['Date'], format='%m-%d-%Y')
+        # add month column  
+        self.data_distribution['Month'] = self.data_distribution['Date'].dt.month
+        # add dayname
+        self.data_distribution['Day_Name'] = self.data_distribution['Date'].dt.day_name()
+        # add week number
+        self.data_distribution['Week_Number'] =self.data_distribution['Date'].dt.isocalendar().week
+        # normalize the guest count if greater than 25 with dividing the sales by the sph set to 50 pp
+        self.data_distribution['Guest_Count'] = self.data_distribution.apply(lambda x: x['Item_Sales'] / 30 if x['Guest_Count'] >= 25 else x['Guest_Count'], axis=1)
+    
+    def transformation0(self, store_name = 'D8 - Dishoom Birmingham', month = 9):
+        '''
+        We only considering the Dishoom Birmingham store, and the month of September 2022.
+        But we can change the store and the month, to make the analysis for other stores and months.
+        '''
+        self.data_distribution = self.data_distribution[self.data_distribution['Store_Name'] == store_name]
+        self.data_distribution = self.data_distribution[self.data_distribution['Month'] == month]
+        self.possible_weeks = self.get_unique_weeks()
+        self.data_distribution = self.data_distribution[self.data_distribution['Week_Number'] == self.week_for_distribution]
+
+    def transformation1(self):
+        '''
+        Here we are going to transform the Open_Time column, that contains the minutes after midnight,
+        in a column with the real time of the check opening.
+        '''
+        self.data_distribution['Check_Hour'] = self.data_distribution['Open_Time'] / 60
+        self.data_distribution['Check_Minutes'] = self.data_distribution['Open_Time'] % 60
+        self.data_distribution['Check_Minutes'] = self.data_distribution['Check_Minutes'].astype(int)
+        # if check minutes < 10, add a 0 before
+        self.data_distribution['Check_Minutes'] = self.data_distribution['Check_Minutes'].apply(lambda x: f'0{x}' if x < 10 else x)
+        self.data_distribution['Check_Time_Real'] = self.data_distribution['Check_Hour'].astype(int).astype(str) + ':' + self.data_distribution['Check_Minutes'].astype(str)
+        self.data_distribution.drop(columns=['Check_Hour', 'Check_Minutes'], inplace=True)
+
+    def transformation2(self):
+        '''
+        We created a new column with the real time of the check opening in the previous step.
+        Now we can use this column to create a new column with the hour of the check opening.
+        and preapare the dataframe for the heatmap.
+        '''
+        # keep columns Guest_Count, Check_Time_Real, Date
+        self.data_distribution = self.data_distribution[['Guest_Count', 'Check_Time_Real', 'Date', 'Item_Sales', 'Day_Part_Name', 'Store_Name', 'Week_Number', 'Day_Name']]
+        # create a hour column
+        self.data_distribution['Hour'] = self.data_distribution['Check_Time_Real'].apply(lambda x: int(x.split(':')[0]))
+        # change if hour == 0
+        self.data_distribution['Hour'] = self.data_distribution['Hour'].apply(lambda x: 24 if x == 0 else x)        
+    
+    def transformation3(self):
+        '''
+        We can now group by dayname and hour and sum the guest count.
+        Then we can create a new dataframe with the days as columns and the hours as rows.
+        '''
+        # fisrt group by dayname and hour and sum the guest count
+        self.data_distribution = self.data_distribution.groupby(['Day_Name', 'Hour']).sum(numeric_only=True).reset_index()
+        # creating a new dataframe with the days as columns and the hours as rows
+        self.data_distribution = self.data_distribution.pivot(index='Hour', columns='Day_Name', values='Guest_Count')
+        # now traspose because we want the days as rows and the hours as columns
+        self.data_distribution = self.data_distribution.T
+        # reindex the days
+        self.data_distribution = self.data_distribution.reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+        # setting up
+                # columns for breakfast, Lunch, Afternoon, Dinner
+        self.hours_columns = self.data_distribution.columns
+
+        self.breakfast_columns = [col for col in self.hours_columns \
+                    if col < 12]
+        self.lunch_columns = [col for col in self.hours_columns \
+                    if col >= 12 and col < 15]
+        self.evening_columns = [col for col in self.hours_columns \
+                    if col >= 15 and col < 18]
+        self.dinner_columns = [col for col in self.hours_columns \
+                    if col >= 18]
+
+        self.dictionary_mapping = {
+            'breakfast': self.breakfast_columns,
+            'afternoon': self.lunch_columns,
+            'evening': self.evening_columns,
+            'dinner': self.dinner_columns
+        }
+        
+    def transformation4(self, covers_to_project):
+        data_breakfast = find_statistical_distribuition(self.data_distribution, columns_to_find_distribution = self.dictionary_mapping['breakfast'])
+        data_lunch = find_statistical_distribuition(self.data_distribution, columns_to_find_distribution = self.dictionary_mapping['afternoon'])
+        data_afternoon = find_statistical_distribuition(self.data_distribution, columns_to_find_distribution = self.dictionary_mapping['evening'])
+        data_dinner = find_statistical_distribuition(self.data_distribution, columns_to_find_distribution = self.dictionary_mapping['dinner'])
+
+        data_breakfast = merge_with_projected_covers(data_breakfast, daypart='breakfast', covers_to_project=covers_to_project)
+        data_lunch = merge_with_projected_covers(data_lunch, daypart='afternoon', covers_to_project=covers_to_project)
+        data_afternoon = merge_with_projected_covers(data_afternoon, daypart='evening', covers_to_project=covers_to_project)
+        data_dinner = merge_with_projected_covers(data_dinner, daypart='dinner', covers_to_project=covers_to_project)
+
+        data_breakfast[self.breakfast_columns] = data_breakfast.apply(lambda x: lambda_for_projecting_into_distribution(x, columns = self.breakfast_columns, column_to_multiply_for = 'breakfast'), axis=1)
+        data_lunch[self.lunch_columns] = data_lunch.apply(lambda x: lambda_for_projecting_into_distribution(x, columns = self.lunch_columns, column_to_multiply_for = 'afternoon'), axis=1)
+        data_afternoon[self.evening_columns] = data_afternoon.apply(lambda x: lambda_for_projecting_into_distribution(x, columns = self.evening_columns, column_to_multiply_for = 'evening'), axis=1)
+        data_dinner[self.dinner_columns] = data_dinner.apply(lambda x: lambda_for_projecting_into_distribution(x, columns = self.dinner_columns, column_to_multiply_for = 'dinner'), axis=1)
+
+        # merge in a single dataframe
+        data_distribution = data_breakfast.merge(data_lunch, on='day').merge(data_afternoon, on='day').merge(data_dinner, on='day') 
+
+        # drop the columns with the projected covers
+        data_distribution.drop(columns=['breakfast', 'afternoon', 'evening', 'dinner'], inplace=True)
+        data_distribution = data_distribution.round(0)
+        data_distribution.index = data_distribution['day']
+        data_distribution.drop(columns=['day'], inplace=True)
+        self.data_distribution = data_distribution
+        # all the columns are need to be :00
+        self.data_distribution.columns = [f'{col}:00' if col < 24 else f'{col-24}:00' for col in self.data_distribution.columns]
+    
+    def transform(self, covers_to_project):
+        self.cleaning()
+        self.transformation0()
+        self.transformation1()
+        self.transformation2()
+        self.transformation3()
+        self.transformation4(covers_to_project)
+        return self.data_distribution
+
+    def get_unique_weeks(self):
+        return self.data_distribution['Week_Number'].unique()
+
+
+class TransformationAlohaDataAllWeeks(TransformationAlohaData):
+    '''aloha_analyser_all_weeks.TransformationAlohaData: the mean of all the weeks of the month'''
+
+    def __init__(self, data_path, covers_to_project, plot = False):
+        self.data_distribution = pd.read_csv(data_path)
+        self.transform(covers_to_project)
+
+    def transformation0(self, store_name = 'D8 - Dishoom Birmingham', month = 9):
+        '''
+        We only considering the Dishoom Birmingham store, and the month of September 2022.
+        But we can change the store and the month, to make the analysis for other stores and months.
+        '''
+        self.data_distribution = self.data_distribution[self.data_distribution['Store_Name'] == store_name]
+        self.data_distribution = self.data_distribution[self.data_distribution['Month'] == month]
+        self.possible_weeks = self.get_unique_weeks()
+        #self.data_distribution = self.data_distribution[self.data_distribution['Week_Number'] == self.week_for_distribution]
+
+    def transformation3(self):
+        '''
+        We can now group by dayname and hour and sum the guest count.
+        Then we can create a new dataframe with the days as columns and the hours as rows.
+        '''
+        data_all_weeks = []
+        for week in self.possible_weeks:
+            data = self.data_distribution[self.data_distribution['Week_Number'] == week]
+            data = data.groupby(['Day_Name', 'Hour']).sum(numeric_only=True).reset_index()
+            # now pivot
+            data = data.pivot(index='Hour', columns='Day_Name', values='Guest_Count')
+            # now traspose because we want the days as rows and the hours as columns
+            data = data.T
+            # reindex the days
+            data = data.reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+            # add week number
+            data['Week_Number'] = week
+            # add to week dataframe
+            data_all_weeks.append(data)
+        # drop the week number column
+        data_all_weeks = [data.drop(columns=['Week_Number']) for data in data_all_weeks]
+        data_all_weeks = pd.concat(data_all_weeks).groupby(level=0).mean()
+
+        # now traspose because we want the days as rows and the hours as columns
+        self.data_distribution = data_all_weeks
+        # reindex the days
+        self.data_distribution = self.data_distribution.reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+        # setting up
+                # columns for breakfast, Lunch, Afternoon, Dinner
+        self.hours_columns = self.data_distribution.columns
+
+        self.breakfast_columns = [col for col in self.hours_columns \
+                    if col < 12]
+        self.lunch_columns = [col for col in self.hours_columns \
+                    if col >= 12 and col < 15]
+        self.evening_columns = [col for col in self.hours_columns \
+                    if col >= 15 and col < 18]
+        self.dinner_columns = [col for col in self.hours_columns \
+                    if col >= 18]
+
+        self.dictionary_mapping = {
+            'breakfast': self.breakfast_columns,
+            'afternoon': self.lunch_columns,
+            'evening': self.evening_columns,
+            'dinner': self.dinner_columns
+        }
+
+
+class TransformationRotaHours:
+    def __init__(self, data_path = 'data/rota_hours_high.csv'):
+        '''
+        The data contains a start time and end time for each shift. 
+        We need to transform this data to a format that we can use to plot a heatmap and a chart.
+        '''
+        if type(data_path) == str:
+            self.data = pd.read_csv(data_path)
+        else:
+            self.data = data_path
+
+    def cleaning(self):
+        '''Cleaning the data (We don't need to keep the shift that starts and ends in the same hour - empty or 0 hours)'''
+        # if start and end columns are equal, drop the row
+        self.data = self.data[self.data['Start Time (Hour)'] != self.data['End Time (Hour)']]
+        # add a hour start and hour end columns
+        self.data['Start_Hour'] = self.data['Start Time (Hour)'].apply(lambda x: int(x.split(':')[0]))
+        self.data['End_Hour'] = self.data['End Time (Hour)'].apply(lambda x: int(x.split(':')[0]))
+        # is start > end? if yes, add 24 to end
+        self.data['End_Hour'] = self.data.apply(lambda x: x['End_Hour'] + 24 if x['Start_Hour'] > x['End_Hour'] else x['End_Hour'], axis=1)
+        #st.write(self.data)
+
+    def transformation0(self):
+        '''
+        Creating the hours columns and populating them with 1 if the hour is between start and end
+        '''
+        # get minimum start time and maximum end time
+        min_start = self.data['Start_Hour'].min()
+        max_end = self.data['End_Hour'].max()
+
+        self.columns_hours = range(min_start, max_end+1)
+        
+        # add columns to dataframe and initialize with 0
+        for col in self.columns_hours:
+            self.data[col] = 0
+
+        # now populate the dataframe with 1 if the hour is between start and end
+        for index, row in self.data.iterrows():
+            for hour in range(row['Start_Hour'], row['End_Hour']):
+                self.data.at[index, hour] = 1
+
+    def transformation1(self):
+        '''
+        Here we are going to apply the groupby function to get the total number of people for each hour.
+        and prepare the dataframe for the heatmap and the charts.
+        1. Groupby day and sum the hours so we get the total number of people for each day
+        '''
+        # now create a dataframe with the total number for each hour
+        self.data = self.data.groupby('Day').sum().reset_index()
+        # set it as index
+        self.data.set_index('Day', inplace=True)
+        # reindex the order of the days
+        self.data = self.data.reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+        # keep only columns with hours
+        self.data = self.data[self.columns_hours]
+        # change columns names
+        self.data.columns = [f'{col}:00' if col < 24 else f'{col-24}:00' for col in self.data.columns]
+        #st.write(self.data)
+
+    def transform(self):
+        self.cleaning()
+        self.transformation0()
+        self.transformation1()
+        return self.data
+
+
+def merge_with_delivery_distributed(projected_covers_high, level='high_delivery', projected_delivery=None):
+    '''
+    The delivery redistribution of main.py before delivery_redistribution, kept as the reference.
+    projected_delivery was a global: delivery_sales.csv / spo as int, here it is passed in.
+    '''
+    columns = ['breakfast', 'afternoon', 'evening', 'dinner']
+    projected_covers_high['Total_summed'] = projected_covers_high[columns].sum(axis=1)
+    total_covers = projected_covers_high['Total_summed'].sum()
+    projected_covers_high['weekly_distribution'] = projected_covers_high['Total_summed'].div(total_covers)
+    projected_covers_high['Total_Cover_Delivery_Distributed'] = projected_covers_high['weekly_distribution'].apply(lambda x: int(x*projected_delivery[level]))
+
+    columns = ['breakfast', 'afternoon', 'evening', 'dinner']
+    for col in columns:
+        projected_covers_high[col] = projected_covers_high[col].div(projected_covers_high['Total_summed'])
+
+    projected_covers_high['Total_summed'] = projected_covers_high['Total_Cover_Delivery_Distributed'] + projected_covers_high['Total_summed']
+    for col in columns:
+        projected_covers_high[col] = projected_covers_high[col].mul(projected_covers_high['Total_summed'])
+
+    projected_covers_high[columns] = projected_covers_high[columns].astype(int)
+    projected_covers_high = projected_covers_high.drop(columns=['Total_summed', 'weekly_distribution', 'Total_Cover_Delivery_Distributed'])
+    return projected_covers_high
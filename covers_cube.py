@@ -0,0 +1,302 @@
+'''
+Covers cube: every store x week x day x hour covers distribution in a single file.
+
+TransformationAlohaData builds the distribution for one store and one week each time
+it runs, re-reading and re-cleaning the whole Aloha export. Here we aggregate the export
+once into a fixed-layout float32 array on disk:
+
+    cube[store, week, day, hour]    (day: Monday..Sunday, hour: 1..24 where 24 is midnight)
+
+next to a small JSON index with the store and week axes. The array is opened with
+memory mapping, so any Streamlit worker or batch job can slice a store/week
+distribution without copying or deserialising, and the pages are shared through
+the OS page cache.
+
+The cube keeps every date of the export. TransformationAlohaData only looks at the dates of
+one month (transformation0, September), so the distributions take a month to match it: the
+days of a week that fall in another month are left out, as the analyser filters them out.
+
+Build it after each data refresh:
+
+    python covers_cube.py data/aloha.csv data/covers_cube
+'''
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dayparts import DAYS, DAYPARTS, default_daypart_table, pos_daypart_table, config_daypart_table, hour_masks, project_dayparts
+from heatmap_figures import covers_heatmap_figure
+from large_parties import THRESHOLD, SPEND_PER_HEAD, normalise_large_parties
+from rota_ingest import hour_labels
+
+# hour 0 is moved to 24 as in TransformationAlohaData.transformation2
+HOURS = list(range(1, 25))
+
+
+def prepare_checks(data, threshold=THRESHOLD, spend_per_head=SPEND_PER_HEAD):
+    '''
+    Vectorised version of TransformationAlohaData.cleaning, transformation1 and transformation2
+    for all the stores and weeks at once.
+    threshold / spend_per_head: the large party normalisation (see large_parties)
+
+    returns one row per usable check with the columns:
+    Store_Name, Date, Year, Month, Week_Number, Day (0 = Monday), Day_Name, Hour (1..24),
+    Guest_Count, Item_Sales, Void_Total, Day_Part_Name
+    and the number of large party checks adjusted in attrs['adjusted_checks']
+    '''
+    # if void total and sales are == then drop the row
+    data = data[data['Void_Total'] != data['Item_Sales']]
+    data = data[(data['Guest_Count'] != 0) & (data['Item_Sales'] != 0)]
+    date = pd.to_datetime(data['Date'], format='%m-%d-%Y')
+    iso = date.dt.isocalendar()
+    # minutes after midnight -> hour of the check opening, 0 becomes 24
+    hour = (data['Open_Time'] // 60).astype(int)
+    hour = hour.where(hour != 0, 24)
+    # normalize the guest count of the large parties dividing the sales by the sph
+    guest_count, adjusted = normalise_large_parties(data, threshold, spend_per_head)
+    checks = pd.DataFrame({
+        'Store_Name': data['Store_Name'],
+        'Date': date,
+        'Year': iso['year'].astype(int),
+        'Month': date.dt.month,
+        'Week_Number': iso['week'].astype(int),
+        'Day': date.dt.dayofweek,
+        'Day_Name': date.dt.day_name(),
+        'Hour': hour,
+        'Guest_Count': guest_count.astype(float),
+        'Item_Sales': data['Item_Sales'],
+        'Void_Total': data['Void_Total'],
+        'Day_Part_Name': data['Day_Part_Name'],
+    })
+    checks.attrs['adjusted_checks'] = int(adjusted.sum())
+    return checks
+
+
+def week_label(year, week):
+    '''ISO year and week -> the label used in the cube index (e.g. 2022-W37)'''
+    return f'{year}-W{week:02d}'
+
+
+def accumulate(codes, shape, weights):
+    '''
+    Sum the weights into a dense array of the given shape in one pass.
+
+    codes: one integer array per axis (e.g. store, week, day, hour positions)
+    '''
+    flat = np.ravel_multi_index(codes, shape)
+    total = np.bincount(flat, weights=weights, minlength=int(np.prod(shape)))
+    return total.reshape(shape)
+
+
+def build_covers_cube(data, path, threshold=THRESHOLD, spend_per_head=SPEND_PER_HEAD):
+    '''
+    Aggregate the Aloha checks into the covers cube and write it to disk.
+
+    data: path of the Aloha csv, the raw dataframe or the output of prepare_checks
+    path: the cube is written to <path>.bin (float32, C order) and <path>.json (index)
+    threshold / spend_per_head: the large party normalisation of the raw checks (see large_parties)
+
+    The files are written next to the destination and then moved in place, so readers
+    in other processes never see a half written cube. The dayparts of the POS (the daypart
+    most checks of each store x hour were rung in) are kept in the index, see daypart_table.
+    '''
+    if type(data) == str:
+        data = pd.read_csv(data)
+    if 'Hour' not in data.columns:
+        data = prepare_checks(data, threshold, spend_per_head)
+
+    store_codes, stores = pd.factorize(data['Store_Name'], sort=True)
+    # year * 100 + week sorts as the labels
+    week_codes, week_keys = pd.factorize(data['Year'] * 100 + data['Week_Number'], sort=True)
+    weeks = [week_label(key // 100, key % 100) for key in week_keys]
+    shape = (len(stores), len(weeks), len(DAYS), len(HOURS))
+    cube = accumulate(
+        (store_codes, week_codes, data['Day'].to_numpy(), data['Hour'].to_numpy() - 1),
+        shape,
+        data['Guest_Count'].to_numpy(dtype=float),
+    ).astype(np.float32)
+    # the dates of each week inside the dates of the export, the weeks at its ends can be partial
+    monday = pd.Series((data['Date'] - pd.to_timedelta(data['Day'], unit='D')).to_numpy()).groupby(week_codes).first()
+    week_dates = monday.to_numpy()[:, None] + pd.to_timedelta(np.arange(len(DAYS)), unit='D').to_numpy()[None, :]
+    week_days = ((week_dates >= data['Date'].min().to_datetime64()) & (week_dates <= data['Date'].max().to_datetime64())).sum(axis=1)
+
+    index = {
+        'stores': list(stores),
+        'weeks': list(weeks),
+        'days': DAYS,
+        'hours': HOURS,
+        'shape': list(shape),
+        'dtype': 'float32',
+        'adjusted_checks': data.attrs.get('adjusted_checks'),
+        'pos_dayparts': pos_daypart_table(data, list(stores)).tolist(),
+        'week_days': week_days.tolist(),
+    }
+    cube.tofile(f'{path}.bin.tmp')
+    with open(f'{path}.json.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(f'{path}.bin.tmp', f'{path}.bin')
+    os.replace(f'{path}.json.tmp', f'{path}.json')
+    return CoversCube(path)
+
+
+class CoversCube:
+    '''
+    Read only, memory mapped view over a cube written by build_covers_cube.
+
+    cube = CoversCube('data/covers_cube')
+    cube.distribution('D8 - Dishoom Birmingham', 37, month=9)   # same as transformation3
+
+    month: None for all the dates of the cube, a month number (9, of any year, as transformation0)
+    or a year and month ('2022-09'): only the week x day cells with a date in the month are used.
+    '''
+
+    def __init__(self, path):
+        with open(f'{path}.json') as f:
+            self.index = json.load(f)
+        self.stores = self.index['stores']
+        self.weeks = self.index['weeks']
+        self.data = np.memmap(f'{path}.bin', dtype=self.index['dtype'], mode='r', shape=tuple(self.index['shape']))
+        self.store_position = {store: i for i, store in enumerate(self.stores)}
+        self.week_position = {week: i for i, week in enumerate(self.weeks)}
+
+    def get_week_position(self, week):
+        '''
+        week can be a label (2022-W37) or a week number (37),
+        a week number maps to the most recent year that has it.
+        '''
+        if week in self.week_position:
+            return self.week_position[week]
+        matching = [i for i, label in enumerate(self.weeks) if label.endswith(f'-W{int(week):02d}')]
+        if not matching:
+            raise KeyError(f'week {week} is not in the cube')
+        return matching[-1]
+
+    def slice(self, store, week):
+        '''day x hour numpy view (7 x 24) for one store and week, nothing is copied'''
+        return self.data[self.store_position[store], self.get_week_position(week)]
+
+    def week_dates(self):
+        '''(weeks x 7) date of each week x day cell'''
+        mondays = pd.to_datetime([f'{label}-1' for label in self.weeks], format='%G-W%V-%u')
+        return mondays.to_numpy()[:, None] + pd.to_timedelta(np.arange(len(DAYS)), unit='D').to_numpy()[None, :]
+
+    def month_mask(self, month=None):
+        '''(weeks x 7) True on the cells with a date in the month (see the class docstring)'''
+        if month is None:
+            return np.ones((len(self.weeks), len(DAYS)), dtype=bool)
+        dates = pd.DatetimeIndex(self.week_dates().ravel())
+        if type(month) == str:
+            inside = dates.strftime('%Y-%m') == month
+        else:
+            inside = dates.month == int(month)
+        return np.asarray(inside).reshape(len(self.weeks), len(DAYS))
+
+    def week_values(self, store, positions, month=None):
+        '''(weeks x 7 x 24) covers of the store in float, 0 on the days outside the month'''
+        values = self.data[self.store_position[store], positions].astype(float)
+        return values * self.month_mask(month)[positions][..., None]
+
+    def full_weeks(self):
+        '''boolean per week: all its 7 dates are in the export (cubes built before week_days count as full)'''
+        return np.array(self.index.get('week_days', [len(DAYS)] * len(self.weeks))) >= len(DAYS)
+
+    def weeks_for_store(self, store, month=None):
+        '''the week labels with at least one cover for the store (in the month)'''
+        totals = self.week_values(store, slice(None), month).sum(axis=(1, 2))
+        return [week for week, total in zip(self.weeks, totals) if total > 0]
+
+    def to_frame(self, matrix):
+        '''
+        day x hour matrix -> dataframe like the transformation3 output:
+        days as rows and only the span of hours that had covers as columns
+        '''
+        open_hours = np.flatnonzero(matrix.sum(axis=0))
+        if len(open_hours) == 0:
+            return pd.DataFrame(index=DAYS)
+        first, last = open_hours[0], open_hours[-1] + 1
+        return pd.DataFrame(matrix[:, first:last], index=DAYS, columns=HOURS[first:last], copy=False)
+
+    def distribution(self, store, week, month=None):
+        '''the week as transformation3 for a single week, with month the days of the week in the month only'''
+        if month is None:
+            return self.to_frame(self.slice(store, week))
+        return self.to_frame(self.week_values(store, [self.get_week_position(week)], month)[0])
+
+    def mean_distribution(self, store, weeks=None, month=None):
+        '''
+        Average over the weeks (all the weeks that traded in the month if None): as the mean of
+        the pivots of aloha_analyser_all_weeks.transformation3, each day x hour is averaged over
+        the weeks that had checks in it. The analyser only averages the dates of its month, pass
+        month=9 to match it, with None every date of the cube is averaged.
+        '''
+        if weeks is None:
+            weeks = self.weeks_for_store(store, month)
+        positions = [self.get_week_position(week) for week in weeks]
+        values = self.week_values(store, positions, month)
+        weeks_with_checks = (values != 0).sum(axis=0)
+        mean = np.divide(values.sum(axis=0), weeks_with_checks, out=np.zeros(values.shape[1:]), where=weeks_with_checks > 0)
+        return self.to_frame(mean)
+
+    def daypart_table(self, dayparts=None):
+        '''
+        (stores x 24) daypart of each hour 1..24 of each store (see dayparts): the fixed cut-offs if None,
+        'pos' for the dayparts of the POS kept by build_covers_cube, or a config table
+        (Store_Name, Daypart, Start_Hour, End_Hour)
+        '''
+        if dayparts is None:
+            return default_daypart_table(len(self.stores))
+        if type(dayparts) == str and dayparts == 'pos':
+            if 'pos_dayparts' not in self.index:
+                raise KeyError('the cube has no POS dayparts, build it again')
+            return np.array(self.index['pos_dayparts'])
+        return config_daypart_table(dayparts, self.stores)
+
+    def project(self, projected, week=None, dayparts=None, month=None):
+        '''
+        The projection of TransformationAlohaData.transformation4 for all the stores in one pass,
+        the daypart table compiled once into hour masks (see dayparts.project_dayparts).
+
+        projected: day and the daypart covers, the same for all the stores or one row per Store_Name x day
+        week: a week label or number, None for the average of the weeks as mean_distribution
+        dayparts: see daypart_table
+        month: only the dates in the month, as mean_distribution
+
+        returns the (stores x 7 x 24) projected covers, 0 where a store has no projection
+        '''
+        mask = self.month_mask(month)[None, :, :, None]
+        if week is None:
+            values = self.data.astype(float) * mask
+            weeks_with_checks = (values != 0).sum(axis=1)
+            distributions = np.divide(values.sum(axis=1), weeks_with_checks, out=np.zeros(weeks_with_checks.shape), where=weeks_with_checks > 0)
+        else:
+            position = self.get_week_position(week)
+            distributions = self.data[:, position].astype(float) * mask[:, position]
+
+        if 'Store_Name' in projected.columns:
+            covers = projected.set_index(['Store_Name', 'day'])[DAYPARTS].reindex(pd.MultiIndex.from_product([self.stores, DAYS]))
+            covers = covers.to_numpy(dtype=float).reshape(len(self.stores), len(DAYS), len(DAYPARTS))
+        else:
+            covers = projected.set_index('day')[DAYPARTS].reindex(DAYS).to_numpy(dtype=float)
+            covers = np.broadcast_to(covers, (len(self.stores), len(DAYS), len(DAYPARTS)))
+        masks = hour_masks(self.daypart_table(dayparts), HOURS)
+        return project_dayparts(distributions, np.nan_to_num(covers), masks)
+
+    def plot(self, store, week, month=None):
+        data = self.distribution(store, week, month)
+        data.columns = hour_labels(data.columns)
+        st.plotly_chart(covers_heatmap_figure(data, title=f'Covers {store} {week}'), use_container_width=True)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        # python covers_cube.py data/aloha.csv data/covers_cube
+        build_covers_cube(sys.argv[1], sys.argv[2])
+    else:
+        # streamlit run covers_cube.py
+        cube = CoversCube('data/covers_cube')
+        store = st.selectbox('Select store', cube.stores)
+        week = st.selectbox('Select week', cube.weeks_for_store(store))
+        cube.plot(store, week)
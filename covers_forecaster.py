@@ -0,0 +1,139 @@
+'''
+Covers forecaster built on the aggregated Aloha history (the covers cube).
+
+projected_high/med/low.csv are typed by hand. Here we forecast every store at once from
+the store x week x day x hour covers of covers_cube:
+
+1. med:  exponential smoothing over the week axis of each store x day x hour cell
+         (the day x hour profile is the weekly seasonality), the weeks a store did not
+         trade and the partial weeks at the ends of the export are left out of the weights
+2. bands: for each store the weekly totals are compared with the smoothed week,
+          the low / high quantiles of that ratio over the history scale med into low / high
+3. the hours are summed into the dayparts to get the projected_*.csv shape, with the same
+   daypart table as the projection (CoversCube.project / transformation4) so projecting the
+   forecast back gives the forecast hours
+
+Everything is a handful of array operations on the cube, so the whole estate takes seconds.
+Nightly refresh:
+
+    python covers_forecaster.py data/covers_cube data/forecast
+'''
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from covers_cube import CoversCube, HOURS
+from dayparts import DAYS, DAYPARTS, hour_masks
+
+BANDS = ['high', 'med', 'low']
+
+
+def smoothing_weights(n_weeks, alpha):
+    '''weight of each week in simple exponential smoothing, the last week weighs alpha'''
+    return alpha * (1 - alpha) ** np.arange(n_weeks - 1, -1, -1)
+
+
+def forecast_covers(cube, alpha=0.3, quantiles=(0.1, 0.9), last_week=None):
+    '''
+    cube: CoversCube (or its path)
+    alpha: smoothing factor, higher follows the last weeks more
+    quantiles: (low, high) quantiles of the weekly ratio to the smoothed week
+    last_week: forecast from the history up to this week (label or number), all the weeks if None
+
+    returns {'high': ..., 'med': ..., 'low': ...} arrays of shape (stores, 7, 24)
+    '''
+    if type(cube) == str:
+        cube = CoversCube(cube)
+    history = np.asarray(cube.data, dtype=float)
+    full_weeks = cube.full_weeks()
+    if last_week is not None:
+        history = history[:, :cube.get_week_position(last_week) + 1]
+        full_weeks = full_weeks[:history.shape[1]]
+
+    weekly_totals = history.sum(axis=(2, 3))
+    # a week cut by the ends of the export would pull the days it misses to 0
+    traded = (weekly_totals > 0) & full_weeks[None, :]
+    weights = smoothing_weights(history.shape[1], alpha)[None, :] * traded
+    weights = weights / np.maximum(weights.sum(axis=1, keepdims=True), 1e-12)
+    med = np.einsum('sw,swdh->sdh', weights, history)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = weekly_totals / med.sum(axis=(1, 2))[:, None]
+    ratio[~traded] = np.nan
+    low_ratio, high_ratio = np.nanquantile(ratio, quantiles, axis=1) if ratio.size else (ratio, ratio)
+    low_ratio = np.nan_to_num(low_ratio, nan=1.0)
+    high_ratio = np.nan_to_num(high_ratio, nan=1.0)
+    return {
+        'high': med * high_ratio[:, None, None],
+        'med': med,
+        'low': med * low_ratio[:, None, None],
+    }
+
+
+def daypart_totals(hourly, daypart_table):
+    '''
+    (stores, 7, 24) covers per hour -> (stores, 7, dayparts) covers per daypart
+    daypart_table: the (stores x 24) daypart of each hour (see CoversCube.daypart_table)
+    '''
+    masks = hour_masks(daypart_table, HOURS)
+    return np.einsum('sdh,sph->sdp', hourly, masks)
+
+
+def projections_frame(stores, dayparts):
+    '''(stores, 7, dayparts) -> Store_Name, day, breakfast, afternoon, evening, dinner'''
+    data = pd.DataFrame(np.rint(dayparts.reshape(-1, len(DAYPARTS))).astype(int), columns=DAYPARTS)
+    data.insert(0, 'day', np.tile(DAYS, len(stores)))
+    data.insert(0, 'Store_Name', np.repeat(stores, len(DAYS)))
+    return data
+
+
+def hourly_frame(stores, hourly):
+    '''(stores, 7, 24) -> Store_Name, day and one column per hour'''
+    data = pd.DataFrame(hourly.reshape(-1, len(HOURS)).round(1), columns=HOURS)
+    data.insert(0, 'day', np.tile(DAYS, len(stores)))
+    data.insert(0, 'Store_Name', np.repeat(stores, len(DAYS)))
+    return data
+
+
+def forecast_projections(cube, alpha=0.3, quantiles=(0.1, 0.9), last_week=None, dayparts=None):
+    '''
+    {'high': ..., 'med': ..., 'low': ...} dataframes in the projected_*.csv shape for every store,
+    dayparts: the hours of each daypart as in the projection (see CoversCube.daypart_table)
+    '''
+    if type(cube) == str:
+        cube = CoversCube(cube)
+    forecast = forecast_covers(cube, alpha=alpha, quantiles=quantiles, last_week=last_week)
+    daypart_table = cube.daypart_table(dayparts)
+    return {band: projections_frame(cube.stores, daypart_totals(forecast[band], daypart_table)) for band in BANDS}
+
+
+def write_projections(projections, directory, store_name=None):
+    '''
+    Writes projected_high.csv, projected_med.csv and projected_low.csv in directory.
+    With a store_name only that store is written, in the same shape the app reads.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    for band, data in projections.items():
+        if store_name is not None:
+            data = data[data['Store_Name'] == store_name].drop(columns=['Store_Name'])
+        data.to_csv(os.path.join(directory, f'projected_{band}.csv'), index=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        # python covers_forecaster.py data/covers_cube data/forecast
+        write_projections(forecast_projections(sys.argv[1]), sys.argv[2])
+    else:
+        # streamlit run covers_forecaster.py
+        cube = CoversCube('data/covers_cube')
+        c1, c2 = st.columns(2)
+        alpha = c1.slider('Smoothing (alpha)', 0.05, 0.95, 0.3)
+        store = c2.selectbox('Select store', cube.stores)
+        projections = forecast_projections(cube, alpha=alpha)
+        columns = st.columns(3)
+        for column, band in zip(columns, BANDS):
+            column.subheader(band.capitalize())
+            column.write(projections[band][projections[band]['Store_Name'] == store].drop(columns=['Store_Name']))
@@ -0,0 +1,143 @@
+'''
+Dayparts used to split the hours of the day.
+
+The projected covers (projected_*.csv) are given per daypart, the hours that belong to each
+daypart are the same as in TransformationAlohaData.transformation3:
+
+breakfast < 12, afternoon 12 - 15, evening 15 - 18, dinner >= 18 (the hours after midnight included)
+
+Not every site follows these cut-offs, so the daypart of each hour can also be set per store,
+from the Day_Part_Name the POS puts on each check or from a config table. Either way it is
+compiled once into a (stores x 24) table and then into boolean hour masks, which drive the
+projection of all the stores in one einsum (project_dayparts).
+'''
+import numpy as np
+import pandas as pd
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+DAYPARTS = ['breakfast', 'afternoon', 'evening', 'dinner']
+# first hour of each daypart
+DAYPART_STARTS = [0, 12, 15, 18]
+# the hours before this one belong to the night of the day before
+DAY_START = 7
+
+
+def business_hours(hours, day_start=DAY_START):
+    '''clock hours -> hours of the business day (1 -> 25, the night after the day)'''
+    hours = np.asarray(hours)
+    return np.where(hours < day_start, hours + 24, hours)
+
+
+def daypart_of_hours(hours, starts=DAYPART_STARTS):
+    '''hours (array) -> position of their daypart in DAYPARTS'''
+    return np.searchsorted(starts, np.asarray(hours), side='right') - 1
+
+
+def daypart_masks(hours, starts=DAYPART_STARTS):
+    '''boolean (dayparts x hours) mask, masks[p, h] is True if hours[h] is in DAYPARTS[p]'''
+    return daypart_of_hours(hours, starts)[None, :] == np.arange(len(DAYPARTS))[:, None]
+
+
+# the Day_Part_Name labels of the POS -> our dayparts, transformation4 projects the
+# POS lunch as afternoon and the POS afternoon as evening
+POS_DAYPARTS = {
+    'breakfast': 'breakfast',
+    'brunch': 'breakfast',
+    'morning': 'breakfast',
+    'lunch': 'afternoon',
+    'afternoon': 'evening',
+    'tea': 'evening',
+    'evening': 'evening',
+    'dinner': 'dinner',
+    'late': 'dinner',
+    'late night': 'dinner',
+    'night': 'dinner',
+}
+# the hours of covers_cube and transformation3, 24 is midnight
+CLOCK_HOURS = np.arange(1, 25)
+
+
+def default_daypart_table(n_stores=1, starts=DAYPART_STARTS):
+    '''
+    (stores x 24) daypart position of each hour 1..24 with the fixed cut-offs of transformation3
+    (the hours after midnight, 1..6, in breakfast as there)
+    '''
+    return np.tile(daypart_of_hours(CLOCK_HOURS, starts), (n_stores, 1))
+
+
+def pos_daypart_table(checks, stores, aliases=POS_DAYPARTS):
+    '''
+    checks: Store_Name, Hour (1..24) and the Day_Part_Name of the POS
+    stores: the stores of the rows of the table
+
+    each store x hour gets the daypart most of its checks were rung in (one bincount),
+    the hours without checks or with labels not in aliases keep the fixed cut-offs
+    '''
+    labels, names = pd.factorize(checks['Day_Part_Name'])
+    name_dayparts = np.array([
+        DAYPARTS.index(aliases[name]) if aliases.get(name) in DAYPARTS else -1
+        for name in names.astype(str).str.strip().str.lower()
+    ] + [-1])
+    daypart = name_dayparts[labels]
+    store = pd.Categorical(checks['Store_Name'], categories=stores).codes
+    hour = checks['Hour'].to_numpy(dtype=int)
+    known = (daypart >= 0) & (store >= 0)
+
+    shape = (len(stores), len(CLOCK_HOURS), len(DAYPARTS))
+    counts = np.bincount(
+        np.ravel_multi_index((store[known], hour[known] - 1, daypart[known]), shape),
+        minlength=np.prod(shape),
+    ).reshape(shape)
+    return np.where(counts.sum(axis=2) > 0, counts.argmax(axis=2), default_daypart_table(len(stores)))
+
+
+def config_daypart_table(config, stores):
+    '''
+    config: Store_Name, Daypart, Start_Hour, End_Hour (clock hours as 12 or '12:00', the end excluded,
+    an end before the start goes past midnight)
+    stores: the stores of the rows of the table
+
+    the hours (and the stores) not in the config keep the fixed cut-offs
+    '''
+    table = default_daypart_table(len(stores))
+    store = pd.Categorical(config['Store_Name'], categories=stores).codes
+    daypart = pd.Categorical(config['Daypart'].str.strip().str.lower(), categories=DAYPARTS).codes
+    start = config['Start_Hour'].astype(str).str.split(':').str[0].astype(int).to_numpy()[:, None] % 24
+    end = config['End_Hour'].astype(str).str.split(':').str[0].astype(int).to_numpy()[:, None] % 24
+    clock = CLOCK_HOURS % 24
+    inside = np.where(start < end, (clock >= start) & (clock < end), (clock >= start) | (clock < end))
+    inside &= ((store >= 0) & (daypart >= 0))[:, None]
+    rows, hours = np.nonzero(inside)
+    table[store[rows], hours] = daypart[rows]
+    return table
+
+
+def hour_masks(table, hours):
+    '''
+    table: (stores x 24) daypart of each hour 1..24, hours: the int hour columns of a distribution
+    (clock hours 1..24 or business hours, 25 is 1:00)
+
+    returns boolean (stores x dayparts x hours), masks[s, p, h] is True if hours[h] is in DAYPARTS[p] at store s
+    '''
+    clock = (np.asarray(hours, dtype=int) - 1) % 24
+    return np.asarray(table)[:, clock][:, None, :] == np.arange(len(DAYPARTS))[None, :, None]
+
+
+def project_dayparts(distributions, projected, masks):
+    '''
+    transformation4 for all the stores in one pass:
+    distributions: (stores x days x hours) covers
+    projected:     (stores x days x dayparts) projected covers
+    masks:         (stores x dayparts x hours) from hour_masks
+
+    each hour gets its share of its daypart x the projected covers of the daypart,
+    rounded as transformation4 (0 where the daypart had no covers)
+    '''
+    masks = masks.astype(float)
+    totals = np.einsum('sdh,sph->sdp', np.nan_to_num(distributions), masks)
+    # the daypart total and the projected covers of the daypart of each hour
+    hour_totals = np.einsum('sdp,sph->sdh', totals, masks)
+    hour_projected = np.einsum('sdp,sph->sdh', projected, masks)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covers = distributions / hour_totals * hour_projected
+    return np.round(np.nan_to_num(covers, nan=0.0, posinf=0.0, neginf=0.0), 0)
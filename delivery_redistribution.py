@@ -0,0 +1,133 @@
+'''
+Vectorised delivery redistribution.
+
+The delivery sales forecast is turned into delivery covers (sales / spend per order) and spread
+over the days of the week and the dayparts of each day, following the projected covers:
+
+1. Sum the projected covers in breakfast, afternoon, evening and dinner for each day
+   and divide by the weekly total to get the weekly distribution
+2. The delivery covers of the day are the weekly distribution x the delivery covers of the week
+3. Each daypart keeps its share of the day, applied to the day total plus the delivery covers
+
+Any number of weeks, scenarios and stores are done in one broadcast: the rows of the projected
+covers are matched to their delivery forecast by the key columns the two frames have in common
+(e.g. Store_Name, Week, Scenario). A key only the delivery has (e.g. Week with a projection of a
+single week) repeats the projected covers for each of its values. The frames passed in are never
+modified.
+'''
+import numpy as np
+import pandas as pd
+
+from dayparts import DAYPARTS
+
+
+def delivery_from_wide(delivery, value_name='Delivery_Sales'):
+    '''
+    delivery_sales.csv has a column per scenario (high_delivery, med_delivery, low_delivery),
+    here it becomes one row per scenario with a Scenario column (high, med, low).
+    The other columns (e.g. Week, Store_Name) are kept as keys.
+    '''
+    delivery = delivery.rename(columns=lambda col: col.strip())
+    levels = [col for col in delivery.columns if col.endswith('_delivery')]
+    keys = [col for col in delivery.columns if col not in levels]
+    delivery = delivery.melt(id_vars=keys, value_vars=levels, var_name='Scenario', value_name=value_name)
+    delivery['Scenario'] = delivery['Scenario'].str.replace('_delivery', '')
+    return delivery
+
+
+def redistribute_delivery(projected_covers, delivery, spend_per_order=38.99, value_name='Delivery_Sales'):
+    '''
+    projected_covers: day, breakfast, afternoon, evening, dinner (+ key columns), one row per day
+    delivery:         key columns + Delivery_Sales, one row per week (and scenario, store ...)
+    spend_per_order:  a number, a {Store_Name: spo} dict, or a Spend_Per_Order column in delivery
+                      (a ValueError names the stores with delivery sales and no spend per order)
+
+    returns a new dataframe like projected_covers with the delivery covers added to the dayparts,
+    one copy of the projected covers for each value of the keys only the delivery has
+    '''
+    keys = [col for col in delivery.columns if col in projected_covers.columns and col not in DAYPARTS + ['day']]
+    extra_keys = [col for col in delivery.columns if col not in projected_covers.columns and col not in [value_name, 'Spend_Per_Order']]
+    if extra_keys:
+        # the same projected week for each week (store, ...) of the delivery forecast,
+        # the rows without a delivery forecast are kept once
+        combinations = delivery[keys + extra_keys].drop_duplicates()
+        how = {'on': keys, 'how': 'left'} if keys else {'how': 'cross'}
+        projected_covers = projected_covers.merge(combinations, **how)
+        projected_covers = projected_covers.sort_values(extra_keys, kind='stable').reset_index(drop=True)
+        keys = keys + extra_keys
+    if len(delivery) > 1 and not keys:
+        raise ValueError('delivery has more than one row but no key column in common with projected_covers')
+    if keys and delivery.duplicated(keys).any():
+        raise ValueError(f'delivery has more than one row for some {keys}')
+
+    # delivery sales of the week of each row
+    if keys:
+        rows = projected_covers[keys].merge(delivery, on=keys, how='left')
+    else:
+        rows = pd.concat([delivery] * len(projected_covers), ignore_index=True)
+    sales = rows[value_name].fillna(0).to_numpy(dtype=float)
+    if 'Spend_Per_Order' in rows.columns:
+        spo = rows['Spend_Per_Order'].to_numpy(dtype=float)
+    elif isinstance(spend_per_order, dict):
+        spo = rows['Store_Name'].map(spend_per_order).to_numpy(dtype=float)
+    else:
+        spo = np.full(len(rows), float(spend_per_order))
+    # a missing spend per order would turn the whole projection of the store into 0
+    missing = (sales != 0) & np.isnan(spo)
+    if missing.any():
+        stores = sorted(rows.loc[missing, 'Store_Name'].unique()) if 'Store_Name' in rows.columns else []
+        raise ValueError(f'no spend per order for the delivery sales of {stores or "some rows"}')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delivery_covers = np.where(sales != 0, np.trunc(sales / spo), 0.0)
+
+    covers = projected_covers[DAYPARTS].to_numpy(dtype=float)
+    total_summed = covers.sum(axis=1)
+    if keys:
+        week = projected_covers.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+    else:
+        week = np.zeros(len(projected_covers), dtype=np.int64)
+    total_covers = np.bincount(week, weights=total_summed)[week]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weekly_distribution = total_summed / total_covers
+        delivery_distributed = np.trunc(weekly_distribution * delivery_covers)
+        redistributed = covers / total_summed[:, None] * (total_summed + delivery_distributed)[:, None]
+    redistributed = np.nan_to_num(redistributed, nan=0.0, posinf=0.0, neginf=0.0)
+
+    result = projected_covers.copy()
+    result[DAYPARTS] = np.trunc(redistributed).astype(int)
+    return result
+
+
+def redistribute_scenarios(projected_covers, delivery, spend_per_order=38.99):
+    '''
+    {'high': projected_high, 'med': ..., 'low': ...} -> the same dict with delivery added,
+    all the scenarios in a single call.
+    '''
+    stacked = pd.concat(
+        [data.assign(Scenario=scenario) for scenario, data in projected_covers.items()],
+        ignore_index=True,
+    )
+    result = redistribute_delivery(stacked, delivery, spend_per_order=spend_per_order)
+    return {
+        scenario: result[result['Scenario'] == scenario].drop(columns=['Scenario']).reset_index(drop=True)
+        for scenario in projected_covers
+    }
+
+
+def redistribute_array(covers, delivery_covers):
+    '''
+    The same redistribution on arrays, for sweeps over many what-ifs at once.
+
+    covers:          (..., days, dayparts) projected covers of a week
+    delivery_covers: (...) delivery covers of that week, broadcast against covers
+
+    returns (..., days, dayparts) covers with the delivery added
+    '''
+    total_summed = covers.sum(axis=-1)
+    total_covers = total_summed.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weekly_distribution = total_summed / total_covers
+        delivery_distributed = np.trunc(weekly_distribution * np.asarray(delivery_covers)[..., None])
+        redistributed = covers / total_summed[..., None] * (total_summed + delivery_distributed)[..., None]
+    return np.trunc(np.nan_to_num(redistributed, nan=0.0, posinf=0.0, neginf=0.0))
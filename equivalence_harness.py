@@ -0,0 +1,290 @@
+'''
+Golden output harness: the original implementations against the optimised paths.
+
+Nothing pinned down the output of TransformationAlohaData, TransformationRotaHours and the
+delivery redistribution, so every speedup was a risk. The original side is the baseline code
+frozen in baseline_reference (the live modules have changed since), both sides run on
+generated inputs with the awkward cases (overnight shifts, days without shifts, dayparts
+without checks, days without checks, zero guest / voided / large party checks) and each stage
+reports if the day x hour matrices are equal and how much faster the optimised path is:
+
+    stage                  original (baseline_reference)               optimised
+    analyser_week          TransformationAlohaData                     aloha_analyser.TransformationAlohaData
+    analyser_all_weeks     TransformationAlohaDataAllWeeks             aloha_analyser_all_weeks.TransformationAlohaData
+    covers_week            TransformationAlohaData                     covers_cube + from_distribution
+    covers_straddling_week TransformationAlohaData on week 35            covers_cube (only the days of September)
+    covers_all_weeks       TransformationAlohaDataAllWeeks             covers_cube mean + from_distribution
+    covers_all_stores      TransformationAlohaData for each store      CoversCube.project (all the stores at once)
+    rota_hours             TransformationRotaHours                     rota_ingest.template_coverage
+    delivery               merge_with_delivery_distributed             delivery_redistribution.redistribute_scenarios
+
+The covers matrices are compared on the union of their hours, an hour missing on one side
+being 0 covers (the original only has the hours with checks, the cube has the whole span).
+
+    python equivalence_harness.py 5 20000
+'''
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import aloha_analyser
+import aloha_analyser_all_weeks
+import baseline_reference
+from covers_cube import build_covers_cube, week_label
+from dayparts import DAYS, DAYPARTS
+from delivery_redistribution import delivery_from_wide, redistribute_scenarios
+from rota_ingest import template_coverage, hour_labels, hours_from_labels
+
+# the store and the month hard coded in TransformationAlohaData.transformation0
+STORE = 'D8 - Dishoom Birmingham'
+MONTH = pd.Timestamp('2022-09-01')
+WEEK = 37
+# 2022-W35 runs from monday 29 august to sunday 4 september
+STRADDLING_WEEK = 35
+STORES = [STORE, 'D1 - Dishoom Covent Garden', 'D2 - Dishoom Shoreditch']
+ROLES = ['Server', 'Runner', 'Host', 'Bartender']
+LEVELS = ['high', 'med', 'low']
+SPEND_PER_ORDER = 38.99
+
+
+def random_checks(rng, n=5000):
+    '''
+    Aloha export of August to October 2022 (the analysers only keep September, the weeks 35
+    and 39 straddle its ends) with:
+    checks after midnight, zero guest / zero sales / voided checks, large parties,
+    a day of the week without checks and dayparts without checks on some days
+    '''
+    dates = pd.date_range(MONTH - pd.offsets.MonthBegin(1), MONTH + pd.offsets.MonthEnd(2))
+    date = dates[rng.integers(0, len(dates), n)]
+    # 7:00 to 2:59 the next morning
+    open_time = rng.integers(7 * 60, 27 * 60, n) % (24 * 60)
+    guest_count = rng.integers(1, 9, n)
+    guest_count[rng.random(n) < 0.03] = 0
+    guest_count[rng.random(n) < 0.01] = rng.integers(25, 60)
+    item_sales = np.round(guest_count * rng.uniform(15, 40, n), 2)
+    item_sales[rng.random(n) < 0.02] = 0
+    void_total = np.where(rng.random(n) < 0.02, item_sales, 0)
+    checks = pd.DataFrame({
+        'Store_Name': rng.choice(STORES, n),
+        'Date': date.strftime('%m-%d-%Y'),
+        'Open_Time': open_time,
+        'Guest_Count': guest_count,
+        'Item_Sales': item_sales,
+        'Void_Total': void_total,
+        'Day_Part_Name': np.select([open_time < 12 * 60, open_time < 15 * 60, open_time < 18 * 60], ['Breakfast', 'Lunch', 'Afternoon'], 'Dinner'),
+    })
+    weekday = date.dayofweek
+    # a day of the week closed
+    keep = weekday != rng.integers(0, 7)
+    # the 15:00 - 18:00 daypart empty on two other days
+    hour = open_time // 60
+    keep &= ~(np.isin(weekday, rng.choice(7, 2, replace=False)) & (hour >= 15) & (hour < 18))
+    return checks[keep].reset_index(drop=True)
+
+
+def random_rota(rng, n=80):
+    '''rota template with overnight shifts, a day without shifts and a few empty (start == end) shifts'''
+    start = rng.integers(6, 24, n)
+    length = rng.integers(2, 11, n)
+    length[rng.random(n) < 0.05] = 0
+    days = [day for day in DAYS if day != DAYS[rng.integers(0, 7)]]
+    return pd.DataFrame({
+        'Day': rng.choice(days, n),
+        'Role': rng.choice(ROLES, n),
+        'Start Time (Hour)': [f'{hour}:00' for hour in start],
+        'End Time (Hour)': [f'{hour % 24}:00' for hour in start + length],
+    })
+
+
+def random_projected(rng):
+    '''projected covers of a week, some dayparts with no covers (never a whole day)'''
+    covers = rng.integers(0, 400, (len(DAYS), len(DAYPARTS)))
+    covers[rng.random(covers.shape) < 0.15] = 0
+    covers[covers.sum(axis=1) == 0, -1] = 100
+    projected = pd.DataFrame(covers, columns=DAYPARTS)
+    projected.insert(0, 'day', DAYS)
+    return projected
+
+
+def random_delivery(rng):
+    '''delivery_sales.csv: one row with the weekly delivery sales of each level'''
+    return pd.DataFrame([rng.uniform(0, 20000, len(LEVELS)).round(2)], columns=[f'{level}_delivery' for level in LEVELS])
+
+
+def align_hours(expected, actual):
+    '''both covers matrices on the union of their hours (business order), missing hours as 0'''
+    hours = sorted(set(hours_from_labels(expected.columns)) | set(hours_from_labels(actual.columns)))
+
+    def reindex(data):
+        data = data.copy()
+        data.columns = hours_from_labels(data.columns)
+        return data.reindex(index=DAYS, columns=hours).fillna(0)
+
+    return reindex(expected), reindex(actual)
+
+
+def compare(expected, actual):
+    '''(equal, max absolute difference) of two dataframes with the same labels'''
+    if list(expected.index) != list(actual.index) or list(expected.columns) != list(actual.columns):
+        return False, np.inf
+    expected = expected.to_numpy(dtype=float)
+    actual = actual.to_numpy(dtype=float)
+    if not np.array_equal(np.isnan(expected), np.isnan(actual)):
+        return False, np.inf
+    difference = np.nan_to_num(np.abs(expected - actual))
+    return bool(np.all(difference == 0)), float(difference.max()) if difference.size else 0.0
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def covers_stages(checks, projected, directory):
+    '''the cube is built once (its time is the setup of the optimised side), then sliced per query'''
+    path = os.path.join(directory, 'aloha.csv')
+    checks.to_csv(path, index=False)
+    cube, setup_seconds = timed(lambda: build_covers_cube(path, os.path.join(directory, 'covers_cube')))
+    # the baseline only reads STORE: the checks of each store written as STORE
+    store_paths = {}
+    for i, store in enumerate(sorted(checks['Store_Name'].unique())):
+        store_paths[store] = os.path.join(directory, f'aloha_{i}.csv')
+        checks[checks['Store_Name'] == store].assign(Store_Name=STORE).to_csv(store_paths[store], index=False)
+
+    def baseline_week():
+        return baseline_reference.TransformationAlohaData(path, projected.copy(), week_for_distribution=WEEK).data_distribution
+
+    def baseline_all_weeks():
+        return baseline_reference.TransformationAlohaDataAllWeeks(path, projected.copy()).data_distribution
+
+    def analyser_week():
+        return aloha_analyser.TransformationAlohaData(path, projected.copy(), week_for_distribution=WEEK).data_distribution
+
+    def analyser_all_weeks():
+        return aloha_analyser_all_weeks.TransformationAlohaData(path, projected.copy()).data_distribution
+
+    def baseline_straddling_week():
+        return baseline_reference.TransformationAlohaData(path, projected.copy(), week_for_distribution=STRADDLING_WEEK).data_distribution
+
+    def optimised(week):
+        def run():
+            if week is None:
+                distribution = cube.mean_distribution(STORE, month=MONTH.month)
+            else:
+                distribution = cube.distribution(STORE, week_label(MONTH.year, week), MONTH.month)
+            return aloha_analyser_all_weeks.TransformationAlohaData.from_distribution(distribution, projected.copy()).data_distribution
+        return run
+
+    def baseline_all_stores():
+        return {
+            store: baseline_reference.TransformationAlohaData(store_path, projected.copy(), week_for_distribution=WEEK).data_distribution
+            for store, store_path in store_paths.items()
+        }
+
+    def optimised_all_stores():
+        columns = hour_labels(range(1, 25))
+        return {store: pd.DataFrame(covers, index=DAYS, columns=columns) for store, covers in zip(cube.stores, cube.project(projected, WEEK, month=MONTH.month))}
+
+    def align_stores(expected, actual):
+        aligned = [align_hours(expected[store], actual[store]) for store in expected]
+        return pd.concat([e for e, _ in aligned], keys=list(expected)), pd.concat([a for _, a in aligned], keys=list(expected))
+
+    yield 'analyser_week', baseline_week, analyser_week, align_hours, 0.0
+    yield 'analyser_all_weeks', baseline_all_weeks, analyser_all_weeks, align_hours, 0.0
+    yield 'covers_week', baseline_week, optimised(WEEK), align_hours, setup_seconds
+    yield 'covers_straddling_week', baseline_straddling_week, optimised(STRADDLING_WEEK), align_hours, setup_seconds
+    yield 'covers_all_weeks', baseline_all_weeks, optimised(None), align_hours, setup_seconds
+    yield 'covers_all_stores', baseline_all_stores, optimised_all_stores, align_stores, setup_seconds
+
+
+def rota_stage(rota):
+    def original():
+        rota_hours = baseline_reference.TransformationRotaHours(data_path=rota.copy())
+        return rota_hours.transform()
+
+    return 'rota_hours', original, lambda: template_coverage(rota), None, 0.0
+
+
+def delivery_stage(projected, delivery):
+    projected_delivery = {level: int(value) for level, value in delivery.div(SPEND_PER_ORDER).iloc[0].items()}
+
+    def original():
+        return pd.concat(
+            [baseline_reference.merge_with_delivery_distributed(projected.copy(), f'{level}_delivery', projected_delivery) for level in LEVELS],
+            keys=LEVELS,
+        )
+
+    def optimised():
+        result = redistribute_scenarios({level: projected for level in LEVELS}, delivery_from_wide(delivery), spend_per_order=SPEND_PER_ORDER)
+        return pd.concat([result[level] for level in LEVELS], keys=LEVELS)
+
+    def align(expected, actual):
+        return expected[DAYPARTS], actual[DAYPARTS]
+
+    return 'delivery', original, optimised, align, 0.0
+
+
+def run_harness(seeds=range(3), n_checks=5000, n_shifts=80):
+    '''
+    one row per stage x seed: equal, max difference, seconds of each side and the speedup,
+    the one off setup of the optimised side (building the cube) is reported apart
+    '''
+    rows = []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        checks = random_checks(rng, n_checks)
+        rota = random_rota(rng, n_shifts)
+        projected = random_projected(rng)
+        delivery = random_delivery(rng)
+        with tempfile.TemporaryDirectory() as directory:
+            stages = list(covers_stages(checks, projected, directory))
+            stages += [rota_stage(rota), delivery_stage(projected, delivery)]
+            for stage, original, optimised, align, setup_seconds in stages:
+                expected, original_seconds = timed(original)
+                actual, optimised_seconds = timed(optimised)
+                if align is not None:
+                    expected, actual = align(expected, actual)
+                equal, max_difference = compare(expected, actual)
+                rows.append({
+                    'Stage': stage,
+                    'Seed': seed,
+                    'Equal': equal,
+                    'Max_Difference': max_difference,
+                    'Original_Seconds': original_seconds,
+                    'Optimised_Seconds': optimised_seconds,
+                    'Setup_Seconds': setup_seconds,
+                    'Speedup': original_seconds / optimised_seconds if optimised_seconds > 0 else np.inf,
+                })
+    return pd.DataFrame(rows)
+
+
+def summary(results):
+    '''one row per stage: all seeds equal, total seconds of each side and the speedup ratio'''
+    result = results.groupby('Stage', sort=False).agg(
+        Equal=('Equal', 'all'),
+        Max_Difference=('Max_Difference', 'max'),
+        Original_Seconds=('Original_Seconds', 'sum'),
+        Optimised_Seconds=('Optimised_Seconds', 'sum'),
+        Setup_Seconds=('Setup_Seconds', 'sum'),
+    )
+    result['Speedup'] = result['Original_Seconds'] / result['Optimised_Seconds']
+    return result
+
+
+if __name__ == '__main__':
+    # python equivalence_harness.py <seeds> <checks per seed> <shifts per seed>
+    import warnings
+    warnings.simplefilter('ignore')
+    seeds = range(int(sys.argv[1])) if len(sys.argv) > 1 else range(3)
+    n_checks = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    n_shifts = int(sys.argv[3]) if len(sys.argv) > 3 else 80
+    results = run_harness(seeds, n_checks, n_shifts)
+    print(summary(results).to_string())
+    if not results['Equal'].all():
+        print(results[~results['Equal']].to_string())
+        sys.exit(1)
@@ -0,0 +1,130 @@
+'''
+The plotly figures of the app, built without drawing them.
+
+plotting_both_heatmap and the plot methods draw straight into streamlit, the snapshot publisher
+and the other pages need the same figures as objects (to write them to html/json, or to draw
+them somewhere else), so they are built here.
+'''
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from rota_ingest import hour_labels
+
+
+def to_int_hours(data):
+    '''
+    'H:00' columns -> int hours with the night after the day (0:00 -> 24, 1:00 -> 25, ...),
+    sorted, as in plotting_both_heatmap; a rota running past 7:00 the next morning has the
+    hour twice, its two columns are summed
+    '''
+    if not any(isinstance(col, str) for col in data.columns):
+        return data
+    data = data.copy()
+    data.columns = [int(col[:-3]) for col in data.columns]
+    data.columns = [col+24 if col < 7 else col for col in data.columns]
+    return data.T.groupby(level=0).sum(min_count=1).T
+
+
+def ratio_matrix(covers, rota):
+    '''covers / employees on int hours, nan where nobody is on'''
+    return to_int_hours(covers) / to_int_hours(rota)
+
+
+def covers_heatmap_figure(data, title='Aloha Hours'):
+    fig = go.Figure(data=go.Heatmap(
+            z=data,
+            x=data.columns,
+            y=data.index,
+            hoverongaps = False,
+            text = data,
+            hovertemplate = 'Day: %{y}<br>Hour: %{x}<br>Number of people: %{z}<extra></extra>',
+            texttemplate='%{z}',
+            colorscale='Blues',
+            showscale=False,
+            ))
+    fig.update_layout(title=title)
+    return fig
+
+
+def rota_heatmap_figure(data, title='Rotas Hours'):
+    fig = covers_heatmap_figure(data, title=title)
+    fig.update_layout(
+        xaxis_nticks=24,
+        xaxis_title='Hour',
+        yaxis_title='Day',
+        yaxis_nticks=7,
+        width=1000,
+        height=500,
+    )
+    # no colorbar
+    fig.update_layout(coloraxis_showscale=False)
+    return fig
+
+
+def ratio_heatmap_figure(ratio, title='Ratio (Covers / Employees)'):
+    fig = go.Figure(data=go.Heatmap(
+            z= ratio,
+            x= hour_labels(ratio.columns),
+            y=ratio.index,
+            hoverongaps = False,
+            text = ratio,
+            hovertemplate = 'Day: %{y} <br> Hour: %{x}<br>Ratio (Covers / Employees): %{z}<extra></extra>',
+            # round the text to 2 decimal places
+            texttemplate='%{text:.2f}',
+            colorscale='Blues',
+            showscale=False,
+            ))
+    fig.update_layout(title=title)
+    return fig
+
+
+def day_by_day_figure(covers, rota, ratio, title='Day by day comparison'):
+    '''
+    covers, rota and ratio on int hours (see to_int_hours and ratio_matrix),
+    one row per day with the rota and the covers as lines and the ratio as bars
+    '''
+    ratio = ratio.fillna(0)
+    days = list(covers.index)
+    fig = make_subplots(rows=len(days), cols=1, subplot_titles=days, shared_xaxes=True, vertical_spacing=0.02, specs=[[{"secondary_y": True}]]*len(days))
+    for row, day in enumerate(days, start=1):
+        if day in rota.index:
+            fig.add_trace(go.Scatter(
+                x=rota.columns,
+                y=rota.loc[day],
+                mode='lines',
+                name='Rota Hours',
+                hovertemplate = 'Hour: %{x}:00 <br>Rota Hours: %{y}<extra></extra>',
+                ),
+                row=row, col=1, secondary_y=False)
+        fig.add_trace(go.Scatter(
+            x=covers.columns,
+            y=covers.loc[day],
+            mode='lines',
+            name='Covers',
+            hovertemplate = 'Hour: %{x}:00 <br>Covers: %{y}<extra></extra>',
+            ),
+            row=row, col=1, secondary_y=False)
+        if day in ratio.index:
+            fig.add_trace(go.Bar(
+                x=ratio.columns,
+                y=ratio.loc[day],
+                name='Ratio (Covers/Employees)', opacity=0.5,
+                hovertemplate = 'Hour: %{x}:00 <br>Ratio (Covers / Employees): %{y}<extra></extra>',
+                ),
+                row=row, col=1, secondary_y=True)
+    fig.update_layout(title=title)
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+def matrices_to_dict(**matrices):
+    '''day x hour dataframes -> json friendly dict (the hours as labels, nan as None)'''
+    result = {}
+    for name, data in matrices.items():
+        result[name] = {
+            'days': list(data.index),
+            'hours': list(data.columns) if any(isinstance(col, str) for col in data.columns) else hour_labels(data.columns),
+            'values': [[None if pd.isna(value) else float(value) for value in row] for row in data.to_numpy()],
+        }
+    return result
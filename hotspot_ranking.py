@@ -0,0 +1,279 @@
+'''
+Estate wide ranking of the under and over staffed hours.
+
+plotting_both_heatmap shows covers / employees for one store and one scenario at a time, with
+100+ sites nobody can open every heatmap. Here the same ratio is computed for every
+store x day x hour of the estate at once:
+
+    covers      CoversCube.project: the projected covers of all the stores in one pass
+    employees   the rota of the scenario per store x role x day x hour, the overnight hours on
+                the day the shift started as in TransformationRotaHours
+    ratio       covers / employees on the hours of the business day (7:00 .. 6:00)
+
+and the k slots and sites at both ends are picked with np.argpartition, only the k picked are
+sorted and not the whole estate. The slots with covers and nobody on have no ratio, they are
+ranked apart by their covers (see uncovered).
+
+    ranking = HotspotRanking('data/covers_cube', projected, rota, week='2022-W37')
+    under, over = ranking.slots(k=20, roles=['Server'])
+
+    streamlit run hotspot_ranking.py
+'''
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from aloha_analyser_all_weeks import TransformationAlohaData
+from covers_cube import CoversCube, accumulate
+from dayparts import DAYS, DAYPARTS, DAY_START, hour_masks
+from heatmap_figures import to_int_hours, ratio_matrix, ratio_heatmap_figure, day_by_day_figure
+from rota_ingest import MINUTES_IN_DAY, normalise_shifts, template_coverage, hour_labels
+from snapshot_publisher import projected_for_store, rota_for_store
+
+# the hours of the business day, 25 is 1:00 of the night after the day
+BUSINESS_HOURS = np.arange(DAY_START, DAY_START + 24)
+# the position of each business hour in the cube hours 1..24
+CUBE_POSITIONS = (BUSINESS_HOURS - 1) % 24
+# template_coverage columns: the hours of the day the shift started, up to the next night
+WIDTH = 49
+
+
+def top_k(values, k, largest=True):
+    '''
+    flat positions of the k largest (or smallest) finite values, in order, without sorting
+    the whole array: np.argpartition puts the k first and only those are sorted
+    '''
+    values = np.asarray(values, dtype=float).ravel()
+    candidates = np.flatnonzero(np.isfinite(values))
+    k = min(k, len(candidates))
+    if k == 0:
+        return candidates[:0]
+    keys = -values[candidates] if largest else values[candidates]
+    picked = np.argpartition(keys, k - 1)[:k]
+    picked = picked[np.argsort(keys[picked], kind='stable')]
+    return candidates[picked]
+
+
+def store_role_coverage(rota, stores):
+    '''
+    People on per store x role x day x hour of the day the shift started (0..48, as template_coverage),
+    a rota without a store column is the rota of every store.
+
+    returns (coverage of shape stores x roles x 7 x 49, roles)
+    '''
+    shifts = normalise_shifts(rota)
+    role_codes, roles = pd.factorize(shifts['Role'].astype(str).str.strip(), sort=True)
+    start_hour = (shifts['Start'] % MINUTES_IN_DAY).to_numpy() // 60
+    end_hour = (shifts['End'] % MINUTES_IN_DAY).to_numpy() // 60
+    end_hour = np.where(start_hour > end_hour, end_hour + 24, end_hour)
+    day = shifts['Day'].to_numpy()
+
+    if 'Store_Name' in shifts.columns:
+        store_codes = pd.Categorical(shifts['Store_Name'], categories=stores).codes
+        keep = store_codes >= 0
+        shape = (len(stores), len(roles), len(DAYS), WIDTH)
+        codes = (store_codes[keep], role_codes[keep], day[keep])
+        start_hour, end_hour = start_hour[keep], end_hour[keep]
+    else:
+        shape = (1, len(roles), len(DAYS), WIDTH)
+        codes = (np.zeros(len(shifts), dtype=np.int64), role_codes, day)
+    ones = np.ones(len(start_hour))
+    diff = accumulate(codes + (start_hour,), shape, ones) - accumulate(codes + (end_hour,), shape, ones)
+    coverage = diff.cumsum(axis=-1)
+    return np.broadcast_to(coverage, (len(stores),) + shape[1:]), list(roles)
+
+
+def business_day_coverage(coverage):
+    '''
+    (..., 49) hours of the day the shift started -> (..., 24) business hours 7..30,
+    the shifts starting before 7:00 count on the night hours as to_int_hours puts '5:00' at 29
+    '''
+    employees = coverage[..., DAY_START:DAY_START + 24].copy()
+    employees[..., 24 - DAY_START:] += coverage[..., :DAY_START]
+    return employees
+
+
+class HotspotRanking:
+    def __init__(self, cube, projected, rota, week=None, dayparts=None, month=None):
+        '''
+        cube: CoversCube (or its path)
+        projected, rota: the projected covers and the rota of a scenario, for every store or with a Store_Name column
+        week: a week label or number of the cube, None for the average of the weeks
+        dayparts: the hours of each daypart (see CoversCube.daypart_table)
+        month: only the dates of the month, 9 as the app (see CoversCube), all the dates if None
+        '''
+        if type(cube) == str:
+            cube = CoversCube(cube)
+        self.cube = cube
+        self.projected = projected
+        self.rota = rota
+        self.week = week
+        self.month = month
+        self.stores = list(cube.stores)
+        self.daypart_table = cube.daypart_table(dayparts)
+        # stores x 7 x 24 business hours
+        self.covers = cube.project(projected, week, dayparts, month)[..., CUBE_POSITIONS]
+        coverage, self.roles = store_role_coverage(rota, self.stores)
+        # stores x roles x 7 x 24 business hours
+        self.employees = business_day_coverage(coverage)
+        # stores x 24 business hours
+        self.dayparts = np.array(DAYPARTS)[hour_masks(self.daypart_table, BUSINESS_HOURS).argmax(axis=1)]
+        self.cache = {}
+
+    def ratio(self, roles=None):
+        '''(employees, covers / employees) of each store x day x hour for the roles (all if None), cached'''
+        roles = tuple(sorted(roles)) if roles else tuple(self.roles)
+        if roles not in self.cache:
+            employees = self.employees[:, np.isin(self.roles, roles)].sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(employees > 0, self.covers / employees, np.nan)
+            self.cache[roles] = (employees, ratio)
+        return self.cache[roles]
+
+    def selection(self, stores=None, days=None, dayparts=None):
+        '''boolean store x day x hour mask of the filters, None keeps everything'''
+        mask = np.ones(self.covers.shape, dtype=bool)
+        if stores:
+            mask &= np.isin(self.stores, stores)[:, None, None]
+        if days:
+            mask &= np.isin(DAYS, days)[None, :, None]
+        if dayparts:
+            mask &= np.isin(self.dayparts, dayparts)[:, None, :]
+        return mask
+
+    def slot_frame(self, positions, employees, ratio):
+        store, day, hour = np.unravel_index(positions, self.covers.shape)
+        return pd.DataFrame({
+            'Store_Name': np.array(self.stores, dtype=object)[store],
+            'Day': np.array(DAYS)[day],
+            'Hour': hour_labels(BUSINESS_HOURS[hour]),
+            'Daypart': self.dayparts[store, hour],
+            'Covers': self.covers[store, day, hour],
+            'Employees': employees[store, day, hour],
+            'Ratio': ratio[store, day, hour],
+        })
+
+    def slots(self, k=10, roles=None, stores=None, days=None, dayparts=None, min_covers=1):
+        '''
+        (under staffed, over staffed): the k slots with the highest and with the lowest covers / employees,
+        among the slots with someone on and at least min_covers projected covers
+        '''
+        employees, ratio = self.ratio(roles)
+        ranked = np.where(self.selection(stores, days, dayparts) & (self.covers >= min_covers), ratio, np.nan)
+        return (
+            self.slot_frame(top_k(ranked, k, largest=True), employees, ratio),
+            self.slot_frame(top_k(ranked, k, largest=False), employees, ratio),
+        )
+
+    def uncovered(self, k=10, roles=None, stores=None, days=None, dayparts=None):
+        '''the k slots with the most projected covers and nobody on'''
+        employees, ratio = self.ratio(roles)
+        covers = np.where(self.selection(stores, days, dayparts) & (employees == 0) & (self.covers > 0), self.covers, np.nan)
+        return self.slot_frame(top_k(covers, k), employees, ratio)
+
+    def sites(self, k=10, roles=None, stores=None, days=None, dayparts=None, min_covers=1):
+        '''
+        (under staffed, over staffed) sites by covers / employee hours over the slots of slots(),
+        with the highest slot ratio of each site
+        '''
+        employees, ratio = self.ratio(roles)
+        selected = self.selection(stores, days, dayparts) & (self.covers >= min_covers) & (employees > 0)
+        covers = np.where(selected, self.covers, 0).sum(axis=(1, 2))
+        labour_hours = np.where(selected, employees, 0).sum(axis=(1, 2))
+        peak = np.where(selected, ratio, -np.inf).max(axis=(1, 2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            site_ratio = np.where(labour_hours > 0, covers / labour_hours, np.nan)
+
+        def frame(positions):
+            return pd.DataFrame({
+                'Store_Name': np.array(self.stores, dtype=object)[positions],
+                'Covers': covers[positions],
+                'Labour_Hours': labour_hours[positions],
+                'Ratio': site_ratio[positions],
+                'Peak_Ratio': peak[positions],
+            })
+
+        return frame(top_k(site_ratio, k, largest=True)), frame(top_k(site_ratio, k, largest=False))
+
+    def drill_down(self, store, roles=None):
+        '''covers, rota and ratio of one store on int hours, as plotting_both_heatmap builds them'''
+        if self.week is None:
+            distribution = self.cube.mean_distribution(store, month=self.month)
+        else:
+            distribution = self.cube.distribution(store, self.week, self.month)
+        rota = rota_for_store(self.rota, store)
+        if roles:
+            rota = rota[rota['Role'].astype(str).str.strip().isin(roles)]
+        if distribution.empty or rota.empty:
+            raise KeyError(f'no covers or no shifts for {store}')
+        covers = TransformationAlohaData.from_distribution(
+            distribution, projected_for_store(self.projected, store),
+            daypart_table=self.daypart_table[self.stores.index(store)],
+        ).data_distribution
+        covers = to_int_hours(covers)
+        on = to_int_hours(template_coverage(rota))
+        return covers, on, ratio_matrix(covers, on)
+
+
+if __name__ == '__main__':
+    from snapshot_publisher import SCENARIOS, load_scenario_inputs
+
+    st.set_page_config(layout='wide')
+
+    @st.cache_resource
+    def load_cube():
+        return CoversCube('data/covers_cube')
+
+    @st.cache_resource
+    def load_ranking(scenario, week, dayparts, month):
+        projected, rota = load_scenario_inputs()[scenario]
+        return HotspotRanking(load_cube(), projected, rota, week=week, dayparts=dayparts, month=month)
+
+    cube = load_cube()
+    c1, c2, c3, c4 = st.columns(4)
+    scenario = c1.selectbox('Scenario', SCENARIOS, index=SCENARIOS.index('med'))
+    week = c2.selectbox('Week', ['All'] + list(cube.weeks))
+    dayparts = None if c3.selectbox('Dayparts', ['Fixed (12:00, 15:00, 18:00)', 'From the POS']).startswith('Fixed') else 'pos'
+    # September as the app by default
+    month = c4.selectbox('Month', ['All'] + list(range(1, 13)), index=9)
+    # built once per scenario x week x dayparts x month, the filters below only mask the arrays
+    ranking = load_ranking(scenario, None if week == 'All' else week, dayparts, None if month == 'All' else month)
+
+    c1, c2, c3, c4 = st.columns(4)
+    roles = c1.multiselect('Roles', ranking.roles)
+    stores = c2.multiselect('Stores', ranking.stores)
+    days = c3.multiselect('Days', DAYS)
+    selected_dayparts = c4.multiselect('Dayparts', DAYPARTS)
+    c1, c2 = st.columns(2)
+    k = c1.slider('Top', min_value=5, max_value=100, value=20)
+    min_covers = c2.number_input('Min covers in the slot', min_value=0, value=1)
+    filters = dict(roles=roles, stores=stores, days=days, dayparts=selected_dayparts)
+
+    under, over = ranking.slots(k, min_covers=min_covers, **filters)
+    c1, c2 = st.columns(2)
+    c1.subheader('Under staffed slots (most covers per employee)')
+    c1.dataframe(under, use_container_width=True)
+    c2.subheader('Over staffed slots (fewest covers per employee)')
+    c2.dataframe(over, use_container_width=True)
+
+    under_sites, over_sites = ranking.sites(k, min_covers=min_covers, **filters)
+    c1.subheader('Under staffed sites')
+    c1.dataframe(under_sites, use_container_width=True)
+    c2.subheader('Over staffed sites')
+    c2.dataframe(over_sites, use_container_width=True)
+
+    uncovered = ranking.uncovered(k, **filters)
+    if not uncovered.empty:
+        st.subheader('Covers with nobody on')
+        st.dataframe(uncovered, use_container_width=True)
+
+    # drill down into one store, the worst under staffed one first
+    hotspot_stores = list(dict.fromkeys(list(under['Store_Name']) + list(over['Store_Name']))) or ranking.stores
+    store = st.selectbox('Drill down', hotspot_stores)
+    try:
+        covers, on, ratio = ranking.drill_down(store, roles)
+    except KeyError as e:
+        st.warning(e.args[0])
+    else:
+        st.plotly_chart(ratio_heatmap_figure(ratio, title=f'Ratio (Covers / Employees) {store}'), use_container_width=True)
+        st.plotly_chart(day_by_day_figure(covers, on, ratio, title=f'Day by day comparison {store}'), use_container_width=True)
@@ -0,0 +1,105 @@
+'''
+Concurrent loading of the inputs of the app.
+
+main.py read delivery_sales.csv, the three projected_*.csv and the three rota_hours_*.csv one
+after the other, then aloha.csv once per scenario, before anything was drawn. Here all the
+files start reading together on a thread pool (pandas releases the GIL while parsing) as soon
+as the loader is created, and the page only waits for a file where it is used:
+
+    loader = InputLoader()              # all the reads start now, once per version of the files
+    run = loader.start_run()            # the timings of this run of the script
+    st.title(...)                       # the shell is drawn straight away
+    run.mark('first_paint')
+    projected = loader.get('projected_med')   # waits for that file only
+    ...
+    run.mark('fully_loaded')
+    st.caption(run.summary())
+
+Each file is read once (aloha.csv is shared by the three scenarios and by all the sessions),
+the frames returned are shared so they must not be modified in place. main.py keys its cached
+loader on input_mtimes(), so a refresh of the data folder is read on the next run, and drops a
+loader with a failed read instead of serving the error until the files change.
+'''
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+DATA_DIRECTORY = 'data'
+INPUTS = {
+    'delivery': 'delivery_sales.csv',
+    'projected_high': 'projected_high.csv',
+    'projected_med': 'projected_med.csv',
+    'projected_low': 'projected_low.csv',
+    'rota_hours_high': 'rota_hours_high.csv',
+    'rota_hours_med': 'rota_hours_med.csv',
+    'rota_hours_low': 'rota_hours_low.csv',
+    'aloha': 'aloha.csv',
+}
+
+
+def read_input(path):
+    '''csv -> dataframe with no spaces in the columns, and the seconds it took'''
+    started = time.perf_counter()
+    data = pd.read_csv(path)
+    data.columns = [col.strip() for col in data.columns]
+    return data, time.perf_counter() - started
+
+
+def input_mtimes(inputs=INPUTS, directory=DATA_DIRECTORY):
+    '''modification time of each input (None if missing), to key the cached loader on'''
+    paths = [os.path.join(directory, file_name) for file_name in inputs.values()]
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+
+class InputLoader:
+    def __init__(self, inputs=INPUTS, directory=DATA_DIRECTORY, max_workers=None):
+        '''
+        inputs: {name: file name}, all read concurrently from directory
+        '''
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(inputs), thread_name_prefix='input_loader')
+        self.futures = {
+            name: self.executor.submit(read_input, os.path.join(directory, file_name))
+            for name, file_name in inputs.items()
+        }
+        # nothing else is submitted: the threads exit once the reads are done
+        self.executor.shutdown(wait=False)
+
+    def start_run(self):
+        '''streamlit runs the script again on each interaction, the marks are for the current run'''
+        return LoadRun(self)
+
+    def get(self, name):
+        '''the dataframe of an input, waiting for its read if it is not done yet'''
+        data, _ = self.futures[name].result()
+        return data
+
+    def ready(self, name):
+        return self.futures[name].done()
+
+    def failed(self):
+        '''names of the reads done with an error'''
+        return [name for name, future in self.futures.items() if future.done() and future.exception() is not None]
+
+    def read_seconds(self):
+        '''{name: seconds spent reading} of the reads done'''
+        return {name: future.result()[1] for name, future in self.futures.items() if future.done() and future.exception() is None}
+
+
+class LoadRun:
+    '''the marks of one run of the script, the loader itself is shared by the sessions'''
+    def __init__(self, loader):
+        self.loader = loader
+        self.run_started = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, event):
+        '''seconds from the start of the run to the event (e.g. first_paint, fully_loaded)'''
+        self.marks[event] = time.perf_counter() - self.run_started
+        return self.marks[event]
+
+    def summary(self):
+        marks = ', '.join(f'{event.replace("_", " ")} {seconds:.2f}s' for event, seconds in self.marks.items())
+        reads = self.loader.read_seconds()
+        return f'{marks} (reads: {sum(reads.values()):.2f}s in total, {max(reads.values(), default=0):.2f}s the longest)'
@@ -0,0 +1,180 @@
+'''
+Labour productivity rollup cube.
+
+plotting_both_heatmap only shows covers / employees for the hours of one week. Here we
+precompute, once, from the Aloha checks and the rota coverage:
+
+    sales, covers                       per date x hour
+    labour hours and labour cost        per date x hour x role  (cost = hours x wage of the role)
+
+and roll them up to every level (hour, daypart, day, week, month) with a single bincount per
+level. Asking for a level and a subset of roles is then a lookup (the role subset is a sum over
+the small role axis, cached), not a new groupby over the checks and the shifts:
+
+    Sales per labour hour (SPLH)      = Sales / Labour_Hours
+    Covers per labour hour            = Covers / Labour_Hours
+    Labour cost per hour              = Labour_Cost / trading hours (hours with covers)
+
+The checks are placed on the clock hour of their Date (the midnight hour on the date of the check).
+'''
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+
+from covers_cube import prepare_checks, accumulate, week_label
+from dayparts import DAYPARTS, default_daypart_table
+from rota_ingest import normalise_shifts, date_hour_coverage, weekday_hour_coverage
+
+LEVELS = ['hour', 'daypart', 'day', 'week', 'month']
+
+
+def load_wages(wages):
+    '''dict {role: hourly wage}, or a csv / dataframe with the columns Role and Hourly_Wage'''
+    if isinstance(wages, dict):
+        return wages
+    wages = pd.read_csv(wages) if type(wages) == str else wages.copy()
+    wages.columns = [col.strip() for col in wages.columns]
+    return dict(zip(wages['Role'], wages['Hourly_Wage']))
+
+
+class LabourRollup:
+    def __init__(self, checks, rota, wages, store_name=None, default_wage=0, daypart_table=None):
+        '''
+        checks: Aloha csv path, raw dataframe or the output of covers_cube.prepare_checks
+        rota:   rota file(s) / dataframe (template or dated) or the output of rota_ingest.normalise_shifts
+        wages:  hourly wage per Role (see load_wages)
+        store_name: keep only this store (the checks and, if it has a store column, the rota)
+        daypart_table: (1 x 24) daypart of each hour 1..24 for the daypart level, e.g.
+        config_daypart_table(config, [store_name]), the fixed cut-offs if None
+        '''
+        if type(checks) == str:
+            checks = pd.read_csv(checks)
+        if 'Hour' not in checks.columns:
+            checks = prepare_checks(checks)
+        shifts = rota if isinstance(rota, pd.DataFrame) and 'Start' in rota.columns else normalise_shifts(rota)
+        if store_name is not None:
+            checks = checks[checks['Store_Name'] == store_name]
+            if 'Store_Name' in shifts.columns:
+                shifts = shifts[shifts['Store_Name'] == store_name]
+        wages = load_wages(wages)
+
+        self.dates = pd.date_range(checks['Date'].min(), checks['Date'].max())
+        self.roles = sorted(shifts['Role'].unique())
+        self.wages = np.array([wages.get(role, default_wage) for role in self.roles], dtype=float)
+        self.daypart_table = default_daypart_table() if daypart_table is None else np.asarray(daypart_table)
+        self.build_base(checks, shifts)
+        self.build_levels()
+        self.cache = {}
+
+    def build_base(self, checks, shifts):
+        '''sales and covers per date x hour, labour hours per date x hour x role'''
+        shape = (len(self.dates), 24)
+        codes = ((checks['Date'] - self.dates[0]).dt.days.to_numpy(), checks['Hour'].to_numpy() % 24)
+        self.sales = accumulate(codes, shape, checks['Item_Sales'].to_numpy(dtype=float)).ravel()
+        self.covers = accumulate(codes, shape, checks['Guest_Count'].to_numpy(dtype=float)).ravel()
+
+        if 'Date' in shifts.columns:
+            coverage, roles, dates = date_hour_coverage(shifts, by='Role')
+            # line up the rota dates with the checks dates
+            labour = np.zeros((len(roles), len(self.dates), 24))
+            position = (dates - self.dates[0]).days.to_numpy()
+            keep = (position >= 0) & (position < len(self.dates))
+            labour[:, position[keep]] = coverage[:, keep]
+        else:
+            # a weekday template repeats on every date
+            coverage, roles = weekday_hour_coverage(shifts, by='Role')
+            labour = coverage[:, self.dates.dayofweek.to_numpy()]
+        # cells x roles
+        self.labour_hours = labour.reshape(len(roles), -1).T.astype(float)
+        self.labour_cost = self.labour_hours * self.wages[None, :]
+
+    def level_keys(self, level):
+        '''labels of each date x hour cell at the level'''
+        cells = pd.DatetimeIndex(np.repeat(self.dates, 24)) + pd.to_timedelta(np.tile(np.arange(24), len(self.dates)), unit='h')
+        if level == 'hour':
+            return cells.strftime('%Y-%m-%d %H:00').to_numpy()
+        if level == 'daypart':
+            # the same dayparts as the projection (the clock hour 0 is the hour 24 of the table)
+            dayparts = np.array(DAYPARTS)[self.daypart_table[0, (cells.hour.to_numpy() - 1) % 24]]
+            return cells.strftime('%Y-%m-%d ').to_numpy() + dayparts
+        if level == 'day':
+            return cells.strftime('%Y-%m-%d').to_numpy()
+        if level == 'week':
+            # the cells are the 24 hours of each date in turn
+            iso = self.dates.isocalendar()
+            return np.repeat([week_label(year, week) for year, week in zip(iso['year'], iso['week'])], 24)
+        if level == 'month':
+            return cells.strftime('%Y-%m').to_numpy()
+        raise ValueError(f'level must be one of {LEVELS}')
+
+    def build_levels(self):
+        '''one bincount per level and measure'''
+        self.levels = {}
+        for level in LEVELS:
+            codes, keys = pd.factorize(self.level_keys(level), sort=True)
+            n = len(keys)
+            sum_by_key = lambda values: np.bincount(codes, weights=values, minlength=n)
+            self.levels[level] = {
+                'keys': list(keys),
+                'position': {key: i for i, key in enumerate(keys)},
+                'Sales': sum_by_key(self.sales),
+                'Covers': sum_by_key(self.covers),
+                'Labour_Hours': np.stack([sum_by_key(col) for col in self.labour_hours.T], axis=1),
+                'Labour_Cost': np.stack([sum_by_key(col) for col in self.labour_cost.T], axis=1),
+                'Trading_Hours': sum_by_key(self.covers > 0),
+            }
+
+    def rollup(self, level='day', roles=None):
+        '''
+        dataframe of the measures and ratios at the level for the roles (all if None),
+        computed once per (level, roles) and then served from the cache
+        '''
+        roles = tuple(sorted(roles)) if roles else tuple(self.roles)
+        if (level, roles) in self.cache:
+            return self.cache[(level, roles)]
+        data = self.levels[level]
+        selected = np.isin(self.roles, roles)
+        labour_hours = data['Labour_Hours'][:, selected].sum(axis=1)
+        labour_cost = data['Labour_Cost'][:, selected].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = pd.DataFrame({
+                'Sales': data['Sales'],
+                'Covers': data['Covers'],
+                'Labour_Hours': labour_hours,
+                'Labour_Cost': labour_cost,
+                'SPLH': data['Sales'] / labour_hours,
+                'Covers_Per_Labour_Hour': data['Covers'] / labour_hours,
+                'Labour_Cost_Per_Hour': labour_cost / data['Trading_Hours'],
+            }, index=pd.Index(data['keys'], name=level))
+        result = result.replace([np.inf, -np.inf], np.nan)
+        self.cache[(level, roles)] = result
+        return result
+
+    def lookup(self, level, key, measure, roles=None):
+        '''a single value, e.g. lookup('week', '2022-W37', 'SPLH', roles=['Server'])'''
+        data = self.rollup(level, roles)
+        return data[measure].iat[self.levels[level]['position'][key]]
+
+    def plot(self, level='day', roles=None, measures=('SPLH', 'Covers_Per_Labour_Hour', 'Labour_Cost_Per_Hour')):
+        data = self.rollup(level, roles)
+        from plotly.subplots import make_subplots
+        fig = make_subplots(rows=len(measures), cols=1, subplot_titles=measures, shared_xaxes=True, vertical_spacing=0.05)
+        for i, measure in enumerate(measures):
+            fig.add_trace(go.Bar(
+                x=data.index,
+                y=data[measure],
+                name=measure,
+                hovertemplate = '%{x}<br>' + measure + ': %{y:.2f}<extra></extra>',
+                ), row=i+1, col=1)
+        fig.update_layout(title=f'Labour productivity by {level}', showlegend=False, height=300*len(measures))
+        st.plotly_chart(fig, use_container_width=True)
+
+
+if __name__ == '__main__':
+    rollup = LabourRollup('data/aloha.csv', 'data/rota_hours_high.csv', 'data/wages.csv', store_name='D8 - Dishoom Birmingham')
+    c1, c2 = st.columns(2)
+    level = c1.selectbox('Select level', LEVELS, index=LEVELS.index('day'))
+    roles = c2.multiselect('Select role', rollup.roles)
+    rollup.plot(level, roles)
+    st.write(rollup.rollup(level, roles))
@@ -0,0 +1,66 @@
+'''
+Normalisation of the large party checks.
+
+A check with a very large Guest_Count is usually a group booking or a till error, so its guest
+count is replaced by Item_Sales / spend per head. The threshold and the spend per head were
+25 and 30 for every store; here both can be set for each store, and the spend per head can be
+learned as the median Item_Sales / Guest_Count of the normal checks of each store.
+
+Everything is done on arrays: the stores are factorized once, the medians are one grouped pass
+and the thresholds / spends are looked up by store code, so it stays cheap on tens of millions
+of checks.
+
+    guest_count, adjusted = normalise_large_parties(checks, threshold={'D8 - Dishoom Birmingham': 20}, spend_per_head='median')
+'''
+import numpy as np
+import pandas as pd
+
+# the values used before, for every store
+THRESHOLD = 25
+SPEND_PER_HEAD = 30
+
+
+def per_store(value, stores, default):
+    '''
+    a number, a {store: value} dict or a series indexed by store -> one value per store of stores
+    (the default for the stores not given), and the default last for the checks without a store
+    (code -1 of pd.factorize)
+    '''
+    if isinstance(value, dict):
+        value = pd.Series(value, dtype=float)
+    if isinstance(value, pd.Series):
+        return np.append(value.reindex(stores).fillna(default).to_numpy(dtype=float), default)
+    return np.full(len(stores) + 1, float(value))
+
+
+def store_spend_per_head(checks, threshold=THRESHOLD):
+    '''
+    median Item_Sales / Guest_Count of the checks below the threshold of each store,
+    a series indexed by store
+    '''
+    codes, stores = pd.factorize(checks['Store_Name'])
+    guests = checks['Guest_Count'].to_numpy(dtype=float)
+    normal = (codes >= 0) & (guests > 0) & (guests < per_store(threshold, stores, THRESHOLD)[codes])
+    spend = checks['Item_Sales'].to_numpy(dtype=float)[normal] / guests[normal]
+    medians = pd.Series(spend).groupby(codes[normal]).median()
+    return pd.Series(medians.to_numpy(), index=stores[medians.index], name='Spend_Per_Head')
+
+
+def normalise_large_parties(checks, threshold=THRESHOLD, spend_per_head=SPEND_PER_HEAD):
+    '''
+    checks: Store_Name, Guest_Count and Item_Sales columns
+    threshold: the guest count from which a check is a large party, a number or {store: n}
+    spend_per_head: a number, {store: spend}, or 'median' to learn it from the checks of each store
+
+    returns (the normalised Guest_Count series, the boolean mask of the adjusted checks)
+    '''
+    codes, stores = pd.factorize(checks['Store_Name'])
+    if isinstance(spend_per_head, str) and spend_per_head == 'median':
+        spend_per_head = store_spend_per_head(checks, threshold)
+    thresholds = per_store(threshold, stores, THRESHOLD)[codes]
+    spends = per_store(spend_per_head, stores, SPEND_PER_HEAD)[codes]
+
+    guests = checks['Guest_Count'].to_numpy(dtype=float)
+    adjusted = guests >= thresholds
+    guest_count = np.where(adjusted, checks['Item_Sales'].to_numpy(dtype=float) / spends, guests)
+    return pd.Series(guest_count, index=checks.index, name='Guest_Count'), pd.Series(adjusted, index=checks.index)
@@ -0,0 +1,167 @@
+'''
+Live tail of the same-day POS export.
+
+During service the POS keeps appending checks to a local export file. TransformationAlohaData
+only works on a finished csv, so here we follow the growing file:
+
+1. remember the byte offset read so far, and on each poll read only the new bytes
+2. parse the complete new lines (a half written last line waits for the next poll)
+3. clean them as the full export (covers_cube.prepare_checks) and add today's covers
+   to the running covers per hour
+
+and refresh the covers vs rota ratio for today every few seconds:
+
+    streamlit run live_tail.py -- data/aloha_today.csv data/rota_hours_med.csv
+'''
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+
+from covers_cube import HOURS, prepare_checks
+from dayparts import business_hours
+from large_parties import THRESHOLD, SPEND_PER_HEAD
+from rota_ingest import hour_labels, hours_from_labels
+
+
+class LiveCoversTail:
+    def __init__(self, path, store_name=None, today=None, threshold=THRESHOLD, spend_per_head=SPEND_PER_HEAD):
+        '''
+        path: the export the POS is appending to (csv with a header line)
+        store_name: keep only this store
+        today: the date to follow (today if None)
+        threshold / spend_per_head: the large party normalisation (see large_parties), the few
+        checks of a poll are not enough to learn the spend per head, pass {store: spend} learned
+        on the history with store_spend_per_head
+        '''
+        self.path = path
+        self.store_name = store_name
+        self.threshold = threshold
+        self.spend_per_head = spend_per_head
+        self.today = pd.Timestamp(today).normalize() if today is not None else pd.Timestamp.today().normalize()
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        # (device, inode) of the file read so far, a new one means the export was replaced
+        self.file_id = None
+        self.header = None
+        self.remainder = b''
+        self.rows_read = 0
+        self.adjusted_checks = 0
+        # covers for each hour of the day, 24 is midnight as in TransformationAlohaData
+        self.covers = np.zeros(len(HOURS))
+
+    def poll(self):
+        '''read what was appended since the last poll, returns the number of new rows'''
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return 0
+        with f:
+            stat = os.fstat(f.fileno())
+            file_id = (stat.st_dev, stat.st_ino)
+            if (self.file_id is not None and file_id != self.file_id) or stat.st_size < self.offset:
+                # the file was replaced or truncated (e.g. a new day): start again
+                self.reset()
+            self.file_id = file_id
+            f.seek(self.offset)
+            chunk = f.read()
+        self.offset += len(chunk)
+
+        data = self.remainder + chunk
+        last_newline = data.rfind(b'\n')
+        if last_newline == -1:
+            self.remainder = data
+            return 0
+        lines, self.remainder = data[:last_newline + 1], data[last_newline + 1:]
+        if self.header is None:
+            first_newline = lines.find(b'\n')
+            self.header = [col.strip() for col in lines[:first_newline].decode().strip().split(',')]
+            lines = lines[first_newline + 1:]
+        if not lines.strip():
+            return 0
+
+        new_rows = pd.read_csv(io.BytesIO(lines), header=None, names=self.header)
+        self.rows_read += len(new_rows)
+        self.add(new_rows)
+        return len(new_rows)
+
+    def add(self, new_rows):
+        if self.store_name is not None:
+            new_rows = new_rows[new_rows['Store_Name'] == self.store_name]
+        checks = prepare_checks(new_rows, self.threshold, self.spend_per_head)
+        checks = checks[checks['Date'] == self.today]
+        self.adjusted_checks += checks.attrs['adjusted_checks']
+        self.covers += np.bincount(checks['Hour'].to_numpy() - 1, weights=checks['Guest_Count'].to_numpy(), minlength=len(HOURS))
+
+    def covers_frame(self):
+        '''today's covers, one row (the day name) and the hours of the business day as columns'''
+        hours = business_hours(HOURS)
+        order = np.argsort(hours)
+        return pd.DataFrame([self.covers[order]], index=[self.today.day_name()], columns=hour_labels(hours[order]))
+
+    def ratio(self, rota_hours):
+        '''
+        covers / employees for today
+        rota_hours: the TransformationRotaHours.data dataframe (after transform)
+        '''
+        day = self.today.day_name()
+        rota = pd.Series(rota_hours.loc[day].to_numpy(dtype=float), index=hours_from_labels(rota_hours.columns))
+        covers = pd.Series(self.covers, index=business_hours(HOURS))
+        rota = rota.groupby(level=0).sum()
+        ratio = (covers / rota).replace([np.inf, -np.inf], np.nan)
+        ratio = ratio[rota.reindex(ratio.index).fillna(0) > 0]
+        return pd.DataFrame([ratio.to_numpy()], index=[day], columns=hour_labels(ratio.index))
+
+
+def plot_live_ratio(ratio, covers, updated):
+    fig = go.Figure(data=go.Heatmap(
+            z=ratio,
+            x=ratio.columns,
+            y=ratio.index,
+            hoverongaps = False,
+            text = ratio,
+            hovertemplate = 'Day: %{y} <br> Hour: %{x}<br>Ratio (Covers / Employees): %{z}<extra></extra>',
+            textsrc='z', texttemplate='%{text:.2f}',
+            colorscale='Blues',
+            showscale=False,
+            ))
+    fig.update_layout(title=f'Ratio (Covers / Employees) - live, updated {updated:%H:%M:%S}', height=250)
+    st.plotly_chart(fig, use_container_width=True)
+
+    fig = go.Figure(data=go.Bar(
+            x=covers.columns,
+            y=covers.iloc[0],
+            hovertemplate = 'Hour: %{x} <br>Covers: %{y}<extra></extra>',
+            ))
+    fig.update_layout(title='Covers so far today', height=300)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+if __name__ == '__main__':
+    from rota_models_analyser import TransformationRotaHours
+
+    export_path = sys.argv[1] if len(sys.argv) > 1 else 'data/aloha_today.csv'
+    rota_path = sys.argv[2] if len(sys.argv) > 2 else 'data/rota_hours_med.csv'
+
+    refresh = st.sidebar.number_input('Refresh every (seconds)', min_value=1, value=5)
+    store_name = st.sidebar.text_input('Store', 'D8 - Dishoom Birmingham')
+
+    rota = pd.read_csv(rota_path)
+    rota.columns = [col.strip() for col in rota.columns]
+    rota_hours = TransformationRotaHours(data_path=rota)
+    rota_hours.transform()
+
+    tail = LiveCoversTail(export_path, store_name=store_name or None)
+    placeholder = st.empty()
+    while True:
+        tail.poll()
+        with placeholder.container():
+            plot_live_ratio(tail.ratio(rota_hours.data), tail.covers_frame(), pd.Timestamp.now())
+        time.sleep(refresh)
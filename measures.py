@@ -0,0 +1,51 @@
+'''
+All the measures of the checks per day x hour from one aggregation.
+
+transformation3 used to group the checks by day and hour and keep only Guest_Count, so a sales
+or a check count distribution meant running the pipeline again. Here one groupby gives the
+sum of the covers, the item sales and the voids and the number of checks of each
+week x day x hour, stacked as
+
+    stack[measure, day, hour]    measure: Covers, Item_Sales, Void_Total, Checks, Spend_Per_Head
+
+averaged over the weeks as transformation3 does (each day x hour over the weeks that had
+checks in it, nan where none had), with Spend_Per_Head = Item_Sales / Covers.
+'''
+import numpy as np
+import pandas as pd
+
+from dayparts import DAYS
+
+MEASURES = ['Covers', 'Item_Sales', 'Void_Total', 'Checks', 'Spend_Per_Head']
+# the measures that add up over the hours of a daypart, so they can go through transformation4
+PROJECTABLE = ['Covers', 'Item_Sales', 'Void_Total', 'Checks']
+
+
+def measure_stack(data):
+    '''
+    data: the checks after transformation2 (Week_Number, Day_Name, Hour, Guest_Count, Item_Sales, Void_Total)
+
+    returns (array of shape measures x 7 x hours, hours)
+    '''
+    grouped = data.groupby(['Week_Number', 'Day_Name', 'Hour']).agg(
+        Covers=('Guest_Count', 'sum'),
+        Item_Sales=('Item_Sales', 'sum'),
+        Void_Total=('Void_Total', 'sum'),
+        Checks=('Guest_Count', 'size'),
+    )
+    weeks = sorted(data['Week_Number'].unique())
+    hours = sorted(data['Hour'].unique())
+    grouped = grouped.reindex(pd.MultiIndex.from_product([weeks, DAYS, hours]))
+    # measures x weeks x days x hours, nan where a week had no checks in the day x hour
+    totals = grouped.to_numpy(dtype=float).T.reshape(len(PROJECTABLE), len(weeks), len(DAYS), len(hours))
+
+    weeks_with_checks = (~np.isnan(totals[-1])).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nansum(totals, axis=1) / weeks_with_checks
+        spend_per_head = mean[1:2] / mean[0:1]
+    return np.concatenate([mean, spend_per_head]), [int(hour) for hour in hours]
+
+
+def measure_frame(stack, hours, measure):
+    '''one measure of the stack as the day x hour dataframe of transformation3'''
+    return pd.DataFrame(stack[MEASURES.index(measure)], index=DAYS, columns=hours)
@@ -0,0 +1,218 @@
+'''
+Week over week / period comparison.
+
+Comparing this September with last year's (or week 37 with week 38) meant building two
+TransformationAlohaData (each one re-reading the csv) and looking at two heatmaps.
+Here the checks (and the rota) are aggregated once into store x date x hour arrays and a
+period is a selection over them (stores, weeks, months, date range), so a comparison is
+two slices and one subtraction:
+
+    periods = PeriodAggregate('data/aloha.csv', rota='data/rota_export.csv')
+    deltas = periods.compare({'weeks': [37]}, {'weeks': [38]})
+    deltas['covers_delta'], deltas['ratio_pct'], ...
+
+The matrices are the average day (Monday..Sunday) x hour of the selected dates,
+summed over the selected stores.
+'''
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+
+from covers_cube import prepare_checks, accumulate, week_label
+from dayparts import DAYS, business_hours
+from rota_ingest import normalise_shifts, hour_coverage, hour_labels, MINUTES_IN_DAY
+
+MEASURES = ['covers', 'rota', 'ratio']
+
+
+class PeriodAggregate:
+    def __init__(self, checks, rota=None):
+        '''
+        checks: Aloha csv path, raw dataframe or the output of covers_cube.prepare_checks
+        rota:   optional rota (dated, or a weekday template repeated on every date), with
+                Role and optionally Store_Name columns (without it the rota is taken as the rota
+                of one store, and only selections of one store can be set against it)
+        '''
+        if type(checks) == str:
+            checks = pd.read_csv(checks)
+        if 'Hour' not in checks.columns:
+            checks = prepare_checks(checks)
+
+        store_codes, self.stores = pd.factorize(checks['Store_Name'], sort=True)
+        self.stores = list(self.stores)
+        self.dates = pd.date_range(checks['Date'].min(), checks['Date'].max())
+        iso = self.dates.isocalendar()
+        self.date_weeks = np.array([week_label(year, week) for year, week in zip(iso['year'], iso['week'])])
+        self.date_months = self.dates.strftime('%Y-%m').to_numpy()
+        # the checks on the clock hour of their date, as the rota
+        self.covers = accumulate(
+            (store_codes, (checks['Date'] - self.dates[0]).dt.days.to_numpy(), checks['Hour'].to_numpy() % 24),
+            (len(self.stores), len(self.dates), 24),
+            checks['Guest_Count'].to_numpy(dtype=float),
+        )
+        self.rota = None
+        if rota is not None:
+            self.build_rota(rota)
+
+    def build_rota(self, rota):
+        '''people on per (store, role) x date x hour, on the same dates as the checks'''
+        shifts = rota if isinstance(rota, pd.DataFrame) and 'Start' in rota.columns else normalise_shifts(rota)
+        shifts = shifts.copy()
+        stores = shifts['Store_Name'] if 'Store_Name' in shifts.columns else pd.Series('All', index=shifts.index)
+        roles = shifts['Role'] if 'Role' in shifts.columns else pd.Series('All', index=shifts.index)
+        shifts['Group'] = list(zip(stores, roles))
+
+        if 'Date' in shifts.columns:
+            # move the shifts on the axis of the checks dates, the ones outside are dropped
+            offset = (shifts.attrs['first_date'] - self.dates[0]).days * MINUTES_IN_DAY
+            shifts['Start'] += offset
+            shifts['End'] += offset
+            keep = (shifts['End'] > 0) & (shifts['Start'] < len(self.dates) * MINUTES_IN_DAY)
+            shifts.loc[:, 'Start'] = shifts['Start'].clip(lower=0)
+            shifts = shifts.loc[keep]
+            coverage, groups = hour_coverage(shifts, len(self.dates) * 24, by='Group')
+            coverage = coverage.reshape(len(groups), len(self.dates), 24)
+        else:
+            # a weekday template repeats on every date (the sunday night wraps onto monday)
+            coverage, groups = hour_coverage(shifts, 2 * 7 * 24, by='Group')
+            coverage = (coverage[:, :7 * 24] + coverage[:, 7 * 24:]).reshape(len(groups), 7, 24)
+            coverage = coverage[:, self.dates.dayofweek.to_numpy()]
+        self.rota = coverage
+        self.rota_by_store = 'Store_Name' in shifts.columns
+        self.rota_stores = np.array([group[0] for group in groups])
+        self.rota_roles = np.array([group[1] for group in groups])
+        self.roles = sorted(set(self.rota_roles))
+
+    def date_mask(self, selection):
+        '''
+        selection: dict with any of
+            weeks:  [37, '2022-W38']          months: [9, '2022-09']
+            start / end: dates (inclusive)    days: ['Saturday', 'Sunday']
+        '''
+        mask = np.ones(len(self.dates), dtype=bool)
+        if selection.get('weeks'):
+            weeks = [str(week) for week in selection['weeks']]
+            mask &= np.array([label in weeks or label[-2:].lstrip('0') in weeks for label in self.date_weeks])
+        if selection.get('months'):
+            months = [str(month) for month in selection['months']]
+            mask &= np.isin(self.date_months, months) | np.isin(self.dates.month.astype(str), months)
+        if selection.get('start') is not None:
+            mask &= self.dates >= pd.Timestamp(selection['start'])
+        if selection.get('end') is not None:
+            mask &= self.dates <= pd.Timestamp(selection['end'])
+        if selection.get('days'):
+            mask &= np.isin(self.dates.day_name(), selection['days'])
+        return mask
+
+    def weekday_average(self, data, dates):
+        '''(dates x 24) summed over the stores -> (7 x 24) average of each weekday'''
+        weekday = self.dates.dayofweek.to_numpy()[dates]
+        summed = np.zeros((7, 24))
+        np.add.at(summed, weekday, data[dates])
+        counts = np.bincount(weekday, minlength=7)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return summed / counts[:, None]
+
+    def matrices(self, selection):
+        '''{'covers': ..., 'rota': ..., 'ratio': ...} day x hour arrays (7 x 24, clock hours) of the period'''
+        dates = self.date_mask(selection)
+        stores = selection.get('stores') or self.stores
+        covers = self.covers[np.isin(self.stores, stores)].sum(axis=0)
+        result = {'covers': self.weekday_average(covers, dates)}
+        if self.rota is not None:
+            if not self.rota_by_store and len(stores) > 1:
+                raise ValueError('the rota has no Store_Name column, select one store to compare it with the covers')
+            groups = np.isin(self.rota_stores, list(stores) + ['All'])
+            if selection.get('roles'):
+                groups &= np.isin(self.rota_roles, selection['roles'])
+            result['rota'] = self.weekday_average(self.rota[groups].sum(axis=0), dates)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result['ratio'] = result['covers'] / result['rota']
+            result['ratio'][~np.isfinite(result['ratio'])] = np.nan
+        return result
+
+    def to_frame(self, matrix):
+        '''7 x 24 clock hours -> days x hours dataframe in the business day order (7:00 ... 6:00)'''
+        order = np.argsort(business_hours(np.arange(24)))
+        return pd.DataFrame(matrix[:, order], index=DAYS, columns=hour_labels(business_hours(order)))
+
+    def compare(self, a, b):
+        '''
+        Selections a and b -> for each measure the a and b matrices, b - a and (b - a) / a in %
+        '''
+        first, second = self.matrices(a), self.matrices(b)
+        result = {}
+        for measure in first:
+            delta = second[measure] - first[measure]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                pct = delta / first[measure] * 100
+            pct[~np.isfinite(pct)] = np.nan
+            result[f'{measure}_a'] = self.to_frame(first[measure])
+            result[f'{measure}_b'] = self.to_frame(second[measure])
+            result[f'{measure}_delta'] = self.to_frame(delta)
+            result[f'{measure}_pct'] = self.to_frame(pct)
+        return result
+
+
+def plot_delta(data, title, suffix=''):
+    # keep the hours open in at least one of the two periods
+    data = data.loc[:, data.notna().any(axis=0) & (data.fillna(0) != 0).any(axis=0)]
+    limit = np.nanmax(np.abs(data.to_numpy())) if data.size and np.isfinite(data.to_numpy()).any() else 1
+    fig = go.Figure(data=go.Heatmap(
+            z=data,
+            x=data.columns,
+            y=data.index,
+            hoverongaps = False,
+            text = data,
+            hovertemplate = 'Day: %{y}<br>Hour: %{x}<br>' + title + ': %{z:.1f}' + suffix + '<extra></extra>',
+            texttemplate='%{text:.1f}',
+            colorscale='RdBu',
+            zmid=0, zmin=-limit, zmax=limit,
+            showscale=False,
+            ))
+    fig.update_layout(title=title)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def period_selector(periods, column, key):
+    '''widgets for one side of the comparison'''
+    if periods.rota is not None and not periods.rota_by_store:
+        # a rota without stores is the rota of one store
+        selection = {'stores': [column.selectbox('Store', periods.stores, key=f'stores_{key}')]}
+    else:
+        selection = {'stores': column.multiselect('Stores', periods.stores, key=f'stores_{key}')}
+    mode = column.radio('Period', ['Weeks', 'Months', 'Date range'], horizontal=True, key=f'mode_{key}')
+    if mode == 'Weeks':
+        selection['weeks'] = column.multiselect('Weeks', sorted(set(periods.date_weeks)), key=f'weeks_{key}')
+    elif mode == 'Months':
+        selection['months'] = column.multiselect('Months', sorted(set(periods.date_months)), key=f'months_{key}')
+    else:
+        dates = column.date_input('Dates', (periods.dates[0], periods.dates[-1]), key=f'dates_{key}')
+        # while the range is picked streamlit returns the first date only, it is then the whole range
+        dates = dates or (periods.dates[0], periods.dates[-1])
+        selection['start'], selection['end'] = dates[0], dates[-1]
+    if periods.rota is not None:
+        selection['roles'] = column.multiselect('Roles', periods.roles, key=f'roles_{key}')
+    return selection
+
+
+if __name__ == '__main__':
+    st.set_page_config(layout='wide')
+
+    @st.cache_resource
+    def load_periods():
+        return PeriodAggregate('data/aloha.csv', rota='data/rota_hours_med.csv')
+
+    periods = load_periods()
+    c1, c2 = st.columns(2)
+    c1.subheader('A')
+    c2.subheader('B')
+    deltas = periods.compare(period_selector(periods, c1, 'a'), period_selector(periods, c2, 'b'))
+
+    measure = st.radio('Measure', [measure for measure in MEASURES if f'{measure}_delta' in deltas], horizontal=True)
+    c1, c2 = st.columns(2)
+    with c1:
+        plot_delta(deltas[f'{measure}_delta'], f'{measure.capitalize()} B - A')
+    with c2:
+        plot_delta(deltas[f'{measure}_pct'], f'{measure.capitalize()} B vs A', suffix='%')
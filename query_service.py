@@ -0,0 +1,257 @@
+'''
+Local HTTP service over the covers distributions and the ratio matrices.
+
+The spreadsheets and the scheduling scripts need the numbers behind the heatmaps, not the
+charts. This serves the day x hour matrices as json (or arrow) from the covers cube and the
+scenario inputs:
+
+    GET /stores
+        the stores, the weeks each one traded, the scenarios and the roles
+    GET /matrix?measure=ratio&store=D8 - Dishoom Birmingham&week=2022-W37&scenario=med&role=Server
+        measure:  distribution (the covers of the week, no scenario needed),
+                  covers (projected on the scenario), rota or ratio
+        week:     a label (2022-W37), a week number (37) or All for the average of the weeks
+        role:     only the shifts of this role in the rota and the ratio (all the roles if missing)
+        month:    only the dates of the month, 9 (as the app, September of any year) or 2022-09,
+                  all the dates of the cube if missing (see CoversCube)
+        format:   json (default) or arrow (an arrow ipc stream, needs pyarrow)
+
+Each response is computed once and kept in an in memory LRU cache, with an ETag on the content:
+clients polling with If-None-Match get a 304 and nothing is computed or sent again.
+Requests are handled in threads, so a slow first computation does not hold the others.
+
+    python query_service.py data/covers_cube 8502
+'''
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from aloha_analyser_all_weeks import TransformationAlohaData
+from covers_cube import CoversCube
+from heatmap_figures import ratio_matrix, matrices_to_dict
+from rota_ingest import template_coverage
+from snapshot_publisher import load_scenario_inputs, projected_for_store, rota_for_store
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+MEASURES = ['distribution', 'covers', 'rota', 'ratio']
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+class UnsupportedFormat(Exception):
+    '''a known format that cannot be served here (arrow without pyarrow), 406 over http'''
+
+
+class QueryService:
+    '''
+    The matrices behind the service, usable without the http part.
+
+    service = QueryService('data/covers_cube')
+    body, content_type, etag = service.get('ratio', 'D8 - Dishoom Birmingham', '2022-W37', 'med')
+    '''
+
+    def __init__(self, cube, inputs=None, cache_size=256):
+        '''
+        cube: CoversCube (or its path)
+        inputs: {scenario: (projected covers, rota)}, read from data/ if None
+        cache_size: number of responses (and of computed reports) kept in memory
+        '''
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.reload(cube, inputs)
+
+    def reload(self, cube, inputs=None):
+        '''new cube / inputs after a data refresh, everything cached is dropped'''
+        if type(cube) == str:
+            cube = CoversCube(cube)
+        if inputs is None:
+            inputs = load_scenario_inputs()
+        with self.lock:
+            self.cube = cube
+            self.inputs = inputs
+            self.cache = OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+    def cached(self, key, compute):
+        '''
+        LRU cache shared by the threads. Two threads missing the same key at once
+        may both compute it, the result is the same.
+        '''
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+        value = compute()
+        with self.lock:
+            self.cache[key] = value
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return value
+
+    def catalogue(self):
+        roles = set()
+        for _, rota in self.inputs.values():
+            if 'Role' in rota.columns:
+                roles.update(rota['Role'].dropna().astype(str).str.strip())
+        return {
+            'stores': {store: self.cube.weeks_for_store(store) for store in self.cube.stores},
+            'scenarios': list(self.inputs),
+            'roles': sorted(roles),
+            'measures': MEASURES,
+        }
+
+    def distribution(self, store, week, month=None):
+        if store not in self.cube.store_position:
+            raise KeyError(f'store {store} is not in the cube')
+        if week == 'All':
+            distribution = self.cube.mean_distribution(store, month=month)
+        else:
+            distribution = self.cube.distribution(store, week, month)
+        if distribution.empty:
+            raise KeyError(f'no covers for {store} in week {week}')
+        return distribution
+
+    def compute(self, store, week, scenario=None, role=None, month=None):
+        '''{measure: day x hour dataframe} for one store x week (x scenario x role)'''
+        distribution = self.distribution(store, week, month)
+        if scenario is None:
+            return {'distribution': distribution}
+        if scenario not in self.inputs:
+            raise KeyError(f'scenario {scenario} is not one of {list(self.inputs)}')
+        projected, rota = self.inputs[scenario]
+        projected = projected_for_store(projected, store)
+        rota = rota_for_store(rota, store)
+        if role is not None:
+            rota = rota[rota['Role'].astype(str).str.strip() == role]
+        if projected.empty or rota.empty:
+            raise KeyError(f'no projections or shifts for {store} / {scenario} / {role or "all roles"}')
+
+        covers = TransformationAlohaData.from_distribution(distribution.copy(), projected).data_distribution
+        on = template_coverage(rota)
+        return {
+            'distribution': distribution,
+            'covers': covers,
+            'rota': on,
+            'ratio': ratio_matrix(covers, on),
+        }
+
+    def encode(self, data, fmt):
+        '''day x hour dataframe -> (body, content type)'''
+        if fmt == 'json':
+            return json.dumps(matrices_to_dict(matrix=data)['matrix']).encode(), 'application/json'
+        if fmt == 'arrow':
+            if pa is None:
+                raise UnsupportedFormat('pyarrow is not installed, use format=json')
+            matrix = matrices_to_dict(matrix=data)['matrix']
+            table = pa.table(
+                [pa.array(matrix['days'])] + [pa.array(column, type=pa.float64()) for column in zip(*matrix['values'])],
+                names=['Day'] + matrix['hours'],
+            )
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return sink.getvalue().to_pybytes(), ARROW_CONTENT_TYPE
+        raise ValueError(f'unknown format {fmt}, use json or arrow')
+
+    def get(self, measure, store, week, scenario=None, role=None, fmt='json', month=None):
+        '''(body, content type, etag) of one matrix, from the cache when possible'''
+        if measure not in MEASURES:
+            raise ValueError(f'unknown measure {measure}, use one of {MEASURES}')
+        if measure != 'distribution' and scenario is None:
+            raise ValueError(f'{measure} needs a scenario')
+        if measure == 'distribution':
+            scenario, role = None, None
+
+        def response():
+            matrices = self.cached(('matrices', store, week, scenario, role, month), lambda: self.compute(store, week, scenario, role, month))
+            body, content_type = self.encode(matrices[measure], fmt)
+            return body, content_type, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+        return self.cached(('response', measure, store, week, scenario, role, fmt, month), response)
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        service = self.server.service
+        try:
+            if url.path == '/stores':
+                body = json.dumps(service.cached(('catalogue',), service.catalogue)).encode()
+                self.respond(200, body, 'application/json', '"' + hashlib.sha1(body).hexdigest() + '"')
+            elif url.path == '/matrix':
+                for required in ['store', 'week']:
+                    if required not in query:
+                        raise ValueError(f'{required} is missing')
+                month = query.get('month')
+                body, content_type, etag = service.get(
+                    query.get('measure', 'ratio'), query['store'], query['week'],
+                    query.get('scenario'), query.get('role'), query.get('format', 'json'),
+                    int(month) if month is not None and month.isdigit() else month,
+                )
+                self.respond(200, body, content_type, etag)
+            else:
+                self.error(404, f'unknown path {url.path}, use /stores or /matrix')
+        except KeyError as e:
+            self.error(404, e.args[0] if e.args else str(e))
+        except ValueError as e:
+            self.error(400, str(e))
+        except UnsupportedFormat as e:
+            self.error(406, str(e))
+
+    def respond(self, status, body, content_type, etag):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        # cached by the clients but checked again each time
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def error(self, status, message):
+        body = json.dumps({'error': message}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service, host='127.0.0.1', port=8502, verbose=False):
+        super().__init__((host, port), QueryHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+if __name__ == '__main__':
+    # python query_service.py data/covers_cube 8502
+    cube_path = sys.argv[1] if len(sys.argv) > 1 else 'data/covers_cube'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8502
+    server = QueryServer(QueryService(cube_path), port=port, verbose=True)
+    print(f'serving on http://127.0.0.1:{server.server_address[1]}')
+    server.serve_forever()
@@ -0,0 +1,229 @@
+'''
+Vectorised, date-aware rota ingest.
+
+TransformationRotaHours only understands weekday templates (one row per shift with a Day name).
+The scheduling system exports dated shifts for months and many sites, so here we:
+
+1. load any number of rota files (or dataframes) in one go
+2. parse the 'HH:MM' times to minutes after midnight without python loops
+3. place each shift on a single minute axis, overnight shifts end the next day and
+   multi-day shifts can give an 'End Date'
+4. count the people on for each date x hour (or weekday x hour) with a difference array,
+   so the cost is a couple of bincounts whatever the length of the shifts
+
+The hour flags follow TransformationRotaHours: a shift is on in hour h if
+start hour <= h < end hour (both floored to the hour).
+'''
+import sys
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+
+from dayparts import DAYS
+
+MINUTES_IN_DAY = 24 * 60
+
+# column names used by the different exports
+PERSON_COLUMNS = ['Employee', 'Employee Name', 'Name', 'Person']
+STORE_COLUMNS = ['Store_Name', 'Site', 'Location']
+
+
+def hour_labels(hours):
+    '''[7, 8, ..., 24, 25] -> ['7:00', '8:00', ..., '0:00', '1:00']'''
+    return [f'{col}:00' if col < 24 else f'{col-24}:00' for col in hours]
+
+
+def hours_from_labels(labels, day_start=7):
+    '''
+    The inverse of hour_labels, as done in plotting_both_heatmap:
+    the hours before day_start belong to the night after the day.
+    '''
+    hours = [int(col[:-3]) if isinstance(col, str) else int(col) for col in labels]
+    return [col + 24 if col < day_start else col for col in hours]
+
+
+def time_to_minutes(times):
+    '''
+    'HH:MM' (or 'HH:MM:SS', or 'HH') -> minutes after midnight, vectorised.
+    '''
+    parts = times.astype(str).str.strip().str.split(':', n=2, expand=True)
+    minutes = pd.to_numeric(parts[0]).to_numpy() * 60
+    if parts.shape[1] > 1:
+        minutes = minutes + pd.to_numeric(parts[1]).fillna(0).to_numpy()
+    return minutes.astype(np.int64)
+
+
+def load_rota(paths):
+    '''
+    One dataframe from a path, a dataframe or a list of them (e.g. one export per site/month)
+    with the spaces stripped from the column names.
+    '''
+    if type(paths) == str or isinstance(paths, pd.DataFrame):
+        paths = [paths]
+    data = [pd.read_csv(path) if type(path) == str else path for path in paths]
+    data = pd.concat(data, ignore_index=True)
+    data.columns = [col.strip() for col in data.columns]
+    return data
+
+
+def find_column(data, candidates):
+    for col in candidates:
+        if col in data.columns:
+            return col
+    return None
+
+
+def normalise_shifts(rota, date_format=None):
+    '''
+    Rota (template with a Day column, or dated with a Date column) -> one row per shift with:
+
+    Start, End: minutes from midnight of the first day (the first date of the rota,
+                or Monday for a template)
+    Day:        0 = Monday
+    Role, Store_Name, Person: when present in the export
+    Date:       for dated rotas
+
+    Shifts that start and end at the same time are dropped (as in TransformationRotaHours.cleaning),
+    a shift that ends before it starts ends the next day, unless the export gives an 'End Date'
+    for that row.
+    '''
+    rota = load_rota(rota)
+    rota = rota[rota['Start Time (Hour)'] != rota['End Time (Hour)']]
+    start = time_to_minutes(rota['Start Time (Hour)'])
+    end = time_to_minutes(rota['End Time (Hour)'])
+
+    shifts = pd.DataFrame(index=rota.index)
+    if 'Date' in rota.columns:
+        date = pd.to_datetime(rota['Date'], format=date_format)
+        first_date = date.min()
+        day_offset = (date - first_date).dt.days.to_numpy()
+        end_offset = (end < start).astype(np.int64)
+        if 'End Date' in rota.columns:
+            # rows with a blank End Date keep the end < start rule
+            end_date = pd.to_datetime(rota['End Date'], format=date_format)
+            end_offset = np.where(end_date.notna(), (end_date - date).dt.days, end_offset).astype(np.int64)
+        shifts['Date'] = date
+        shifts['Day'] = date.dt.dayofweek.to_numpy()
+        shifts.attrs['first_date'] = first_date
+    else:
+        day_offset = rota['Day'].str.strip().map({day: i for i, day in enumerate(DAYS)}).to_numpy()
+        end_offset = (end < start).astype(np.int64)
+        shifts['Day'] = day_offset
+
+    shifts['Start'] = day_offset * MINUTES_IN_DAY + start
+    shifts['End'] = (day_offset + end_offset) * MINUTES_IN_DAY + end
+    for name, candidates in [('Role', ['Role']), ('Store_Name', STORE_COLUMNS), ('Person', PERSON_COLUMNS)]:
+        col = find_column(rota, candidates)
+        if col is not None:
+            shifts[name] = rota[col].to_numpy()
+    return shifts.reset_index(drop=True)
+
+
+def hour_coverage(shifts, n_slots, by=None):
+    '''
+    Difference array over hour slots: +1 at the start hour, -1 at the end hour, then cumsum.
+
+    returns (coverage, groups) with coverage of shape (len(groups), n_slots)
+    '''
+    if by is None:
+        group_codes, groups = np.zeros(len(shifts), dtype=np.int64), ['All']
+    else:
+        group_codes, groups = pd.factorize(shifts[by], sort=True)
+    start_slot = shifts['Start'].to_numpy() // 60
+    end_slot = np.minimum(shifts['End'].to_numpy() // 60, n_slots)
+    size = len(groups) * (n_slots + 1)
+    diff = np.bincount(group_codes * (n_slots + 1) + start_slot, minlength=size) \
+        - np.bincount(group_codes * (n_slots + 1) + end_slot, minlength=size)
+    coverage = diff.reshape(len(groups), n_slots + 1)[:, :n_slots].cumsum(axis=1)
+    return coverage, list(groups)
+
+
+def date_hour_coverage(shifts, by=None):
+    '''
+    People on for each date x hour of a dated rota (overnight hours fall on the next date).
+
+    returns (coverage, groups, dates) with coverage of shape (groups, dates, 24)
+    '''
+    n_days = int(-(-shifts['End'].max() // MINUTES_IN_DAY))
+    coverage, groups = hour_coverage(shifts, n_days * 24, by=by)
+    dates = pd.date_range(shifts.attrs['first_date'], periods=n_days)
+    return coverage.reshape(len(groups), n_days, 24), groups, dates
+
+
+def weekday_hour_coverage(shifts, by=None):
+    '''
+    People on for each weekday x hour.
+
+    For a template the week wraps (a Sunday night shift ends on Monday morning),
+    for a dated rota it is the average over the dates of each weekday.
+
+    returns (coverage, groups) with coverage of shape (groups, 7, 24)
+    '''
+    if 'Date' not in shifts.columns:
+        week = 7 * 24
+        # unroll up to two weeks so the end of the week wraps onto monday
+        coverage, groups = hour_coverage(shifts, 2 * week, by=by)
+        coverage = coverage[:, :week] + coverage[:, week:]
+        return coverage.reshape(len(groups), 7, 24), groups
+
+    coverage, groups, dates = date_hour_coverage(shifts, by=by)
+    weekday = dates.dayofweek.to_numpy()
+    counts = np.bincount(weekday, minlength=7)
+    summed = np.zeros((len(groups), 7, 24))
+    np.add.at(summed, (slice(None), weekday), coverage)
+    return summed / np.maximum(counts, 1)[None, :, None], groups
+
+
+def template_coverage(rota):
+    '''
+    The same dataframe as TransformationRotaHours.transform for a weekday template:
+    overnight hours stay on the day the shift started (columns 24, 25, ... -> '0:00', '1:00', ...).
+    '''
+    shifts = normalise_shifts(rota)
+    start_hour = (shifts['Start'] % MINUTES_IN_DAY).to_numpy() // 60
+    end_hour = (shifts['End'] % MINUTES_IN_DAY).to_numpy() // 60
+    end_hour = np.where(start_hour > end_hour, end_hour + 24, end_hour)
+    day = shifts['Day'].to_numpy()
+
+    hours = range(start_hour.min(), end_hour.max() + 1)
+    width = 49
+    diff = np.bincount(day * width + start_hour, minlength=7 * width) \
+        - np.bincount(day * width + end_hour, minlength=7 * width)
+    coverage = diff.reshape(7, width).cumsum(axis=1)[:, hours.start:hours.stop]
+
+    data = pd.DataFrame(coverage, index=DAYS, columns=hour_labels(hours))
+    # days without shifts are empty, as after the groupby + reindex
+    data.loc[~np.isin(np.arange(7), day)] = np.nan
+    return data
+
+
+def coverage_frame(coverage, index):
+    '''(rows x 24) coverage -> dataframe with the rows as index and the hours as columns'''
+    return pd.DataFrame(coverage, index=index, columns=hour_labels(range(coverage.shape[-1])))
+
+
+def plot_coverage(data, title='Rotas Hours'):
+    fig = go.Figure(data=go.Heatmap(
+                    z=data,
+                    x=data.columns,
+                    y=data.index,
+                    hoverongaps = False,
+                    text = data,
+                    hovertemplate = 'Day: %{y}<br>Hour: %{x}<br>Number of people: %{z}<extra></extra>',
+                    textsrc='z', texttemplate='%{z:.1f}',
+                    colorscale='Blues',
+                    showscale=False,
+                    ))
+    fig.update_layout(title=title, xaxis_title='Hour', yaxis_title='Day')
+    st.plotly_chart(fig, use_container_width=True)
+
+
+if __name__ == '__main__':
+    # streamlit run rota_ingest.py data/rota_export_1.csv data/rota_export_2.csv ...
+    shifts = normalise_shifts(sys.argv[1:] or 'data/rota_hours_high.csv')
+    by = 'Role' if 'Role' in shifts.columns else None
+    coverage, groups = weekday_hour_coverage(shifts, by=by)
+    group = st.selectbox('Select role', groups)
+    plot_coverage(coverage_frame(coverage[groups.index(group)], DAYS))
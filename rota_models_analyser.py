@@ -2,6 +2,9 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
+from heatmap_figures import rota_heatmap_figure
+from rota_ingest import hour_labels
+
 class TransformationRotaHours:
     def __init__(self, data_path = 'data/rota_hours_high.csv'):
         '''
@@ -58,7 +61,7 @@ class TransformationRotaHours:
         # keep only columns with hours
         self.data = self.data[self.columns_hours]
         # change columns names
-        self.data.columns = [f'{col}:00' if col < 24 else f'{col-24}:00' for col in self.data.columns]
+        self.data.columns = hour_labels(self.data.columns)
         #st.write(self.data)
 
     def transform(self):
@@ -69,31 +72,7 @@ class TransformationRotaHours:
     
     def plot(self):
         # create a heatmap
-        fig = go.Figure(data=go.Heatmap(
-                        z=self.data,
-                        x=self.data.columns,
-                        y=self.data.index,
-                        hoverongaps = False,
-                        text = self.data,
-                        hovertemplate = 'Day: %{y}<br>Hour: %{x}<br>Number of people: %{z}<extra></extra>',
-                        textsrc='z', texttemplate='%{z}',
-                        colorscale='Blues',
-                        showscale=False,
-                        ))
-        
-        fig.update_layout(
-            title='Rotas Hours',
-            xaxis_nticks=24,
-            xaxis_title='Hour',
-            yaxis_title='Day',
-            yaxis_nticks=7,
-            width=1000,
-            height=500,
-        )
-
-        # no colorbar
-        fig.update_layout(coloraxis_showscale=False)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(rota_heatmap_figure(self.data), use_container_width=True)
 
     def plot_1(self):
         # create a chart for each day
@@ -0,0 +1,218 @@
+'''
+Rota optimiser: propose the shifts that hit a target covers per employee ratio.
+
+Today the rota_hours_*.csv are written by hand and the ratio heatmap of plotting_both_heatmap
+only tells afterwards if they were right. Here we go the other way:
+
+1. from the projected covers (TransformationAlohaData.data_distribution) and the target
+   covers / employee band of each role, the people needed in each hour are
+   ceil(covers / max ratio), kept between the min and max heads of the role
+2. for each day and role the shifts are laid greedily from the first hour that is short:
+   start as late as the start window allows, with the shortest allowed length that covers the
+   run of short hours (or, if none does, the first of the back to back lengths with the fewest
+   hours that cover it), and repeat until no hour is short;
+   the people no shift of the role can cover (outside its start window) are reported in
+   rota.attrs['uncovered'], not dropped silently
+3. the min of the band (too many people for the covers) is not a constraint, band_report
+   counts the hours out of the band on each side
+
+The shifts are intervals over at most ~24 hours, so a full week for all the roles is a few
+thousand array operations and re-solves interactively. The result has the rota_hours_*.csv
+schema (Day, Role, Start Time (Hour), End Time (Hour)) so it goes straight into
+TransformationRotaHours.
+
+targets = {
+    'Server': {'ratio': (8, 12), 'lengths': [4, 6, 8], 'start_window': (7, 20), 'min_heads': 1, 'max_heads': 10},
+}
+'''
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rota_ingest import hours_from_labels
+
+
+def required_heads(covers, ratio, min_heads=0, max_heads=None):
+    '''
+    covers: days x hours array, ratio: (min, max) covers per employee
+    the max of the band sets the people needed, the hours with no covers need nobody
+    '''
+    heads = np.ceil(covers / ratio[1])
+    heads = np.where(covers > 0, np.maximum(heads, min_heads), 0)
+    if max_heads is not None:
+        heads = np.minimum(heads, max_heads)
+    return heads.astype(int)
+
+
+def first_length(need, lengths):
+    '''
+    lengths: sorted. first shift of the back to back lengths with the fewest hours covering need
+    hours (4 then 6 for a 10 hour run with [4, 6, 8], not 8 then 4)
+    '''
+    fewest = [0] * (need + 1)
+    for n in range(1, need + 1):
+        fewest[n] = min(length + fewest[max(n - length, 0)] for length in lengths)
+    return min(lengths, key=lambda length: length + fewest[max(need - length, 0)])
+
+
+def lay_shifts(demand, hours, lengths, start_window=None):
+    '''
+    Greedy cover of one day: demand[i] people needed in hours[i] (consecutive hours).
+
+    returns a list of (start hour, end hour) shifts and the people on in each hour, the hours
+    still short (on < demand) are the ones no shift in the start window can cover
+    '''
+    lengths = sorted(lengths)
+    closing = hours[-1] + 1
+    earliest, latest = start_window if start_window is not None else (hours[0], closing - lengths[0])
+    # the csv only knows the start time, a shift starting after midnight would land on the morning
+    latest = min(latest, 23)
+    demand = demand.copy()
+    on = np.zeros(len(hours), dtype=int)
+    shifts = []
+    while True:
+        short = np.flatnonzero(on < demand)
+        if len(short) == 0:
+            return shifts, on
+        i = short[0]
+        hour = hours[i]
+        # length of the run of short hours from i
+        covered_after = np.flatnonzero(on[i:] >= demand[i:])
+        run = len(hours) - i if len(covered_after) == 0 else covered_after[0]
+        start = min(max(hour, earliest), latest)
+        # shortest shift from start to the end of the run, or the first of the shifts that cover it
+        length = next((length for length in lengths if start + length >= hour + run), None) \
+            or first_length(hour + run - start, lengths)
+        if start + length > closing:
+            # finish at closing if the window allows it, still covering this hour
+            start = max(closing - length, earliest, hour - length + 1)
+        if not start <= hour < start + length:
+            # no shift of this role can cover the hour
+            demand[i] = on[i]
+            continue
+        people = max(1, int((demand[i:i + run] - on[i:i + run]).min()))
+        on[(hours >= start) & (hours < start + length)] += people
+        shifts += [(start, start + length)] * people
+
+
+def optimise_rota(covers, targets):
+    '''
+    covers: TransformationAlohaData.data_distribution (days x 'H:00' columns, or int hours)
+    targets: {role: {'ratio': (min, max), 'lengths': [...], 'start_window': (first, last start hour),
+                     'min_heads': n, 'max_heads': n}}
+
+    returns the rota (Day, Role, Start Time (Hour), End Time (Hour)) that covers the demand,
+    with the demand it could not cover in rota.attrs['uncovered'] (Day, Role, Hour, People Short)
+    '''
+    hours = np.array(hours_from_labels(covers.columns))
+    order = np.argsort(hours)
+    hours = hours[order]
+    values = covers.to_numpy(dtype=float)[:, order]
+    values = np.nan_to_num(values)
+
+    rows, uncovered = [], []
+    for role, target in targets.items():
+        demand = required_heads(values, target['ratio'], target.get('min_heads', 0), target.get('max_heads'))
+        for day, day_demand in zip(covers.index, demand):
+            if not day_demand.any():
+                continue
+            shifts, on = lay_shifts(day_demand, hours, target['lengths'], target.get('start_window'))
+            rows += [(day, role, start, end) for start, end in shifts]
+            short = np.flatnonzero(on < day_demand)
+            uncovered += [(day, role, f'{hours[i] % 24}:00', int(day_demand[i] - on[i])) for i in short]
+
+    rota = pd.DataFrame(rows, columns=['Day', 'Role', 'Start', 'End'])
+    rota['Start Time (Hour)'] = [f'{hour % 24}:00' for hour in rota['Start']]
+    rota['End Time (Hour)'] = [f'{hour % 24}:00' for hour in rota['End']]
+    rota = rota.sort_values(['Day', 'Role', 'Start'], key=lambda col: col.map(day_order(covers.index)) if col.name == 'Day' else col)
+    rota = rota[['Day', 'Role', 'Start Time (Hour)', 'End Time (Hour)']].reset_index(drop=True)
+    rota.attrs['uncovered'] = pd.DataFrame(uncovered, columns=['Day', 'Role', 'Hour', 'People Short'])
+    return rota
+
+
+def band_report(covers, rota, targets):
+    '''
+    Hours with covers out of the target band of each role:
+    Understaffed (more covers per employee than the max) and Overstaffed (less than the min).
+    '''
+    from rota_ingest import template_coverage
+
+    covers = covers.copy()
+    covers.columns = hours_from_labels(covers.columns)
+    report = []
+    for role, target in targets.items():
+        shifts = rota[rota['Role'] == role]
+        if shifts.empty:
+            # nobody on: 0 labour hours, every hour with covers is understaffed
+            on = pd.DataFrame(0, index=covers.index, columns=covers.columns)
+        else:
+            on = template_coverage(shifts).fillna(0)
+            on.columns = hours_from_labels(on.columns)
+            on = on.T.groupby(level=0).sum().T.reindex(index=covers.index, columns=covers.columns, fill_value=0)
+        open_hours = covers.to_numpy() > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = covers.to_numpy() / on.to_numpy()
+        report.append({
+            'Role': role,
+            'Labour Hours': int(on.to_numpy().sum()),
+            'Understaffed Hours': int((open_hours & (ratio > target['ratio'][1])).sum()),
+            'Overstaffed Hours': int((open_hours & (ratio < target['ratio'][0])).sum()),
+        })
+    return pd.DataFrame(report)
+
+
+def day_order(days):
+    return {day: i for i, day in enumerate(days)}
+
+
+def labour_hours(rota):
+    '''total hours of a rota in the csv schema'''
+    start = rota['Start Time (Hour)'].str.split(':').str[0].astype(int)
+    end = rota['End Time (Hour)'].str.split(':').str[0].astype(int)
+    return int(((end - start) % 24).sum())
+
+
+if __name__ == '__main__':
+    import time
+    from aloha_analyser_all_weeks import TransformationAlohaData
+    from rota_models_analyser import TransformationRotaHours
+
+    projected_covers = pd.read_csv('data/projected_med.csv')
+    projected_covers.columns = [col.strip() for col in projected_covers.columns]
+    transformation = TransformationAlohaData('data/aloha.csv', projected_covers)
+
+    targets = pd.DataFrame({
+        'Role': ['Server', 'Runner', 'Host'],
+        'Min Ratio': [8, 15, 30],
+        'Max Ratio': [12, 25, 50],
+        'Lengths': ['4, 6, 8', '4, 6, 8', '6, 8'],
+        'First Start': [7, 7, 7],
+        'Last Start': [20, 20, 18],
+        'Min Heads': [1, 1, 1],
+        'Max Heads': [10, 6, 2],
+    })
+    targets = st.experimental_data_editor(targets, use_container_width=True, num_rows='dynamic')
+    targets = {
+        row['Role']: {
+            'ratio': (row['Min Ratio'], row['Max Ratio']),
+            'lengths': [int(length) for length in str(row['Lengths']).split(',')],
+            'start_window': (int(row['First Start']), int(row['Last Start'])),
+            'min_heads': int(row['Min Heads']),
+            'max_heads': int(row['Max Heads']),
+        }
+        for _, row in targets.iterrows()
+    }
+
+    started = time.time()
+    rota = optimise_rota(transformation.data_distribution, targets)
+    st.caption(f'Solved in {time.time() - started:.2f}s, {labour_hours(rota)} labour hours')
+    if len(rota.attrs['uncovered']):
+        st.warning('Some hours are outside the start window of their role and stay short:')
+        st.write(rota.attrs['uncovered'])
+    st.download_button('Download rota', rota.to_csv(index=False), file_name='rota_hours_optimised.csv')
+    st.write(band_report(transformation.data_distribution, rota, targets))
+
+    rota_hours = TransformationRotaHours(data_path=rota)
+    rota_hours.transform()
+    rota_hours.plot()
+    st.write(rota)
@@ -0,0 +1,214 @@
+'''
+Sorted interval index over the rota shifts.
+
+Once TransformationRotaHours.transformation0 has expanded the shifts into hour flags we only
+know how many people are on, not who. Here we keep the shifts as intervals on the minute
+axis of rota_ingest.normalise_shifts, sorted by start, so that:
+
+- how many people are on at t:  #starts <= t  -  #ends <= t    (two binary searches)
+- who is on at t / in [a, b):   binary search the starts in (a - longest shift, b),
+                                then keep the ones that end after a
+- slots below a minimum, top-k busiest/quietest slots: the counts above for a whole grid
+  of times at once (vectorised searchsorted) and a partial sort
+
+Example:
+    index = ShiftIndex('data/rota_hours_high.csv')
+    index.at('Friday', '19:15')
+    index.understaffed_slots(minimum=3, roles=['FOH'])
+'''
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+
+from dayparts import DAYS
+from rota_ingest import MINUTES_IN_DAY, normalise_shifts, time_to_minutes, hours_from_labels
+
+MINUTES_IN_WEEK = 7 * MINUTES_IN_DAY
+
+
+class ShiftIndex:
+    def __init__(self, rota):
+        '''
+        rota: a rota file/dataframe (template or dated) or the output of normalise_shifts
+        '''
+        shifts = rota if isinstance(rota, pd.DataFrame) and 'Start' in rota.columns else normalise_shifts(rota)
+        self.dated = 'Date' in shifts.columns
+        self.first_date = shifts.attrs.get('first_date')
+        if not self.dated:
+            # a template repeats every week: the shifts running past sunday midnight
+            # are also on monday morning of the same week
+            wrapped = shifts[shifts['End'] > MINUTES_IN_WEEK].copy()
+            wrapped['Start'] -= MINUTES_IN_WEEK
+            wrapped['End'] -= MINUTES_IN_WEEK
+            shifts = pd.concat([shifts, wrapped], ignore_index=True)
+
+        self.shifts = shifts.sort_values('Start', kind='stable').reset_index(drop=True)
+        self.starts = self.shifts['Start'].to_numpy()
+        self.ends = self.shifts['End'].to_numpy()
+        self.sorted_ends = np.sort(self.ends)
+        self.longest = (self.ends - self.starts).max() if len(self.shifts) else 0
+        self.roles = list(self.shifts['Role'].unique()) if 'Role' in self.shifts.columns else []
+        # {roles: index over those roles}, see for_roles
+        self.role_indexes = {}
+
+    def to_minute(self, day, time='00:00'):
+        '''
+        ('Friday', '19:15') or ('2023-09-15', '19:15') -> minute on the index axis,
+        on a dated index a weekday is its first date in the rota
+        '''
+        minute = time_to_minutes(pd.Series([time]))[0]
+        if day in DAYS:
+            if self.dated:
+                return (DAYS.index(day) - self.first_date.dayofweek) % 7 * MINUTES_IN_DAY + minute
+            return DAYS.index(day) * MINUTES_IN_DAY + minute
+        return (pd.Timestamp(day) - self.first_date).days * MINUTES_IN_DAY + minute
+
+    def for_roles(self, roles):
+        '''index over a subset of roles (a tuple), cached on the index so the filters in the app are free'''
+        if roles in self.role_indexes:
+            return self.role_indexes[roles]
+        subset = self.shifts[self.shifts['Role'].isin(roles)]
+        index = ShiftIndex.__new__(ShiftIndex)
+        index.__dict__.update(self.__dict__)
+        index.role_indexes = {}
+        index.shifts = subset.reset_index(drop=True)
+        index.starts = index.shifts['Start'].to_numpy()
+        index.ends = index.shifts['End'].to_numpy()
+        index.sorted_ends = np.sort(index.ends)
+        index.longest = (index.ends - index.starts).max() if len(subset) else 0
+        self.role_indexes[roles] = index
+        return index
+
+    def select(self, roles):
+        if roles is None:
+            return self
+        return self.for_roles(tuple(sorted(roles)))
+
+    def count(self, minutes, roles=None):
+        '''number of people on at each of the minutes (scalar or array)'''
+        index = self.select(roles)
+        minutes = np.asarray(minutes)
+        return np.searchsorted(index.starts, minutes, side='right') - np.searchsorted(index.sorted_ends, minutes, side='right')
+
+    def overlapping(self, start, end, roles=None):
+        '''the shifts on at any time in [start, end) (minutes)'''
+        index = self.select(roles)
+        first = np.searchsorted(index.starts, start - index.longest, side='right')
+        last = np.searchsorted(index.starts, end, side='left')
+        candidates = index.shifts.iloc[first:last]
+        return candidates[candidates['End'] > start]
+
+    def at(self, day, time, roles=None):
+        '''who is on, e.g. at('Friday', '19:15')'''
+        minute = self.to_minute(day, time)
+        return self.overlapping(minute, minute + 1, roles=roles)
+
+    def slot_counts(self, step=60, roles=None, start=0, end=None):
+        '''
+        people on at the start of each slot of `step` minutes,
+        returns (slot start minutes, counts)
+        '''
+        if end is None:
+            end = MINUTES_IN_WEEK if not self.dated else int(-(-self.ends.max() // MINUTES_IN_DAY)) * MINUTES_IN_DAY
+        minutes = np.arange(start, end, step)
+        return minutes, self.count(minutes, roles=roles)
+
+    def slots_frame(self, minutes, counts):
+        day = minutes // MINUTES_IN_DAY
+        data = pd.DataFrame({
+            'Day': [DAYS[d % 7] for d in day] if not self.dated else self.first_date + pd.to_timedelta(day, unit='D'),
+            'Time': [f'{m // 60:02d}:{m % 60:02d}' for m in minutes % MINUTES_IN_DAY],
+            'People': counts,
+        })
+        data['Minute'] = minutes
+        return data
+
+    def understaffed_slots(self, minimum, roles=None, step=15, open_minutes=None):
+        '''
+        slots with fewer than `minimum` people (of the roles) on.
+        open_minutes: optional (start, end) minutes of the day when the restaurant is open
+        '''
+        minutes, counts = self.slot_counts(step=step, roles=roles)
+        keep = counts < minimum
+        if open_minutes is not None:
+            minute_of_day = minutes % MINUTES_IN_DAY
+            keep &= (minute_of_day >= open_minutes[0]) & (minute_of_day < open_minutes[1])
+        return self.slots_frame(minutes[keep], counts[keep])
+
+    def top_slots(self, k, roles=None, step=60, largest=True, open_minutes=None):
+        '''the k busiest (or quietest) slots, with a partial sort instead of a full one'''
+        minutes, counts = self.slot_counts(step=step, roles=roles)
+        if open_minutes is not None:
+            minute_of_day = minutes % MINUTES_IN_DAY
+            is_open = (minute_of_day >= open_minutes[0]) & (minute_of_day < open_minutes[1])
+            minutes, counts = minutes[is_open], counts[is_open]
+        k = min(k, len(counts))
+        if k == 0:
+            return self.slots_frame(minutes[:0], counts[:0])
+        key = -counts if largest else counts
+        top = np.argpartition(key, k - 1)[:k]
+        top = top[np.argsort(key[top], kind='stable')]
+        return self.slots_frame(minutes[top], counts[top])
+
+    def describe(self, shifts):
+        '''short text for a tooltip: the people (or the roles) on'''
+        if len(shifts) == 0:
+            return 'Nobody'
+        if 'Person' in shifts.columns:
+            return '<br>'.join(f'{person} ({role})' for person, role in zip(shifts['Person'], shifts.get('Role', [''] * len(shifts))))
+        if 'Role' in shifts.columns:
+            return '<br>'.join(f'{role}: {n}' for role, n in shifts['Role'].value_counts().items())
+        return f'{len(shifts)} people'
+
+    def hover_text(self, days, hours, roles=None):
+        '''
+        days x hours array of tooltips for a heatmap (hours >= 24 are after midnight),
+        e.g. customdata for the TransformationRotaHours heatmap
+        '''
+        text = np.empty((len(days), len(hours)), dtype=object)
+        for i, day in enumerate(days):
+            for j, hour in enumerate(hours):
+                start = self.to_minute(day) + hour * 60
+                text[i, j] = self.describe(self.overlapping(start, start + 60, roles=roles))
+        return text
+
+
+def plot_rota_with_people(rota_hours, index, roles=None):
+    '''
+    Heatmap of TransformationRotaHours.data with who is on in the tooltip.
+    '''
+    data = rota_hours.data
+    hours = hours_from_labels(data.columns)
+    fig = go.Figure(data=go.Heatmap(
+                    z=data,
+                    x=data.columns,
+                    y=data.index,
+                    hoverongaps = False,
+                    text = data,
+                    customdata = index.hover_text(list(data.index), hours, roles=roles),
+                    hovertemplate = 'Day: %{y}<br>Hour: %{x}<br>Number of people: %{z}<br>%{customdata}<extra></extra>',
+                    textsrc='z', texttemplate='%{z}',
+                    colorscale='Blues',
+                    showscale=False,
+                    ))
+    fig.update_layout(title='Rotas Hours', xaxis_title='Hour', yaxis_title='Day')
+    st.plotly_chart(fig, use_container_width=True)
+
+
+if __name__ == '__main__':
+    from rota_models_analyser import TransformationRotaHours
+
+    rota = pd.read_csv('data/rota_hours_high.csv')
+    rota.columns = [col.strip() for col in rota.columns]
+    index = ShiftIndex(rota)
+    roles = st.multiselect('Select role', index.roles) or None
+
+    rota_hours = TransformationRotaHours(data_path=rota if roles is None else rota[rota['Role'].isin(roles)])
+    rota_hours.transform()
+    plot_rota_with_people(rota_hours, index, roles=roles)
+
+    c1, c2 = st.columns(2)
+    minimum = c1.number_input('Minimum people', min_value=1, value=3)
+    c1.write(index.understaffed_slots(minimum, roles=roles, open_minutes=(7 * 60, 24 * 60)))
+    c2.write(index.top_slots(10, roles=roles))
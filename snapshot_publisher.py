@@ -0,0 +1,201 @@
+'''
+Static report snapshots for read only viewers.
+
+Most people opening the dashboard only look at the high / med / low heatmaps, and each visit
+runs the whole pipeline and builds the plotly figures again. After each data refresh we render
+every scenario x store x week once:
+
+    snapshots/
+        index.html, index.json          the list of the reports
+        <scenario>/<store>/<week>.html  covers, rota and ratio heatmaps and the day by day chart
+        <scenario>/<store>/<week>.json  the day x hour matrices behind them
+
+The pages load a plotly.min.js (~4.5MB) written once next to the index, so they only open from
+the folder. With inline_plotly=True each page is self-contained instead (plotly.js inlined,
+~4.5MB a page), for the few pages sent on their own, not for every store and week.
+The folder can be served by any static file server (python -m http.server -d snapshots),
+the streamlit app is then only needed to edit the projections and the rotas.
+
+    python snapshot_publisher.py data/covers_cube snapshots 9
+
+The optional month keeps only the dates of that month, as the app does (see CoversCube).
+'''
+import html
+import json
+import os
+import re
+import sys
+
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+from aloha_analyser_all_weeks import TransformationAlohaData
+from covers_cube import CoversCube
+from heatmap_figures import (covers_heatmap_figure, rota_heatmap_figure, ratio_heatmap_figure,
+                             day_by_day_figure, ratio_matrix, to_int_hours, matrices_to_dict)
+from rota_models_analyser import TransformationRotaHours
+
+SCENARIOS = ['high', 'med', 'low']
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+{script}
+<style>body {{ font-family: sans-serif; margin: 2em; }} .row {{ display: flex; }} .row > div {{ flex: 1; }}</style>
+</head>
+<body>
+<p><a href="{index}">All reports</a></p>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+'''
+
+
+def slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '-', str(text)).strip('-').lower()
+
+
+def load_scenario_inputs(data_directory='data'):
+    '''the projected covers and the rota of each scenario, as read by main.py'''
+    inputs = {}
+    for scenario in SCENARIOS:
+        projected = pd.read_csv(os.path.join(data_directory, f'projected_{scenario}.csv'))
+        projected.columns = [col.strip() for col in projected.columns]
+        rota = pd.read_csv(os.path.join(data_directory, f'rota_hours_{scenario}.csv'))
+        rota.columns = [col.strip() for col in rota.columns]
+        inputs[scenario] = (projected, rota)
+    return inputs
+
+
+def projected_for_store(projected, store):
+    '''the projections can be for one store (the app files) or for all (covers_forecaster output)'''
+    if 'Store_Name' in projected.columns:
+        return projected[projected['Store_Name'] == store].drop(columns=['Store_Name'])
+    return projected
+
+
+def rota_for_store(rota, store):
+    if 'Store_Name' in rota.columns:
+        return rota[rota['Store_Name'] == store].drop(columns=['Store_Name'])
+    return rota
+
+
+def rota_hours_matrix(rota):
+    '''the rota as the day x hour people on of TransformationRotaHours, the same for all the weeks'''
+    rota_hours = TransformationRotaHours(data_path=rota.copy())
+    rota_hours.transform()
+    return rota_hours.data
+
+
+def render_report(distribution, projected, rota_hours):
+    '''
+    the figures and the matrices of one scenario x store x week
+    rota_hours: the rota of the scenario and store from rota_hours_matrix
+    '''
+    covers = TransformationAlohaData.from_distribution(distribution, projected).data_distribution
+    ratio = ratio_matrix(covers, rota_hours)
+    figures = [
+        covers_heatmap_figure(covers),
+        rota_heatmap_figure(rota_hours),
+        ratio_heatmap_figure(ratio),
+        day_by_day_figure(to_int_hours(covers), to_int_hours(rota_hours), ratio),
+    ]
+    matrices = matrices_to_dict(covers=covers, rota=rota_hours, ratio=ratio)
+    return figures, matrices
+
+
+def write_page(path, title, figures, depth, plotly_js=None):
+    '''plotly_js: the plotly.js source to inline, the page loads the shared plotly.min.js if None'''
+    up = '../' * depth
+    body = '\n'.join(
+        f'<div>{figure.to_html(full_html=False, include_plotlyjs=False)}</div>' for figure in figures
+    )
+    script = f'<script>{plotly_js}</script>' if plotly_js is not None else f'<script src="{up}plotly.min.js"></script>'
+    with open(path, 'w') as f:
+        f.write(PAGE.format(title=html.escape(title), script=script, index=f'{up}index.html', body=body))
+
+
+def write_index(directory, reports):
+    with open(os.path.join(directory, 'index.json'), 'w') as f:
+        json.dump(reports, f, indent=1)
+    rows = []
+    for scenario in SCENARIOS:
+        scenario_reports = [report for report in reports if report['scenario'] == scenario]
+        if not scenario_reports:
+            continue
+        rows.append(f'<h2>{scenario.capitalize()}</h2>')
+        for store in dict.fromkeys(report['store'] for report in scenario_reports):
+            links = ' '.join(
+                f'<a href="{report["html"]}">{html.escape(report["week"])}</a>'
+                for report in scenario_reports if report['store'] == store
+            )
+            rows.append(f'<p><b>{html.escape(store)}</b>: {links}</p>')
+    with open(os.path.join(directory, 'index.html'), 'w') as f:
+        f.write(PAGE.format(title='Labour model reports', script='', index='index.html', body='\n'.join(rows)))
+
+
+def publish_snapshots(cube, directory, inputs=None, stores=None, weeks=None, include_mean=True, inline_plotly=False, month=None):
+    '''
+    cube: CoversCube (or its path) with the covers distributions
+    inputs: {scenario: (projected covers, rota)}, read from data/ if None
+    stores / weeks: restrict the reports (all the stores and all the weeks they traded if None)
+    include_mean: also the report on the average of the weeks ('All')
+    inline_plotly: self-contained pages instead of pages sharing one plotly.min.js
+    month: only the dates of the month, 9 to match the app (see CoversCube), all the dates if None
+
+    returns the list of the reports written
+    '''
+    if type(cube) == str:
+        cube = CoversCube(cube)
+    if inputs is None:
+        inputs = load_scenario_inputs()
+    os.makedirs(directory, exist_ok=True)
+    plotly_js = get_plotlyjs()
+    if not inline_plotly:
+        with open(os.path.join(directory, 'plotly.min.js'), 'w') as f:
+            f.write(plotly_js)
+        plotly_js = None
+
+    reports = []
+    for store in stores or cube.stores:
+        store_weeks = weeks or cube.weeks_for_store(store, month)
+        distributions = [(week, cube.distribution(store, week, month)) for week in store_weeks]
+        if include_mean:
+            distributions.append(('All', cube.mean_distribution(store, month=month)))
+        for scenario, (projected, rota) in inputs.items():
+            projected_store = projected_for_store(projected, store)
+            rota_store = rota_for_store(rota, store)
+            if projected_store.empty or rota_store.empty:
+                continue
+            rota_hours = rota_hours_matrix(rota_store)
+            folder = os.path.join(directory, scenario, slug(store))
+            os.makedirs(folder, exist_ok=True)
+            for week, distribution in distributions:
+                if distribution.empty:
+                    continue
+                figures, matrices = render_report(distribution.copy(), projected_store, rota_hours)
+                title = f'{store} - {scenario} - {week}'
+                write_page(os.path.join(folder, f'{slug(week)}.html'), title, figures, depth=2, plotly_js=plotly_js)
+                with open(os.path.join(folder, f'{slug(week)}.json'), 'w') as f:
+                    json.dump(matrices, f)
+                reports.append({
+                    'scenario': scenario,
+                    'store': store,
+                    'week': str(week),
+                    'html': f'{scenario}/{slug(store)}/{slug(week)}.html',
+                    'json': f'{scenario}/{slug(store)}/{slug(week)}.json',
+                })
+    write_index(directory, reports)
+    return reports
+
+
+if __name__ == '__main__':
+    # python snapshot_publisher.py data/covers_cube snapshots [month, e.g. 9 as the app]
+    cube_path = sys.argv[1] if len(sys.argv) > 1 else 'data/covers_cube'
+    directory = sys.argv[2] if len(sys.argv) > 2 else 'snapshots'
+    month = sys.argv[3] if len(sys.argv) > 3 else None
+    reports = publish_snapshots(cube_path, directory, month=int(month) if month and month.isdigit() else month)
+    print(f'{len(reports)} reports written to {directory}')
@@ -4,4 +4,796 @@ author: Roberto Scalas
 date:   2023-05-31 12:26:19.796109
 '''
 import unittest 
- 
\ No newline at end of file
+import unittest.mock
+import json
+import os
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from aloha_analyser_all_weeks import TransformationAlohaData
+from covers_cube import build_covers_cube
+from covers_forecaster import forecast_covers, forecast_projections
+from dayparts import DAYPARTS, pos_daypart_table, config_daypart_table, hour_masks, project_dayparts
+from delivery_redistribution import redistribute_delivery, redistribute_scenarios
+from equivalence_harness import run_harness, random_checks, random_projected, random_rota
+from heatmap_figures import to_int_hours
+from hotspot_ranking import HotspotRanking, top_k
+from input_loader import InputLoader, input_mtimes
+from labour_rollup import LabourRollup, load_wages
+from large_parties import normalise_large_parties, store_spend_per_head
+from live_tail import LiveCoversTail
+from measures import measure_stack, measure_frame
+from period_comparison import PeriodAggregate, period_selector
+from query_service import QueryService, QueryServer
+from rota_ingest import normalise_shifts
+from rota_optimiser import optimise_rota, band_report, labour_hours
+from shift_index import ShiftIndex
+from snapshot_publisher import publish_snapshots
+from what_if_sweep import rota_matrix, sweep
+
+
+class TestLiveCoversTail(unittest.TestCase):
+    '''the harness appends checks to a local export while the tail follows it'''
+
+    header = 'Store_Name,Date,Open_Time,Guest_Count,Item_Sales,Void_Total,Day_Part_Name\n'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'aloha_today.csv')
+        self.tail = LiveCoversTail(self.path, store_name='D8 - Dishoom Birmingham', today='2023-09-15')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def append(self, text):
+        with open(self.path, 'a') as f:
+            f.write(text)
+
+    def test_reads_only_new_rows(self):
+        self.append(self.header)
+        self.append('D8 - Dishoom Birmingham,09-15-2023,750,2,40,0,Lunch\n')
+        self.assertEqual(self.tail.poll(), 1)
+        self.append('D8 - Dishoom Birmingham,09-15-2023,755,3,60,0,Lunch\n')
+        self.append('D8 - Dishoom Birmingham,09-15-2023,1150,4,80,0,Dinner\n')
+        self.assertEqual(self.tail.poll(), 2)
+        self.assertEqual(self.tail.poll(), 0)
+        self.assertEqual(self.tail.rows_read, 3)
+        # 12:30 and 12:35 -> hour 12, 19:10 -> hour 19
+        self.assertEqual(self.tail.covers[12 - 1], 5)
+        self.assertEqual(self.tail.covers[19 - 1], 4)
+
+    def test_partial_line_waits_for_next_poll(self):
+        self.append(self.header)
+        self.append('D8 - Dishoom Birmingham,09-15-2023,750,2,4')
+        self.assertEqual(self.tail.poll(), 0)
+        self.append('0,0,Lunch\n')
+        self.assertEqual(self.tail.poll(), 1)
+        self.assertEqual(self.tail.covers.sum(), 2)
+
+    def test_other_days_stores_and_voids_are_skipped(self):
+        self.append(self.header)
+        self.append('D8 - Dishoom Birmingham,09-14-2023,750,2,40,0,Lunch\n')
+        self.append('D1 - Dishoom Covent Garden,09-15-2023,750,2,40,0,Lunch\n')
+        self.append('D8 - Dishoom Birmingham,09-15-2023,750,2,40,40,Lunch\n')
+        self.tail.poll()
+        self.assertEqual(self.tail.covers.sum(), 0)
+
+    def test_ratio_against_rota(self):
+        self.append(self.header)
+        self.append('D8 - Dishoom Birmingham,09-15-2023,750,10,200,0,Lunch\n')
+        self.tail.poll()
+        rota = pd.DataFrame([[2.0, 4.0]], index=['Friday'], columns=['12:00', '13:00'])
+        ratio = self.tail.ratio(rota)
+        self.assertEqual(ratio.loc['Friday', '12:00'], 5)
+        self.assertEqual(ratio.loc['Friday', '13:00'], 0)
+
+    def test_truncated_file_starts_again(self):
+        self.append(self.header)
+        self.append('D8 - Dishoom Birmingham,09-15-2023,750,2,40,0,Lunch\n')
+        self.tail.poll()
+        with open(self.path, 'w') as f:
+            f.write(self.header)
+        self.tail.poll()
+        self.assertTrue(np.all(self.tail.covers == 0))
+
+    def test_replaced_file_starts_again(self):
+        self.append(self.header)
+        self.append('D8 - Dishoom Birmingham,09-15-2023,750,2,40,0,Lunch\n')
+        self.tail.poll()
+        # a new export written next to the old one and moved over it, longer than the offset read
+        replacement = os.path.join(self.directory.name, 'aloha_new.csv')
+        with open(replacement, 'w') as f:
+            f.write(self.header)
+            f.write('D8 - Dishoom Birmingham,09-15-2023,1150,4,80,0,Dinner\n')
+            f.write('D8 - Dishoom Birmingham,09-15-2023,1155,3,60,0,Dinner\n')
+        os.replace(replacement, self.path)
+        self.assertEqual(self.tail.poll(), 2)
+        self.assertEqual(self.tail.rows_read, 2)
+        self.assertEqual(self.tail.covers.sum(), 7)
+
+
+class TestInputLoader(unittest.TestCase):
+
+    def test_mtimes_and_failed_reads(self):
+        inputs = {'delivery': 'delivery_sales.csv', 'aloha': 'aloha.csv'}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'delivery_sales.csv')
+            pd.DataFrame({' Store': ['D1'], 'Sales ': [1.0]}).to_csv(path, index=False)
+            mtimes = input_mtimes(inputs, directory)
+            self.assertIsNone(mtimes[1])
+            loader = InputLoader(inputs, directory)
+            self.assertEqual(list(loader.get('delivery').columns), ['Store', 'Sales'])
+            with self.assertRaises(FileNotFoundError):
+                loader.get('aloha')
+            self.assertEqual(loader.failed(), ['aloha'])
+            # a refresh of the folder changes the key of the cached loader
+            os.utime(path, (0, 0))
+            self.assertNotEqual(input_mtimes(inputs, directory), mtimes)
+
+
+class TestLargeParties(unittest.TestCase):
+
+    checks = pd.DataFrame({
+        'Store_Name': ['D1', 'D1', 'D1', 'D8', 'D8', 'D8'],
+        'Guest_Count': [2, 4, 30, 2, 20, 25],
+        'Item_Sales': [40.0, 100.0, 600.0, 60.0, 600.0, 750.0],
+    })
+
+    def test_defaults_match_the_old_cleaning(self):
+        guest_count, adjusted = normalise_large_parties(self.checks)
+        old = self.checks.apply(lambda x: x['Item_Sales'] / 30 if x['Guest_Count'] >= 25 else x['Guest_Count'], axis=1)
+        self.assertTrue(np.allclose(guest_count, old))
+        self.assertEqual(adjusted.sum(), 2)
+
+    def test_per_store_threshold_and_learned_spend(self):
+        # D1 normal checks spend 20 and 25 per head, D8 30 and 30
+        self.assertEqual(store_spend_per_head(self.checks, threshold={'D8': 20}).to_dict(), {'D1': 22.5, 'D8': 30.0})
+        guest_count, adjusted = normalise_large_parties(self.checks, threshold={'D8': 20}, spend_per_head='median')
+        self.assertEqual(list(adjusted), [False, False, True, False, True, True])
+        self.assertAlmostEqual(guest_count[2], 600 / 22.5)
+        self.assertAlmostEqual(guest_count[4], 20)
+
+
+class TestMeasures(unittest.TestCase):
+
+    def test_stack_averages_the_weeks_with_checks(self):
+        checks = pd.DataFrame({
+            'Week_Number': [36, 36, 37, 37],
+            'Day_Name': ['Monday', 'Monday', 'Monday', 'Tuesday'],
+            'Hour': [12, 12, 12, 19],
+            'Guest_Count': [2.0, 4.0, 4.0, 3.0],
+            'Item_Sales': [40.0, 80.0, 100.0, 90.0],
+            'Void_Total': [0.0, 10.0, 0.0, 0.0],
+        })
+        stack, hours = measure_stack(checks)
+        self.assertEqual(hours, [12, 19])
+        self.assertEqual(stack.shape, (5, 7, 2))
+        # Monday 12:00: 6 covers in week 36 and 4 in week 37
+        self.assertEqual(measure_frame(stack, hours, 'Covers').loc['Monday', 12], 5)
+        self.assertEqual(measure_frame(stack, hours, 'Checks').loc['Monday', 12], 1.5)
+        self.assertEqual(measure_frame(stack, hours, 'Void_Total').loc['Monday', 12], 5)
+        self.assertEqual(measure_frame(stack, hours, 'Spend_Per_Head').loc['Monday', 12], 22)
+        # Tuesday 19:00 only had checks in week 37, Monday 19:00 never
+        self.assertEqual(measure_frame(stack, hours, 'Covers').loc['Tuesday', 19], 3)
+        self.assertTrue(np.isnan(measure_frame(stack, hours, 'Covers').loc['Monday', 19]))
+        self.assertTrue(np.isnan(measure_frame(stack, hours, 'Covers').loc['Sunday']).all())
+
+
+class TestDayparts(unittest.TestCase):
+
+    stores = ['D1 - Dishoom Covent Garden', 'D8 - Dishoom Birmingham']
+
+    def test_pos_labels_set_the_hours_of_each_store(self):
+        checks = pd.DataFrame({
+            'Store_Name': ['D1 - Dishoom Covent Garden'] * 3 + ['D8 - Dishoom Birmingham'] * 2,
+            'Hour': [11, 11, 11, 17, 1],
+            'Day_Part_Name': ['Lunch', 'Lunch', 'Breakfast', 'Dinner', ' Late Night'],
+        })
+        table = pos_daypart_table(checks, self.stores)
+        self.assertEqual(table.shape, (2, 24))
+        # the majority label of the hour, the other hours keep the fixed cut-offs
+        self.assertEqual(table[0, 10], 1)
+        self.assertEqual(table[1, 10], 0)
+        self.assertEqual(table[1, 16], 3)
+        self.assertEqual(table[1, 0], 3)
+        self.assertEqual(table[0, 0], 0)
+
+    def test_config_table_wraps_past_midnight(self):
+        config = pd.DataFrame({
+            'Store_Name': ['D8 - Dishoom Birmingham'] * 2,
+            'Daypart': ['Evening', 'dinner'],
+            'Start_Hour': [16, '19:00'],
+            'End_Hour': [19, 2],
+        })
+        table = config_daypart_table(config, self.stores)
+        masks = hour_masks(table, [15, 16, 18, 19, 24, 25, 2])
+        self.assertEqual(masks.shape, (2, 4, 7))
+        self.assertEqual(list(masks[1].argmax(axis=0)), [2, 2, 2, 3, 3, 3, 0])
+        self.assertEqual(list(masks[0].argmax(axis=0)), [2, 2, 3, 3, 3, 0, 0])
+
+    def test_projection_of_all_the_stores(self):
+        distributions = np.array([[[1.0, 3.0, 2.0, 2.0]], [[0.0, 0.0, 5.0, np.nan]]])
+        projected = np.array([[[40.0, 10.0]], [[40.0, 10.0]]])
+        masks = np.array([[[True, True, False, False], [False, False, True, True]]] * 2)
+        covers = project_dayparts(distributions, projected, masks)
+        self.assertEqual(covers.tolist(), [[[10.0, 30.0, 5.0, 5.0]], [[0.0, 0.0, 10.0, 0.0]]])
+
+
+class TestEquivalence(unittest.TestCase):
+    '''the optimised paths give the same day x hour matrices as the original implementations'''
+
+    def test_optimised_paths_match_the_originals(self):
+        results = run_harness(seeds=range(3), n_checks=3000, n_shifts=60)
+        self.assertEqual(set(results['Stage']), {'analyser_week', 'analyser_all_weeks', 'covers_week', 'covers_straddling_week', 'covers_all_weeks', 'covers_all_stores', 'rota_hours', 'delivery'})
+        for _, row in results.iterrows():
+            with self.subTest(stage=row['Stage'], seed=row['Seed']):
+                self.assertTrue(row['Equal'], f'max difference {row["Max_Difference"]}')
+
+
+class TestHotspotRanking(unittest.TestCase):
+
+    def test_top_k_without_a_full_sort(self):
+        values = np.array([[3.0, np.nan, 7.0], [1.0, 9.0, 5.0]])
+        self.assertEqual(list(top_k(values, 2)), [4, 2])
+        self.assertEqual(list(top_k(values, 2, largest=False)), [3, 0])
+        self.assertEqual(len(top_k(values, 10)), 5)
+
+    def test_slots_match_the_store_ratio(self):
+        rng = np.random.default_rng(0)
+        checks = random_checks(rng, 3000)
+        stores = sorted(checks['Store_Name'].unique())
+        rota = pd.concat([random_rota(rng, 60).assign(Store_Name=store) for store in stores[:2]])
+        with tempfile.TemporaryDirectory() as directory:
+            cube = build_covers_cube(checks, os.path.join(directory, 'covers_cube'))
+            ranking = HotspotRanking(cube, random_projected(rng), rota, week=37)
+            under, over = ranking.slots(k=5)
+            self.assertTrue((under['Ratio'].diff().dropna() <= 0).all())
+            self.assertTrue((over['Ratio'].diff().dropna() >= 0).all())
+            self.assertGreaterEqual(under['Ratio'].min(), over['Ratio'].max())
+            # the same ratio as plotting_both_heatmap for the store
+            for _, slot in pd.concat([under, over]).iterrows():
+                _, _, ratio = ranking.drill_down(slot['Store_Name'])
+                hour = int(slot['Hour'][:-3])
+                self.assertAlmostEqual(ratio.loc[slot['Day'], hour + 24 if hour < 7 else hour], slot['Ratio'])
+            # the third store has no rota, all its covers are uncovered
+            uncovered = ranking.uncovered(k=5, stores=[stores[2]])
+            self.assertEqual(len(uncovered), 5)
+            self.assertTrue((uncovered['Employees'] == 0).all() and (uncovered['Covers'] > 0).all())
+
+    def test_rota_past_the_opening_hour(self):
+        # 7:00 to 8:00 the next morning, 7:00 is on the day and again after midnight
+        on = pd.DataFrame([[1, 1, 1, 1, 0]], index=['Monday'], columns=['7:00', '23:00', '0:00', '7:00', '8:00'])
+        on = to_int_hours(on)
+        self.assertEqual(list(on.columns), [7, 8, 23, 24])
+        self.assertEqual(list(on.loc['Monday']), [2, 0, 1, 1])
+
+
+class TestQueryService(unittest.TestCase):
+    '''the service runs on a free localhost port over a small cube built in a temporary folder'''
+
+    store = 'D8 - Dishoom Birmingham'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        # 2 checks of 4 guests at 12:30 and 1 check of 2 guests at 19:10, every day of 2023-W37
+        dates = pd.date_range('2023-09-11', '2023-09-17').strftime('%m-%d-%Y')
+        checks = pd.DataFrame([
+            (cls.store, date, open_time, guests, guests * 20, 0, 'Lunch')
+            for date in dates for open_time, guests in [(750, 4), (755, 4), (1150, 2)]
+        ], columns=['Store_Name', 'Date', 'Open_Time', 'Guest_Count', 'Item_Sales', 'Void_Total', 'Day_Part_Name'])
+        cube = build_covers_cube(checks, os.path.join(cls.directory.name, 'covers_cube'))
+        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        projected = pd.DataFrame({'day': days, 'breakfast': 0, 'afternoon': 80, 'evening': 0, 'dinner': 20})
+        rota = pd.DataFrame({
+            'Day': days * 2,
+            'Role': ['Server'] * 7 + ['Host'] * 7,
+            'Start Time (Hour)': ['11:00'] * 14,
+            'End Time (Hour)': ['22:00'] * 14,
+        })
+        cls.service = QueryService(cube, inputs={'med': (projected, rota)})
+        cls.server = QueryServer(cls.service, port=0)
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.directory.cleanup()
+
+    def request(self, path, **headers):
+        try:
+            with urllib.request.urlopen(urllib.request.Request(self.url + path.replace(' ', '%20'), headers=headers)) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def test_distribution_matrix(self):
+        status, _, body = self.request(f'/matrix?measure=distribution&store={self.store}&week=2023-W37')
+        self.assertEqual(status, 200)
+        matrix = json.loads(body)
+        self.assertEqual(matrix['days'][0], 'Monday')
+        self.assertEqual(matrix['hours'][0], '12:00')
+        self.assertEqual(matrix['values'][0][0], 8)
+        self.assertEqual(matrix['values'][0][-1], 2)
+
+    def test_ratio_for_one_role(self):
+        status, _, body = self.request(f'/matrix?measure=ratio&store={self.store}&week=37&scenario=med&role=Server')
+        self.assertEqual(status, 200)
+        matrix = json.loads(body)
+        ratio = dict(zip(matrix['hours'], matrix['values'][0]))
+        # all the afternoon covers in 12:00 and all the dinner covers in 19:00, one server on
+        self.assertEqual(ratio['12:00'], 80)
+        self.assertEqual(ratio['19:00'], 20)
+
+    def test_etag_and_cache(self):
+        path = f'/matrix?measure=covers&store={self.store}&week=All&scenario=med'
+        status, headers, _ = self.request(path)
+        self.assertEqual(status, 200)
+        misses = self.service.misses
+        status, _, body = self.request(path, **{'If-None-Match': headers['ETag']})
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(self.service.misses, misses)
+
+    def test_concurrent_requests(self):
+        path = f'/matrix?measure=rota&store={self.store}&week=2023-W37&scenario=med'
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.request(path))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([status for status, _, _ in results], [200] * 8)
+        self.assertEqual(len({body for _, _, body in results}), 1)
+
+    def test_arrow_format(self):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        status, headers, body = self.request(f'/matrix?measure=distribution&store={self.store}&week=2023-W37&format=arrow')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = pa.ipc.open_stream(body).read_all()
+        self.assertEqual(table.column('Day').to_pylist()[0], 'Monday')
+        self.assertEqual(table.column('12:00').to_pylist()[0], 8)
+
+    def test_arrow_without_pyarrow(self):
+        with unittest.mock.patch('query_service.pa', None):
+            status, _, body = self.request(f'/matrix?measure=distribution&store={self.store}&week=All&format=arrow')
+        self.assertEqual(status, 406)
+        self.assertIn(b'pyarrow is not installed', body)
+
+    def test_errors(self):
+        self.assertEqual(self.request('/matrix?measure=ratio&store=Nowhere&week=37&scenario=med')[0], 404)
+        self.assertEqual(self.request(f'/matrix?measure=ratio&store={self.store}&week=37')[0], 400)
+        self.assertEqual(self.request(f'/matrix?measure=ratio&store={self.store}&week=37&scenario=peak')[0], 404)
+        self.assertEqual(self.request('/other')[0], 404)
+        # the week has no covers in august
+        self.assertEqual(self.request(f'/matrix?measure=distribution&store={self.store}&week=37&month=8')[0], 404)
+        self.assertEqual(self.request(f'/matrix?measure=distribution&store={self.store}&week=37&month=2023-09')[0], 200)
+        status, _, body = self.request('/stores')
+        self.assertEqual(json.loads(body)['stores'][self.store], ['2023-W37'])
+
+
+class TestWhatIfSweep(unittest.TestCase):
+
+    def test_overnight_shift_on_the_clock_hours(self):
+        rota = pd.DataFrame({
+            'Day': ['Monday'],
+            'Role': ['Server'],
+            'Start Time (Hour)': ['18:00'],
+            'End Time (Hour)': ['3:00'],
+        })
+        on = rota_matrix(rota, list(range(1, 25)))
+        # Monday 18:00 - 3:00: hours 18..24 (midnight) and 1, 2 of the same row
+        self.assertEqual(list(np.flatnonzero(on[0]) + 1), [1, 2, 18, 19, 20, 21, 22, 23, 24])
+        self.assertEqual(on[1:].sum(), 0)
+
+        distribution = pd.DataFrame(0.0, index=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], columns=list(range(1, 25)))
+        distribution.loc['Monday', [1, 2, 18, 19, 20, 21, 22, 23, 24]] = 10.0
+        projected = pd.DataFrame({'day': distribution.index, 'breakfast': 20, 'afternoon': 0, 'evening': 0, 'dinner': 70})
+        result = sweep(distribution, projected, {'flat': 1}, {'none': 0.0}, [38.99], {'overnight': rota})
+        # the covers after midnight have the overnight shift on
+        self.assertEqual(result['Understaffed_Slots'].iloc[0], 0)
+        self.assertEqual(result['Labour_Hours'].iloc[0], 9)
+
+    def test_labour_hours_count_the_hours_without_covers(self):
+        rota = pd.DataFrame({'Day': ['Monday'], 'Role': ['Server'], 'Start Time (Hour)': ['6:00'], 'End Time (Hour)': ['14:00']})
+        distribution = pd.DataFrame(0.0, index=['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], columns=list(range(8, 23)))
+        distribution.loc['Monday'] = 5.0
+        projected = pd.DataFrame({'day': distribution.index, 'breakfast': 20, 'afternoon': 15, 'evening': 15, 'dinner': 20})
+        result = sweep(distribution, projected, {'flat': 1}, {'none': 0.0}, [38.99], {'prep': rota})
+        # the 6:00 and 7:00 prep hours have no covers but are paid
+        self.assertEqual(result['Labour_Hours'].iloc[0], 8)
+        # nobody on from 14:00 to the 22:00 covers
+        self.assertEqual(result['Understaffed_Slots'].iloc[0], 9)
+
+
+class TestCoversForecaster(unittest.TestCase):
+
+    def september(self, store='D8 - Dishoom Birmingham'):
+        '''10 covers at 12:00 and 4 at 1:00 on every date of September 2022 (W35 and W39 partial)'''
+        dates = pd.date_range('2022-09-01', '2022-09-30').strftime('%m-%d-%Y')
+        return pd.DataFrame({
+            'Store_Name': store,
+            'Date': np.repeat(dates, 2),
+            'Open_Time': np.tile([12 * 60, 60], len(dates)),
+            'Guest_Count': np.tile([10, 4], len(dates)),
+            'Item_Sales': 100.0,
+            'Void_Total': 0.0,
+            'Day_Part_Name': np.tile(['Lunch', 'Breakfast'], len(dates)),
+        })
+
+    def test_partial_weeks_are_left_out(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cube = build_covers_cube(self.september(), os.path.join(directory, 'covers_cube'))
+            self.assertEqual(list(cube.full_weeks()), [False, True, True, True, False])
+            forecast = forecast_covers(cube)
+            for band in ['high', 'med', 'low']:
+                np.testing.assert_allclose(forecast[band][0, :, 11], 10)
+
+    def test_forecast_projects_back_to_its_hours(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cube = build_covers_cube(random_checks(np.random.default_rng(1), 3000), os.path.join(directory, 'covers_cube'))
+            week = cube.weeks[2]
+            projections = forecast_projections(cube, alpha=1.0, quantiles=(0.5, 0.5), last_week=week)
+            covers = cube.project(projections['med'], week)
+            np.testing.assert_allclose(covers, np.round(np.asarray(cube.data[:, 2], dtype=float)), atol=1)
+
+
+class TestDeliveryRedistribution(unittest.TestCase):
+
+    def projected(self):
+        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        return pd.DataFrame({'day': days, 'breakfast': 10, 'afternoon': 20, 'evening': 30, 'dinner': 40})
+
+    def test_single_week_projection_over_many_weeks(self):
+        delivery = pd.DataFrame({'Week': [37, 38], 'Delivery_Sales': [700.0, 1400.0]})
+        result = redistribute_delivery(self.projected(), delivery, spend_per_order=10)
+        self.assertEqual(len(result), 14)
+        self.assertEqual(list(result['Week'].unique()), [37, 38])
+        # 70 and 140 delivery covers spread over the week (10 and 20 a day)
+        totals = result.groupby('Week')[DAYPARTS].sum().sum(axis=1)
+        self.assertEqual(list(totals), [700 + 70, 700 + 140])
+
+    def test_stores_and_scenarios(self):
+        projected = pd.concat([self.projected().assign(Store_Name=store) for store in ['A', 'B']], ignore_index=True)
+        delivery = pd.DataFrame({
+            'Store_Name': ['A', 'A', 'B'],
+            'Scenario': ['med', 'low', 'med'],
+            'Delivery_Sales': [700.0, 0.0, 1400.0],
+        })
+        result = redistribute_scenarios({'med': projected, 'low': projected}, delivery, spend_per_order={'A': 10, 'B': 20})
+        totals = {scenario: data.groupby('Store_Name')[DAYPARTS].sum().sum(axis=1).to_dict() for scenario, data in result.items()}
+        self.assertEqual(totals, {'med': {'A': 770, 'B': 770}, 'low': {'A': 700, 'B': 700}})
+
+    def test_store_without_spend_per_order(self):
+        projected = pd.concat([self.projected().assign(Store_Name=store) for store in ['A', 'B']], ignore_index=True)
+        delivery = pd.DataFrame({'Store_Name': ['A', 'B'], 'Delivery_Sales': [700.0, 1400.0]})
+        with self.assertRaisesRegex(ValueError, "'B'"):
+            redistribute_delivery(projected, delivery, spend_per_order={'A': 10})
+        # without delivery sales the spend per order is not needed, the projection is kept
+        result = redistribute_delivery(projected, delivery.assign(Delivery_Sales=[700.0, 0.0]), spend_per_order={'A': 10})
+        self.assertEqual(result.groupby('Store_Name')[DAYPARTS].sum().sum(axis=1).to_dict(), {'A': 770, 'B': 700})
+
+    def test_duplicated_delivery_rows(self):
+        delivery = pd.DataFrame({'Week': [37, 37], 'Delivery_Sales': [700.0, 1400.0]})
+        with self.assertRaises(ValueError):
+            redistribute_delivery(self.projected(), delivery)
+
+
+class TestShiftIndex(unittest.TestCase):
+
+    template = pd.DataFrame({
+        'Day': ['Friday', 'Friday', 'Sunday'],
+        'Role': ['Server', 'Host', 'Server'],
+        'Employee': ['Ana', 'Bo', 'Cy'],
+        'Start Time (Hour)': ['17:00', '18:30', '22:00'],
+        'End Time (Hour)': ['23:00', '2:00', '3:00'],
+    })
+
+    def test_template(self):
+        index = ShiftIndex(self.template)
+        self.assertEqual(sorted(index.at('Friday', '19:00')['Person']), ['Ana', 'Bo'])
+        self.assertEqual(list(index.at('Saturday', '1:30')['Person']), ['Bo'])
+        # the sunday night shift wraps onto monday morning
+        self.assertEqual(list(index.at('Monday', '2:00')['Person']), ['Cy'])
+        self.assertEqual(list(index.at('Friday', '19:00', roles=['Host'])['Person']), ['Bo'])
+
+    def test_dated_rota_weekdays(self):
+        # 2023-09-13 is a Wednesday, the Friday is 2023-09-15
+        dated = self.template.drop(columns=['Day']).assign(Date=['2023-09-15', '2023-09-15', '2023-09-13'])
+        index = ShiftIndex(dated)
+        self.assertEqual(sorted(index.at('Friday', '19:00')['Person']), ['Ana', 'Bo'])
+        self.assertEqual(sorted(index.at('2023-09-15', '19:00')['Person']), ['Ana', 'Bo'])
+        self.assertEqual(index.hover_text(['Friday'], [19])[0, 0], 'Ana (Server)<br>Bo (Host)')
+        self.assertEqual(index.hover_text(['Wednesday'], [19])[0, 0], 'Nobody')
+
+    def test_role_indexes_are_cached_on_the_index(self):
+        import gc
+        import weakref
+        index = ShiftIndex(self.template)
+        self.assertIs(index.for_roles(('Server',)), index.for_roles(('Server',)))
+        reference = weakref.ref(index)
+        del index
+        gc.collect()
+        self.assertIsNone(reference())
+
+
+class TestRotaIngest(unittest.TestCase):
+
+    times = {
+        'Start Time (Hour)': ['17:00', '22:00', '9:00'],
+        'End Time (Hour)': ['23:00', '2:00', '9:00'],
+    }
+
+    def test_template(self):
+        shifts = normalise_shifts(pd.DataFrame({'Day': ['Monday', 'Sunday', 'Friday'], **self.times}))
+        # the zero length shift is dropped, the sunday night shift ends on the next day
+        self.assertEqual(shifts['Day'].tolist(), [0, 6])
+        self.assertEqual(shifts['Start'].tolist(), [17 * 60, 6 * 1440 + 22 * 60])
+        self.assertEqual(shifts['End'].tolist(), [23 * 60, 7 * 1440 + 2 * 60])
+
+    def test_dated(self):
+        shifts = normalise_shifts(pd.DataFrame({'Date': ['2023-09-11', '2023-09-12', '2023-09-13'], **self.times}))
+        self.assertEqual(shifts.attrs['first_date'], pd.Timestamp('2023-09-11'))
+        self.assertEqual(shifts['Day'].tolist(), [0, 1])
+        self.assertEqual(shifts['End'].tolist(), [23 * 60, 2 * 1440 + 2 * 60])
+
+    def test_end_date(self):
+        rota = pd.DataFrame({
+            'Date': ['2023-09-11', '2023-09-12', '2023-09-12'],
+            'End Date': ['2023-09-11', None, '2023-09-14'],
+            'Start Time (Hour)': ['17:00', '22:00', '22:00'],
+            'End Time (Hour)': ['23:00', '2:00', '2:00'],
+        })
+        shifts = normalise_shifts(rota)
+        # a blank End Date on an overnight row still ends the next day
+        self.assertEqual(shifts['End'].tolist(), [23 * 60, 2 * 1440 + 2 * 60, 3 * 1440 + 2 * 60])
+
+
+class TestLabourRollup(unittest.TestCase):
+
+    checks = pd.DataFrame({
+        'Store_Name': ['D8', 'D8'],
+        'Date': ['09-15-2023', '09-15-2023'],
+        'Open_Time': [90, 1140],
+        'Guest_Count': [2, 3],
+        'Item_Sales': [40.0, 60.0],
+        'Void_Total': [0, 0],
+        'Day_Part_Name': ['Dinner', 'Dinner'],
+    })
+    rota = pd.DataFrame({
+        'Day': ['Friday'],
+        'Role': ['Server'],
+        'Start Time (Hour)': ['17:00'],
+        'End Time (Hour)': ['23:00'],
+    })
+
+    def test_daypart_level_uses_the_daypart_table(self):
+        rollup = LabourRollup(self.checks, self.rota, {'Server': 10})
+        # 1:30 is in breakfast with the fixed cut-offs, as in the projection
+        covers = rollup.rollup('daypart')['Covers']
+        self.assertEqual(covers['2023-09-15 breakfast'], 2)
+        self.assertEqual(covers['2023-09-15 dinner'], 3)
+
+        config = pd.DataFrame({'Store_Name': ['D8'], 'Daypart': ['Dinner'], 'Start_Hour': ['18:00'], 'End_Hour': ['3:00']})
+        rollup = LabourRollup(self.checks, self.rota, {'Server': 10}, daypart_table=config_daypart_table(config, ['D8']))
+        self.assertEqual(rollup.rollup('daypart')['Covers']['2023-09-15 dinner'], 5)
+        self.assertEqual(rollup.rollup('daypart')['Labour_Cost']['2023-09-15 dinner'], 50)
+
+    def test_load_wages_leaves_the_frame_alone(self):
+        wages = pd.DataFrame({' Role ': ['Server'], 'Hourly_Wage': [10.0]})
+        self.assertEqual(load_wages(wages), {'Server': 10.0})
+        self.assertEqual(list(wages.columns), [' Role ', 'Hourly_Wage'])
+
+
+class TestPeriodAggregate(unittest.TestCase):
+
+    checks = pd.DataFrame({
+        'Store_Name': ['D1', 'D8', 'D8'],
+        'Date': ['09-11-2023', '09-11-2023', '09-12-2023'],
+        'Open_Time': [720, 720, 60],
+        'Guest_Count': [4, 2, 3],
+        'Item_Sales': [80.0, 40.0, 60.0],
+        'Void_Total': [0, 0, 0],
+        'Day_Part_Name': ['Lunch', 'Lunch', 'Dinner'],
+    })
+
+    def test_dated_rota_before_the_checks_is_clipped(self):
+        # the shift of the sunday night before the first checks date still covers monday 0:00 - 2:00
+        rota = pd.DataFrame({
+            'Date': ['2023-09-10', '2023-09-11'],
+            'Role': ['Server', 'Server'],
+            'Store_Name': ['D8', 'D8'],
+            'Start Time (Hour)': ['22:00', '12:00'],
+            'End Time (Hour)': ['2:00', '13:00'],
+        })
+        periods = PeriodAggregate(self.checks, rota=rota)
+        matrices = periods.matrices({'stores': ['D8'], 'days': ['Monday']})
+        self.assertEqual(matrices['rota'][0, :3].tolist(), [1, 1, 0])
+        self.assertEqual(matrices['ratio'][0, 12], 2)
+
+    def test_rota_without_stores(self):
+        rota = pd.DataFrame({'Day': ['Monday'], 'Role': ['Server'], 'Start Time (Hour)': ['12:00'], 'End Time (Hour)': ['13:00']})
+        periods = PeriodAggregate(self.checks, rota=rota)
+        self.assertEqual(periods.matrices({'stores': ['D1']})['ratio'][0, 12], 4)
+        # the rota of one store against the covers of two would inflate the ratio
+        with self.assertRaises(ValueError):
+            periods.matrices({'stores': ['D1', 'D8']})
+        with self.assertRaises(ValueError):
+            periods.matrices({})
+
+    def test_date_range_being_picked(self):
+        periods = PeriodAggregate(self.checks)
+        column = unittest.mock.MagicMock()
+        column.multiselect.return_value = ['D8']
+        column.radio.return_value = 'Date range'
+        # the first click of the range
+        column.date_input.return_value = (periods.dates[-1],)
+        selection = period_selector(periods, column, 'a')
+        self.assertEqual(selection['start'], selection['end'])
+        self.assertEqual(periods.matrices(selection)['covers'][1, 1], 3)
+
+
+class TestRotaOptimiser(unittest.TestCase):
+
+    covers = pd.DataFrame([[10.0, 10.0, 0.0, 10.0]], index=['Friday'], columns=['12:00', '13:00', '14:00', '23:00'])
+    targets = {'Server': {'ratio': (5, 10), 'lengths': [4], 'start_window': (7, 18)}}
+
+    def test_covers_the_demand(self):
+        rota = optimise_rota(self.covers[['12:00', '13:00']], self.targets)
+        # the 4 hour shift finishes at closing
+        self.assertEqual(rota[['Start Time (Hour)', 'End Time (Hour)']].values.tolist(), [['10:00', '14:00']])
+        self.assertEqual(len(rota.attrs['uncovered']), 0)
+
+    def test_reports_demand_outside_the_start_window(self):
+        rota = optimise_rota(self.covers, self.targets)
+        # no 4 hour shift starting by 18:00 reaches 23:00
+        self.assertEqual(rota.attrs['uncovered'].values.tolist(), [['Friday', 'Server', '23:00', 1]])
+        self.assertEqual(band_report(self.covers, rota, self.targets)['Understaffed Hours'].tolist(), [1])
+
+    def test_combines_lengths_on_a_long_run(self):
+        # 2 people from 12:00 to 22:00: 4 + 6 hours each, not 8 + 8
+        covers = pd.DataFrame([[20.0] * 10], index=['Friday'], columns=[f'{hour}:00' for hour in range(12, 22)])
+        targets = {'Server': {'ratio': (5, 10), 'lengths': [4, 6, 8], 'start_window': (7, 20)}}
+        rota = optimise_rota(covers, targets)
+        self.assertEqual(labour_hours(rota), 20)
+        self.assertEqual(len(rota.attrs['uncovered']), 0)
+
+    def test_role_without_shifts(self):
+        rota = optimise_rota(self.covers[['12:00', '13:00']], self.targets)
+        targets = {**self.targets, 'Runner': {'ratio': (10, 20), 'lengths': [4]}}
+        report = band_report(self.covers[['12:00', '13:00']], rota, targets).set_index('Role')
+        self.assertEqual(report.loc['Runner', 'Labour Hours'], 0)
+        self.assertEqual(report.loc['Runner', 'Understaffed Hours'], 2)
+
+
+class TestAnalyserQuantiles(unittest.TestCase):
+
+    # three september mondays, 13:00 only has covers in the second one
+    checks = pd.DataFrame({
+        'Store_Name': ['D8 - Dishoom Birmingham'] * 7,
+        'Date': ['09-04-2023', '09-11-2023', '09-18-2023', '09-11-2023', '09-04-2023', '09-11-2023', '09-18-2023'],
+        'Open_Time': [720, 720, 720, 790, 1140, 1140, 1140],
+        'Guest_Count': [4, 8, 12, 6, 2, 2, 2],
+        'Item_Sales': [80.0, 160.0, 240.0, 120.0, 40.0, 40.0, 40.0],
+        'Void_Total': [0.0] * 7,
+        'Day_Part_Name': ['Lunch'] * 4 + ['Dinner'] * 3,
+    })
+    projected = pd.DataFrame({
+        'day': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+        'breakfast': [0] * 7, 'afternoon': [100] * 7, 'evening': [0] * 7, 'dinner': [300] * 7,
+    })
+
+    def test_quantiles_skip_the_weeks_without_covers_as_the_mean(self):
+        transformation = TransformationAlohaData(self.checks, self.projected, quantiles=[0.5])
+        median = transformation.quantile_distributions[0.5]
+        self.assertEqual(median.loc['Monday', 12], 8)
+        self.assertEqual(median.loc['Monday', 13], transformation.measure_distribution('Covers').loc['Monday', 13])
+
+    def test_quantile_view_is_projected(self):
+        transformation = TransformationAlohaData(self.checks, self.projected, quantiles=[0.5])
+        view = transformation.view(self.projected, quantile=0.5)
+        self.assertEqual(view.data_distribution.loc['Monday', '12:00'], 57)
+        self.assertEqual(view.data_distribution.loc['Monday', '13:00'], 43)
+        self.assertEqual(view.data_distribution.loc['Monday', '19:00'], 300)
+        self.assertIs(transformation.view(self.projected), transformation)
+        with self.assertRaises(ValueError):
+            transformation.view(self.projected, quantile=0.5, measure='Item_Sales')
+
+
+class TestSnapshotPublisher(unittest.TestCase):
+
+    store = 'D8 - Dishoom Birmingham'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # 2 checks of 4 guests at 12:30 and 1 check of 2 guests at 19:10, every day of 2023-W37
+        dates = pd.date_range('2023-09-11', '2023-09-17').strftime('%m-%d-%Y')
+        checks = pd.DataFrame([
+            (self.store, date, open_time, guests, guests * 20, 0, 'Lunch')
+            for date in dates for open_time, guests in [(750, 4), (755, 4), (1150, 2)]
+        ], columns=['Store_Name', 'Date', 'Open_Time', 'Guest_Count', 'Item_Sales', 'Void_Total', 'Day_Part_Name'])
+        self.cube = build_covers_cube(checks, os.path.join(self.directory.name, 'covers_cube'))
+        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        projected = pd.DataFrame({'day': days, 'breakfast': 0, 'afternoon': 80, 'evening': 0, 'dinner': 40})
+        rota = pd.DataFrame({'Day': days, 'Role': 'Server', 'Start Time (Hour)': '11:00', 'End Time (Hour)': '21:00'})
+        self.inputs = {'med': (projected, rota)}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, *path):
+        with open(os.path.join(self.directory.name, 'snapshots', *path)) as f:
+            return f.read()
+
+    def test_self_contained_pages(self):
+        import snapshot_publisher
+        with unittest.mock.patch('snapshot_publisher.rota_hours_matrix', wraps=snapshot_publisher.rota_hours_matrix) as rota_hours:
+            reports = publish_snapshots(self.cube, os.path.join(self.directory.name, 'snapshots'), self.inputs, inline_plotly=True)
+        # the rota is the same for all the weeks of the store
+        self.assertEqual(rota_hours.call_count, 1)
+        self.assertEqual([report['week'] for report in reports], ['2023-W37', 'All'])
+        page = self.read(reports[0]['html'])
+        self.assertNotIn('plotly.min.js', page)
+        self.assertIn('Plotly', page)
+        self.assertFalse(os.path.exists(os.path.join(self.directory.name, 'snapshots', 'plotly.min.js')))
+        ratio = json.loads(self.read(reports[0]['json']))['ratio']
+        # all the afternoon covers in 12:00 and all the dinner covers in 19:00, one server on
+        values = dict(zip(ratio['hours'], ratio['values'][0]))
+        self.assertEqual(values['12:00'], 80)
+        self.assertEqual(values['19:00'], 40)
+
+    def test_shared_plotly(self):
+        reports = publish_snapshots(self.cube, os.path.join(self.directory.name, 'snapshots'), self.inputs)
+        self.assertIn('<script src="../../plotly.min.js"></script>', self.read(reports[0]['html']))
+        self.assertIn('Plotly', self.read('plotly.min.js'))
+
+
+class TestCoversCubeMonth(unittest.TestCase):
+
+    store = 'D8 - Dishoom Birmingham'
+    # 2022-W35 straddles august and september: wednesday 31/8, thursday 1/9, then wednesday 7/9
+    checks = pd.DataFrame({
+        'Store_Name': [store] * 3,
+        'Date': ['08-31-2022', '09-01-2022', '09-07-2022'],
+        'Open_Time': [750, 750, 750],
+        'Guest_Count': [4, 6, 2],
+        'Item_Sales': [80.0, 120.0, 40.0],
+        'Void_Total': [0.0] * 3,
+        'Day_Part_Name': ['Lunch'] * 3,
+    })
+    projected = pd.DataFrame({
+        'day': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'],
+        'breakfast': 0, 'afternoon': 10, 'evening': 0, 'dinner': 0,
+    })
+
+    def test_month_as_the_analyser(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cube = build_covers_cube(self.checks, os.path.join(directory, 'covers_cube'))
+            self.assertEqual(cube.mean_distribution(self.store).loc['Wednesday', 12], 3)
+            mean = cube.mean_distribution(self.store, month=9)
+            analyser = TransformationAlohaData(self.checks, self.projected).measure_distribution('Covers')
+            self.assertEqual(mean.loc['Wednesday', 12], analyser.loc['Wednesday', 12])
+            self.assertEqual(mean.loc['Thursday', 12], 6)
+            week = cube.distribution(self.store, '2022-W35', month=9)
+            self.assertEqual(week.loc[['Wednesday', 'Thursday'], 12].tolist(), [0, 6])
+            self.assertEqual(cube.distribution(self.store, '2022-W35', month='2022-08').loc['Wednesday', 12], 4)
+            self.assertEqual(cube.weeks_for_store(self.store, month=8), ['2022-W35'])
+            projected = cube.project(self.projected, week='2022-W35', month=9)
+            self.assertEqual(projected[0, 2, 11], 0)
+            self.assertEqual(projected[0, 3, 11], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
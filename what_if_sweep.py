@@ -0,0 +1,169 @@
+'''
+What-if sweep over cover multipliers, delivery levels, spend per order and rota variants.
+
+"What if covers are +10% on weekends and delivery is at med, for these five rotas?" meant
+editing the data editors and waiting for a full rerun for each answer. Here the whole grid is
+one broadcast over a shared distribution:
+
+    covers[m, l, s, day, hour] = share of the hour in its daypart[day, hour]
+                                 x projected covers of the daypart[day] x multiplier[m, day]
+                                 + delivery level l at spend per order s (see delivery_redistribution)
+    ratio[m, l, s, r, day, hour] = covers / rota r
+
+and each combination gets its labour hours, mean / min covers per employee and the number of
+understaffed slots (more covers per employee than the target, or covers and nobody on).
+'''
+import itertools
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dayparts import DAYS, DAYPARTS, daypart_of_hours
+from delivery_redistribution import redistribute_array
+from rota_ingest import template_coverage
+
+
+
+def daypart_shares(distribution):
+    '''
+    distribution: days x hours covers (the transformation3 output, int hours as columns)
+    returns (days x hours share of each hour in its daypart, daypart position of each hour)
+    as find_statistical_distribuition does for each daypart
+    '''
+    values = np.nan_to_num(distribution.reindex(DAYS).to_numpy(dtype=float))
+    dayparts = daypart_of_hours(np.asarray(distribution.columns, dtype=int))
+    totals = np.zeros((len(DAYS), len(DAYPARTS)))
+    np.add.at(totals.T, dayparts, values.T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = values / totals[:, dayparts]
+    return np.nan_to_num(shares), dayparts
+
+
+def clock_coverage(rota):
+    '''
+    rota (template csv / dataframe) -> days x clock hours 1..24 people on, every hour of the rota:
+    the hours after midnight stay on the day the shift started (0:00 -> 24, 1:00 -> 1)
+    '''
+    on = template_coverage(rota).fillna(0)
+    on.columns = [int(col[:-3]) or 24 for col in on.columns]
+    return on.T.groupby(level=0).sum().T.reindex(index=DAYS, fill_value=0)
+
+
+def rota_matrix(rota, hours):
+    '''
+    rota -> days x hours people on, on the hours of the distribution (the hours without covers
+    are left out, see clock_coverage for all of them)
+    '''
+    return clock_coverage(rota).reindex(columns=hours, fill_value=0).to_numpy(dtype=float)
+
+
+def sweep(distribution, projected_covers, multipliers, delivery_levels, spend_per_order, rotas, target_ratio=None):
+    '''
+    distribution:     days x hours covers (int hours as columns)
+    projected_covers: day, breakfast, afternoon, evening, dinner
+    multipliers:      {name: number or 7 multipliers Monday..Sunday}
+    delivery_levels:  {name: weekly delivery sales}
+    spend_per_order:  list of spend per order values
+    rotas:            {name: rota in the rota_hours_*.csv schema}
+    target_ratio:     covers per employee above which a slot is understaffed (only nobody on if None)
+
+    returns one row per combination
+    '''
+    hours = [int(col) for col in distribution.columns]
+    shares, dayparts = daypart_shares(distribution)
+    projected = projected_covers.set_index('day').reindex(DAYS)[DAYPARTS].to_numpy(dtype=float)
+
+    multiplier = np.array([np.broadcast_to(np.asarray(value, dtype=float), (len(DAYS),)) for value in multipliers.values()])
+    delivery = np.array(list(delivery_levels.values()), dtype=float)
+    spo = np.asarray(spend_per_order, dtype=float)
+    coverage = [clock_coverage(value) for value in rotas.values()]
+    # the labour hours count the prep and close hours too, the ratios only the hours with covers
+    labour_hours = np.array([on.to_numpy(dtype=float).sum() for on in coverage])
+    rota = np.stack([on.reindex(columns=hours, fill_value=0).to_numpy(dtype=float) for on in coverage])
+
+    # multipliers x levels x spo x days x dayparts
+    covers = projected[None] * multiplier[:, :, None]
+    delivery_covers = np.trunc(delivery[:, None] / spo[None, :])
+    covers = redistribute_array(covers[:, None, None], delivery_covers[None])
+    # ... x days x hours, rounded as in transformation4
+    covers = np.round(shares * np.take(covers, dayparts, axis=-1), 0)
+
+    # multipliers x levels x spo x rotas x days x hours
+    covers = covers[:, :, :, None]
+    on = rota[None, None, None]
+    staffed = on > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(staffed, covers / np.where(staffed, on, 1), np.nan)
+    busy = staffed & (covers > 0)
+    understaffed = (covers > 0) & ~staffed
+    if target_ratio is not None:
+        understaffed |= staffed & (ratio > target_ratio)
+    ratio = np.where(busy, ratio, np.nan)
+
+    with np.errstate(invalid='ignore'):
+        mean_ratio = np.nanmean(ratio, axis=(-2, -1))
+        min_ratio = np.nanmin(np.where(busy, ratio, np.inf), axis=(-2, -1))
+    min_ratio[np.isinf(min_ratio)] = np.nan
+    result = pd.DataFrame(
+        list(itertools.product(multipliers, delivery_levels, spo, rotas)),
+        columns=['Multiplier', 'Delivery', 'SPO', 'Rota'],
+    )
+    result['Covers'] = np.broadcast_to(covers.sum(axis=(-2, -1)), mean_ratio.shape).ravel()
+    result['Labour_Hours'] = np.broadcast_to(labour_hours, mean_ratio.shape).ravel()
+    result['Mean_Ratio'] = mean_ratio.ravel()
+    result['Min_Ratio'] = min_ratio.ravel()
+    result['Understaffed_Slots'] = understaffed.sum(axis=(-2, -1)).ravel()
+    return result
+
+
+def parse_multipliers(text):
+    '''"flat: 1; weekend +10%: 1,1,1,1,1,1.1,1.1" -> {name: multipliers}'''
+    multipliers = {}
+    for item in text.split(';'):
+        if ':' in item:
+            name, values = item.split(':', 1)
+            values = [float(value) for value in values.split(',')]
+            multipliers[name.strip()] = values[0] if len(values) == 1 else values
+    return multipliers
+
+
+if __name__ == '__main__':
+    import glob
+    import time
+    from aloha_analyser_all_weeks import TransformationAlohaData
+
+    st.set_page_config(layout='wide')
+
+    @st.cache_resource
+    def load_distribution():
+        projected = pd.read_csv('data/projected_med.csv')
+        projected.columns = [col.strip() for col in projected.columns]
+        transformation = TransformationAlohaData('data/aloha.csv', projected)
+        # the covers of transformation3, before the projection
+        return transformation.measure_distribution('Covers'), projected
+
+    distribution, projected_covers = load_distribution()
+    delivery = pd.read_csv('data/delivery_sales.csv')
+    delivery.columns = [col.strip() for col in delivery.columns]
+    delivery_levels = {'none': 0.0}
+    delivery_levels.update({col.replace('_delivery', ''): float(delivery[col].iloc[0]) for col in delivery.columns})
+
+    c1, c2, c3 = st.columns(3)
+    multipliers = parse_multipliers(c1.text_input('Cover multipliers', 'flat: 1; +10% weekend: 1,1,1,1,1,1.1,1.1; -10%: 0.9'))
+    levels = c2.multiselect('Delivery levels', list(delivery_levels), default=list(delivery_levels))
+    spend_per_order = [float(value) for value in c3.text_input('Spend per order', '32.99, 38.99').split(',')]
+    rota_files = st.multiselect('Rotas', sorted(glob.glob('data/rota_hours_*.csv')), default=sorted(glob.glob('data/rota_hours_*.csv')))
+    target_ratio = st.number_input('Understaffed above covers per employee', value=10.0)
+
+    rotas = {}
+    for path in rota_files:
+        rota = pd.read_csv(path)
+        rota.columns = [col.strip() for col in rota.columns]
+        rotas[path] = rota
+
+    if multipliers and levels and rotas:
+        started = time.time()
+        result = sweep(distribution, projected_covers, multipliers, {level: delivery_levels[level] for level in levels}, spend_per_order, rotas, target_ratio)
+        st.caption(f'{len(result)} combinations in {time.time() - started:.2f}s')
+        st.dataframe(result, use_container_width=True)